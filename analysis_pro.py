@@ -1,34 +1,31 @@
 import json
-import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 import os
+import history_store
+import retention
+import feature_store
+import charts
+import valuation
+import benchmark
+import metrics
+import storage
 from datetime import datetime
 
 DATA_DIR = "data_hub"
-HISTORY_FILE = os.path.join(DATA_DIR, "stock_history.json")
 PORTFOLIO_FILE = os.path.join(DATA_DIR, "portfolio.json")
 REPORT_FILE = "ANALYSIS_REPORT.md"
 PREDICTION_CHART = os.path.join(DATA_DIR, "predictions.png")
+CHART_DPI = 100
 
-def get_reversion_details(df, ticker):
-    current_price = df[ticker].iloc[-1]
-    avg_price = df[ticker].mean()
-    std_dev = df[ticker].std()
-    z_score = (current_price - avg_price) / std_dev if std_dev > 0 else 0
-    
+def get_reversion_details(z_score):
     if z_score > 1.5:
         return "🔴 **מתיחת יתר למעלה**: המחיר גבוה משמעותית מהממוצע ההיסטורי שלך. סיכון מוגבר לתיקון."
     elif z_score < -1.5:
         return "🟢 **הזדמנות ערך**: המחיר נמוך משמעותית מהממוצע. ייתכן שמדובר בנקודת כניסה נוחה."
     return "⚪ **מחיר הוגן**: המניה נסחרת סביב הממוצע ההיסטורי שלה."
 
-def get_momentum_details(df, ticker):
-    prices = df[ticker].dropna()
-    if len(prices) < 20: return "⏳ צבירת נתונים..."
-    ma_short = prices.rolling(window=20).mean().iloc[-1]
-    ma_long = prices.rolling(window=min(len(prices), 50)).mean().iloc[-1]
-    
+def get_momentum_details(ready, ma_short, ma_long):
+    if not ready: return "⏳ צבירת נתונים..."
     if ma_short > ma_long:
         return "🚀 **מגמה עולה**: הממוצע לטווח קצר מעל הארוך - המומנטום חיובי."
     return "⚠️ **מגמה יורדת**: המומנטום נחלש, המחיר מתקשה לפרוץ למעלה."
@@ -40,61 +37,67 @@ def get_rsi_details(rsi):
         return "🧊 **מכירת יתר**: פאניקה של מוכרים. לעיתים קרובות מקדים זינוק למעלה."
     return "⚖️ **ניטרלי**: עוצמת הקונים והמוכרים מאוזנת."
 
-def main():
-    if not os.path.exists(HISTORY_FILE) or not os.path.exists(PORTFOLIO_FILE):
+def get_benchmark_details(row):
+    if np.isnan(row['beta']): return "⏳ צבירת נתונים..."
+    side = "חזק" if row['alpha'] > 0 else "חלש"
+    return (f"בטא {row['beta']:.2f}, אלפא שנתית {row['alpha'] * 100:+.1f}% ({side} מהמדד), "
+            f"Tracking Error {row['tracking_error'] * 100:.1f}%, שארפ {row['sharpe']:.2f}, ירידה מקסימלית {row['max_drawdown'] * 100:.1f}%")
+
+def prediction_series(df, tickers, dpi=CHART_DPI):
+    """(label, x, y) per ticker for the relative growth chart, normalized to 100 and downsampled."""
+    return [(t, *charts.line(df['ts'].to_numpy(), ((df[t]/df[t].iloc[0])*100).to_numpy(), 12, dpi)) for t in tickers]
+
+def main(holdings=None, df=None):
+    if holdings is None and not os.path.exists(PORTFOLIO_FILE):
         return
-    with open(PORTFOLIO_FILE, 'r') as f: holdings = json.load(f)
-    with open(HISTORY_FILE, 'r') as f: history = json.load(f)
-    
-    df = pd.DataFrame([{"ts": e['timestamp'], **e['prices']} for e in history])
-    df['ts'] = pd.to_datetime(df['ts'])
-    df = df.sort_values('ts')
+    if df is None and not history_store.ensure_store():
+        return
+    if holdings is None:
+        with open(PORTFOLIO_FILE, 'r') as f: holdings = json.load(f)
+    if df is None:
+        df = retention.load_range()
     
-    tickers = list(holdings.keys())
+    tickers = [t for t in holdings if t in df.columns]
+    table = feature_store.latest(tickers)
+    # Rolling statistics against the SPY column the tracker already stores in every sample
+    bench = benchmark.summary(df, valuation.value_portfolio(df, holdings))
     sections = []
     
-    plt.figure(figsize=(12, 6))
-    plt.style.use('dark_background')
-
-    for t in tickers:
-        if t not in df.columns: continue
-        
-        rev = get_reversion_details(df, t)
-        mom = get_momentum_details(df, t)
-        
-        # RSI חישוב
-        delta = df[t].diff()
-        gain = delta.where(delta > 0, 0).rolling(14).mean()
-        loss = -delta.where(delta < 0, 0).rolling(14).mean()
-        rs = gain / loss
-        rsi_val = 100 - (100 / (1 + rs.iloc[-1])) if not pd.isna(rs.iloc[-1]) else 50
+    for t, row in table.iterrows():
+        rev = get_reversion_details(row['z_score'])
+        mom = get_momentum_details(row['momentum_ready'], row['ma_short'], row['ma_long'])
+        rsi_val = row['rsi']
         rsi_desc = get_rsi_details(rsi_val)
         
         sections.append(f"### 📈 {t}\n"
                         f"- **מצב מחיר:** {rev}\n"
                         f"- **מגמת מומנטום:** {mom}\n"
-                        f"- **מדד עוצמה (RSI):** {rsi_val:.1f} - {rsi_desc}\n")
-        
-        plt.plot(df['ts'], (df[t]/df[t].iloc[0])*100, label=t, alpha=0.8, linewidth=2)
+                        f"- **מדד עוצמה (RSI):** {rsi_val:.1f} - {rsi_desc}\n"
+                        + (f"- **מול S&P 500:** {get_benchmark_details(bench.loc[t])}\n" if t in bench.index else ""))
 
-    plt.title("Portfolio Performance Comparison (Normalized)")
-    plt.legend(); plt.savefig(PREDICTION_CHART, bbox_inches='tight'); plt.close()
+    series = prediction_series(df, table.index)
+    charts.render_all([(charts.render_predictions, PREDICTION_CHART, {"series": series}, CHART_DPI)])
     
     report = [
         "# 🧠 דוח ניתוח מפורט ותחזיות",
         f"עדכון: {datetime.now().strftime('%d/%m/%Y %H:%M')}\n",
         "## 🔍 ניתוח מעמיק לפי מניה",
         "\n".join(sections),
+        *([f"## 📐 התיק מול S&P 500 ({bench['window'].iloc[0]} ימי מסחר אחרונים)",
+           f"- **תיק כולל:** {get_benchmark_details(bench.loc['portfolio'])}\n"] if len(bench) else []),
         "## 📊 השוואת צמיחה יחסית",
         f"![Predictions](./{PREDICTION_CHART})",
         "\n---",
         "### 📔 מילון מונחים למשקיע:",
         "- **Mean Reversion (חזרה לממוצע):** הנחה שמחיר המניה תמיד יחזור לממוצע שלו. סטייה חריגה היא הזדמנות או נורת אזהרה.",
         "- **RSI (מדד עוצמה יחסית):** כלי שמודד את מהירות שינויי המחיר. עוזר לזהות מתי הציבור רץ לקנות/למכור בטירוף.",
-        "- **Momentum (מומנטום):** בודק אם 'הרוח בגב' של המניה. מניה במומנטום חיובי נוטה להמשיך לעלות."
+        "- **Momentum (מומנטום):** בודק אם 'הרוח בגב' של המניה. מניה במומנטום חיובי נוטה להמשיך לעלות.",
+        "- **Beta / Alpha (בטא / אלפא):** בטא מודדת כמה הנכס זז ביחס למדד (1 = כמו המדד); אלפא היא התשואה השנתית מעבר למה שהבטא מסבירה.",
+        "- **Tracking Error / Sharpe:** סטיית התקן השנתית של הפער מהמדד, ותשואה ממוצעת ליחידת תנודתיות."
     ]
     
-    with open(REPORT_FILE, 'w', encoding='utf-8') as f:
-        f.write("\n".join(report))
+    storage.write_text(REPORT_FILE, "\n".join(report))
+    metrics.wrote(REPORT_FILE)
 
-if __name__ == "__main__": main()
+if __name__ == "__main__":
+    with metrics.stage("analysis"): main()
@@ -0,0 +1,197 @@
+import json
+import os
+from datetime import datetime
+from urllib.parse import quote, unquote
+import pandas as pd
+import pytz
+import metrics
+import storage
+
+# --- Paths & Config ---
+DATA_DIR = "data_hub"
+ARCHIVE_DIR = os.path.join(DATA_DIR, "price_history_archive")
+PARTITION_DIR = os.path.join(ARCHIVE_DIR, "partitions")
+LEGACY_CSV = os.path.join(ARCHIVE_DIR, "full_stocks_extended_history.csv")
+LEGACY_DIR = os.path.join(ARCHIVE_DIR, "individual_stocks")
+SIGNATURE_FILE = "signature.json"
+COLUMNS = ["timestamp", "ticker", "price", "dividend", "pe_ratio", "usd_ils"]
+TS_FORMAT = "%Y-%m-%d %H:%M:%S"
+TZ = pytz.timezone('Israel')
+
+# Layout: partitions/<ticker>/<YYYY-MM>.csv, one small CSV per ticker and month,
+# with the same columns as the old combined file. Only the partition of the
+# current month changes; closed months are immutable, so an hourly run touches one
+# file per ticker and a commit diff is a few lines. (timestamp, ticker) is the key:
+# within a partition the ticker is fixed and rows are kept sorted by timestamp.
+# The combined view is never stored - read()/iter_frames() assemble it from the
+# partitions a query needs, and export() can still write the old combined CSV and
+# individual_stocks files on demand.
+# partitions/signature.json holds [partition count, total bytes]. upsert keeps it
+# current, so archive_index can tell the archive changed without walking every
+# partition; it is recounted from the files only when missing.
+
+class ClosedPartitionError(Exception):
+    pass
+
+def _ticker_dir(ticker, root=PARTITION_DIR):
+    return os.path.join(root, quote(ticker, safe=''))
+
+def _month_path(ticker, month, root=PARTITION_DIR):
+    return os.path.join(_ticker_dir(ticker, root), f"{month}.csv")
+
+def current_month(now=None):
+    return (now or datetime.now(TZ)).strftime("%Y-%m")
+
+def tickers(root=PARTITION_DIR):
+    if not os.path.isdir(root):
+        return []
+    return sorted(unquote(d) for d in os.listdir(root) if os.path.isdir(os.path.join(root, d)))
+
+def months(ticker, root=PARTITION_DIR):
+    d = _ticker_dir(ticker, root)
+    return sorted(f[:-4] for f in os.listdir(d) if f.endswith(".csv")) if os.path.isdir(d) else []
+
+def rescan(root=PARTITION_DIR):
+    """Recount the signature from the partition files, e.g. after editing partitions by hand."""
+    count = size = 0
+    for t in tickers(root):
+        for m in months(t, root):
+            count += 1
+            size += os.path.getsize(_month_path(t, m, root))
+    path = os.path.join(root, SIGNATURE_FILE)
+    with storage.lock(path):
+        os.makedirs(root, exist_ok=True)
+        storage.write_json(path, [count, size])
+    return [count, size]
+
+def signature(root=PARTITION_DIR):
+    """(partition count, total bytes): changes whenever any partition is written."""
+    path = os.path.join(root, SIGNATURE_FILE)
+    with storage.lock(path):
+        try:
+            with open(path, 'r') as f: return json.load(f)
+        except (OSError, ValueError):
+            return rescan(root)
+
+def _add_signature(root, count, size):
+    path = os.path.join(root, SIGNATURE_FILE)
+    with storage.lock(path):
+        old = signature(root)
+        storage.write_json(path, [old[0] + count, old[1] + size])
+
+def _read_partition(path):
+    df = pd.read_csv(path)
+    metrics.read(len(df))
+    return df
+
+def _write_partition(df, path):
+    """Replace one partition atomically."""
+    with storage.replacing(path, 'w', encoding='utf-8') as f:
+        df.to_csv(f, index=False)
+    metrics.wrote(path, len(df))
+
+def upsert(df, root=PARTITION_DIR, reopen=False, now=None):
+    """Insert or replace rows keyed on (timestamp, ticker), touching only the partitions they fall in.
+
+    Rows for a closed month raise ClosedPartitionError unless reopen=True (migration, backfill).
+    Returns the number of partitions written.
+    """
+    if df.empty:
+        return 0
+    df = df.reindex(columns=COLUMNS)
+    stamps = pd.to_datetime(df['timestamp'], format=TS_FORMAT)
+    df = df.assign(timestamp=stamps.dt.strftime(TS_FORMAT))
+    month_of = stamps.dt.strftime("%Y-%m")
+    this_month = current_month(now)
+    closed = sorted(set(month_of[month_of < this_month]))
+    if closed and not reopen:
+        raise ClosedPartitionError(f"Rows for closed partitions {', '.join(closed)}")
+
+    signature(root)  # counted before these writes, so they are added exactly once
+    written = added = grown = 0
+    for (ticker, month), rows in df.groupby([df['ticker'], month_of], sort=False):
+        path = _month_path(ticker, month, root)
+        rows = rows.sort_values('timestamp', kind='stable').drop_duplicates('timestamp', keep='last')
+        with storage.lock(path):  # the hourly update and a backfill may write the same month
+            before = os.path.getsize(path) if os.path.exists(path) else None
+            if before is None:
+                _write_partition(rows, path)
+            else:
+                old = _read_partition(path)
+                if old.empty or rows['timestamp'].iloc[0] > old['timestamp'].iloc[-1]:
+                    # Common case: strictly newer rows, appended without rewriting the partition
+                    size = storage.append(path, rows.to_csv(header=False, index=False))
+                    metrics.add(rows_written=len(rows), bytes_written=size)
+                else:
+                    merged = pd.concat([old, rows], ignore_index=True)
+                    merged = merged.drop_duplicates('timestamp', keep='last').sort_values('timestamp', kind='stable')
+                    _write_partition(merged, path)
+            added += before is None
+            grown += os.path.getsize(path) - (before or 0)
+        written += 1
+    _add_signature(root, added, grown)
+    return written
+
+def iter_frames(tickers_=None, start=None, end=None, root=PARTITION_DIR):
+    """Partition frames for tickers over [start, end), one at a time; only overlapping months are read."""
+    first = None if start is None else pd.Timestamp(start).strftime("%Y-%m")
+    last = None if end is None else (pd.Timestamp(end) - pd.Timedelta(seconds=1)).strftime("%Y-%m")
+    for t in (tickers(root) if tickers_ is None else tickers_):
+        for m in months(t, root):
+            if (first and m < first) or (last and m > last):
+                continue
+            df = _read_partition(_month_path(t, m, root))
+            if start is not None or end is not None:
+                ts = pd.to_datetime(df['timestamp'], format=TS_FORMAT)
+                keep = pd.Series(True, index=df.index)
+                if start is not None: keep &= ts >= pd.Timestamp(start)
+                if end is not None: keep &= ts < pd.Timestamp(end)
+                df = df[keep]
+            if not df.empty:
+                yield df
+
+def read(tickers_=None, start=None, end=None, root=PARTITION_DIR):
+    """Combined long view (the old full_stocks_extended_history layout), assembled from partitions."""
+    frames = list(iter_frames(tickers_, start, end, root))
+    if not frames:
+        return pd.DataFrame(columns=COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+def import_legacy(csv_path=LEGACY_CSV, root=PARTITION_DIR):
+    """One-off split of the old combined CSV into partitions (the old file is left in place)."""
+    if not os.path.exists(csv_path):
+        return 0
+    df = pd.read_csv(csv_path)
+    metrics.read(len(df))
+    return upsert(df, root, reopen=True)
+
+def ensure_archive(root=PARTITION_DIR, csv_path=LEGACY_CSV):
+    """True when partitions exist, migrating the legacy combined CSV first if that is all there is."""
+    if not tickers(root):
+        import_legacy(csv_path, root)
+    return bool(tickers(root))
+
+def export(csv_path=LEGACY_CSV, individual_dir=LEGACY_DIR, root=PARTITION_DIR):
+    """Write the combined CSV and per-ticker files in the old layout, for tools that expect them."""
+    os.makedirs(individual_dir, exist_ok=True)
+    frames = []
+    for t in tickers(root):
+        df = read([t], root=root)
+        with storage.replacing(os.path.join(individual_dir, f"{t}_history.csv"), 'w', encoding='utf-8') as f:
+            df.to_csv(f, index=False)
+        frames.append(df)
+    combined = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=COLUMNS)
+    with storage.replacing(csv_path, 'w', encoding='utf-8') as f:
+        combined.to_csv(f, index=False)
+    return len(combined)
+
+if __name__ == "__main__":
+    import sys
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "import"
+    if cmd == "export":
+        print(f"Exported {export()} rows to {LEGACY_CSV} and {LEGACY_DIR}")
+    elif cmd == "rescan":
+        count, size = rescan()
+        print(f"{count} partitions, {size:,} bytes under {PARTITION_DIR}")
+    else:
+        print(f"Wrote {import_legacy()} partitions under {PARTITION_DIR}")
@@ -0,0 +1,216 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+import archive
+import metrics
+import storage
+
+# --- Paths & Config ---
+DATA_DIR = "data_hub"
+ARCHIVE_DIR = os.path.join(DATA_DIR, "price_history_archive")
+PARTITION_DIR = archive.PARTITION_DIR
+INDEX_DIR = os.path.join(ARCHIVE_DIR, "index")
+META_FILE = "meta.json"
+VALUE_COLUMNS = ("price", "dividend", "pe_ratio", "usd_ils")
+TS_FORMAT = "%Y-%m-%d %H:%M:%S"
+TS_DTYPE = np.dtype('<i8')
+CODE_DTYPE = np.dtype('<i4')
+VALUE_DTYPE = np.dtype('<f4')
+CHUNK_ROWS = 100_000
+MERGE_ROWS = 50_000  # delta rows folded back into the sorted main segment past this
+
+# Layout: two segments with the same column files - epoch seconds (int64), ticker
+# codes (int32, names in meta.json) and one float32 file per value column.
+# "main" is sorted by (ticker, timestamp) and meta.json records each ticker's
+# [offset, count] in it, so a ticker + time-range query is a binary search inside
+# one contiguous block of a memory map. "delta" takes appends in arrival order and
+# is scanned with a mask; it is merged into main once it grows past MERGE_ROWS.
+# meta.json also keeps the partitions' signature (count and total size, as recorded by
+# archive.upsert), so an index that fell out of step with the archive is detected and
+# rebuilt; after editing partitions by hand, `python archive.py rescan` recounts it.
+# Writers and readers hold storage.lock(index_dir), so a query never sees a half-merged main.
+
+def _path(index_dir, segment, column):
+    ext = {"ts": "i64", "ticker": "i32"}.get(column, "f32")
+    return os.path.join(index_dir, f"{segment}.{column}.{ext}")
+
+def _dtype(column):
+    return {"ts": TS_DTYPE, "ticker": CODE_DTYPE}.get(column, VALUE_DTYPE)
+
+def _map(index_dir, segment, column, rows):
+    if rows <= 0:
+        return np.empty(0, dtype=_dtype(column))
+    return np.memmap(_path(index_dir, segment, column), dtype=_dtype(column), mode='r', shape=(rows,))
+
+def _epoch(ts):
+    return int((pd.Timestamp(ts) - pd.Timestamp(0)) // pd.Timedelta(seconds=1))
+
+def load_meta(index_dir=INDEX_DIR):
+    try:
+        with open(os.path.join(index_dir, META_FILE), 'r') as f: return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _save_meta(meta, index_dir):
+    storage.write_json(os.path.join(index_dir, META_FILE), meta, indent=2)
+
+def _arrays(df, tickers):
+    """Long archive rows as compact column arrays; unseen tickers are added to `tickers`."""
+    codes = {t: i for i, t in enumerate(tickers)}
+    for t in df['ticker'].unique():
+        if t not in codes:
+            codes[t] = len(tickers)
+            tickers.append(t)
+    out = {
+        "ts": ((pd.to_datetime(df['timestamp'], format=TS_FORMAT) - pd.Timestamp(0)) // pd.Timedelta(seconds=1)).to_numpy(dtype=TS_DTYPE),
+        "ticker": df['ticker'].map(codes).to_numpy(dtype=CODE_DTYPE),
+    }
+    for c in VALUE_COLUMNS:
+        out[c] = pd.to_numeric(df[c], errors='coerce').to_numpy(dtype=VALUE_DTYPE) if c in df else \
+            np.full(len(df), np.nan, dtype=VALUE_DTYPE)
+    return out
+
+def _write(index_dir, segment, arrays, mode='wb'):
+    for column, values in arrays.items():
+        with open(_path(index_dir, segment, column), mode) as f:
+            f.write(np.ascontiguousarray(values, dtype=_dtype(column)).tobytes())
+
+def _write_main(index_dir, arrays, tickers, root):
+    """Sort rows by (ticker, timestamp), write the main segment and reset the delta."""
+    order = np.lexsort((arrays['ts'], arrays['ticker']))
+    arrays = {c: v[order] for c, v in arrays.items()}
+    bounds = np.searchsorted(arrays['ticker'], np.arange(len(tickers) + 1))
+    os.makedirs(index_dir, exist_ok=True)
+    _write(index_dir, "main", arrays)
+    _write(index_dir, "delta", {c: v[:0] for c, v in arrays.items()})
+    meta = {
+        "tickers": tickers,
+        "offsets": {t: [int(bounds[i]), int(bounds[i + 1] - bounds[i])] for i, t in enumerate(tickers)},
+        "main_rows": len(order),
+        "delta_rows": 0,
+        "source": archive.signature(root),
+    }
+    _save_meta(meta, index_dir)
+    metrics.add(rows_written=len(order), bytes_written=len(order) * (8 + 4 + 4 * len(VALUE_COLUMNS)))
+    return meta
+
+def build(root=PARTITION_DIR, index_dir=INDEX_DIR):
+    """Index the archive partitions, one partition frame at a time."""
+    with storage.lock(index_dir):
+        tickers = []
+        parts = [_arrays(df, tickers) for df in archive.iter_frames(root=root)]
+        arrays = {c: np.concatenate([p[c] for p in parts]) if parts else np.empty(0, dtype=_dtype(c))
+                  for c in ("ts", "ticker") + VALUE_COLUMNS}
+        return _write_main(index_dir, arrays, tickers, root)
+
+def ensure_index(root=PARTITION_DIR, index_dir=INDEX_DIR):
+    """Meta of an index in step with the partitions, building it first if needed."""
+    with storage.lock(index_dir):
+        meta = load_meta(index_dir)
+        if meta is None or meta.get('source') != archive.signature(root):
+            meta = build(root, index_dir)
+        return meta
+
+def _all_rows(meta, index_dir):
+    columns = ("ts", "ticker") + VALUE_COLUMNS
+    return {c: np.concatenate([_map(index_dir, "main", c, meta['main_rows']),
+                               _map(index_dir, "delta", c, meta['delta_rows'])]) for c in columns}
+
+def append(df, root=PARTITION_DIR, index_dir=INDEX_DIR):
+    """Add rows that were just upserted into the partitions; the index stays in step without a re-read."""
+    with storage.lock(index_dir):
+        meta = load_meta(index_dir)
+        if meta is None:
+            return build(root, index_dir)
+        tickers = list(meta['tickers'])
+        arrays = _arrays(df, tickers)
+        _write(index_dir, "delta", arrays, mode='ab')
+        meta['delta_rows'] += len(df)
+        meta['tickers'] = tickers
+        for t in tickers[len(meta['offsets']):]:
+            meta['offsets'][t] = [meta['main_rows'], 0]
+        meta['source'] = archive.signature(root)
+        if meta['delta_rows'] > MERGE_ROWS:
+            return _write_main(index_dir, _all_rows(meta, index_dir), tickers, root)
+        _save_meta(meta, index_dir)
+        metrics.add(rows_written=len(df), bytes_written=len(df) * (8 + 4 + 4 * len(VALUE_COLUMNS)))
+        return meta
+
+def _ranges(meta, index_dir, tickers, start, end):
+    """(lo, hi) row range in main for every requested ticker, found by binary search."""
+    ts = _map(index_dir, "main", "ts", meta['main_rows'])
+    ranges = []
+    for t in tickers:
+        off, count = meta['offsets'].get(t, (0, 0))
+        block = ts[off:off + count]
+        lo = off + (int(np.searchsorted(block, _epoch(start))) if start is not None else 0)
+        hi = off + (int(np.searchsorted(block, _epoch(end))) if end is not None else count)
+        if hi > lo:
+            ranges.append((lo, hi))
+    return ranges
+
+def _frame(meta, arrays, columns):
+    df = pd.DataFrame({
+        "timestamp": pd.to_datetime(arrays['ts'], unit='s'),
+        "ticker": pd.Categorical.from_codes(arrays['ticker'], categories=meta['tickers']),
+    })
+    for c in columns:
+        df[c] = arrays[c]
+    return df
+
+def _delta(meta, index_dir, tickers, start, end, columns):
+    rows = meta['delta_rows']
+    if not rows:
+        return None
+    ts = _map(index_dir, "delta", "ts", rows)
+    codes = _map(index_dir, "delta", "ticker", rows)
+    keep = np.isin(codes, [meta['tickers'].index(t) for t in tickers])
+    if start is not None: keep &= ts >= _epoch(start)
+    if end is not None: keep &= ts < _epoch(end)
+    if not keep.any():
+        return None
+    return {c: np.asarray(_map(index_dir, "delta", c, rows)[keep]) for c in ("ts", "ticker") + tuple(columns)}
+
+def load_prices(tickers=None, start=None, end=None, columns=("price",), root=PARTITION_DIR, index_dir=INDEX_DIR):
+    """Long frame (timestamp, ticker, *columns) for tickers over [start, end), sorted by ticker then time.
+
+    Only the requested slice is read from the memory maps: cost follows the slice, not the archive.
+    Values are float32 and ticker is categorical.
+    """
+    with storage.lock(index_dir):  # main is rewritten in place when the delta is merged
+        meta = ensure_index(root, index_dir)
+        tickers = [t for t in (meta['tickers'] if tickers is None else tickers) if t in meta['offsets']]
+        ranges = _ranges(meta, index_dir, tickers, start, end)
+        arrays = {}
+        for c in ("ts", "ticker") + tuple(columns):
+            col = _map(index_dir, "main", c, meta['main_rows'])
+            arrays[c] = np.concatenate([col[lo:hi] for lo, hi in ranges]) if ranges else np.empty(0, _dtype(c))
+        delta = _delta(meta, index_dir, tickers, start, end, columns)
+        if delta is not None:
+            arrays = {c: np.concatenate([arrays[c], delta[c]]) for c in arrays}
+            order = np.lexsort((arrays['ts'], arrays['ticker']))
+            arrays = {c: v[order] for c, v in arrays.items()}
+        df = _frame(meta, arrays, columns)
+        if delta is not None:
+            df = df.drop_duplicates(['ticker', 'timestamp'], keep='last', ignore_index=True)
+        metrics.read(len(df))
+        return df
+
+def scan(tickers=None, start=None, end=None, columns=("price",), chunk_rows=CHUNK_ROWS, root=PARTITION_DIR, index_dir=INDEX_DIR):
+    """Stream load_prices results in frames of at most chunk_rows rows, for aggregate passes."""
+    with storage.lock(index_dir):
+        meta = ensure_index(root, index_dir)
+        tickers = [t for t in (meta['tickers'] if tickers is None else tickers) if t in meta['offsets']]
+        maps = {c: _map(index_dir, "main", c, meta['main_rows']) for c in ("ts", "ticker") + tuple(columns)}
+        for lo, hi in _ranges(meta, index_dir, tickers, start, end):
+            for a in range(lo, hi, chunk_rows):
+                b = min(a + chunk_rows, hi)
+                yield _frame(meta, {c: np.asarray(m[a:b]) for c, m in maps.items()}, columns)
+        delta = _delta(meta, index_dir, tickers, start, end, columns)
+        if delta is not None:
+            yield _frame(meta, delta, columns)
+
+if __name__ == "__main__":
+    meta = build()
+    print(f"Indexed {meta['main_rows']} rows for {len(meta['tickers'])} tickers in {INDEX_DIR}")
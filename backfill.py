@@ -0,0 +1,264 @@
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+import pytz
+import archive
+import archive_index
+import feature_store
+import fundamentals
+import fx
+import history_store
+import market_data
+import market_hours
+import retention
+import storage
+
+# --- Paths & Config ---
+DATA_DIR = "data_hub"
+PORTFOLIO_FILE = os.path.join(DATA_DIR, "portfolio.json")
+STATE_FILE = os.path.join(DATA_DIR, "backfill_state.json")
+LOG_FILE = os.path.join(DATA_DIR, "error_log.txt")
+TZ = pytz.timezone('Israel')  # stored timestamps are Israel wall-clock
+BAR = pd.Timedelta(hours=1)
+HISTORY_DAYS = 365  # daily sessions expected in the history store
+INTRADAY_DAYS = 30  # hourly bars expected over the most recent days (the raw-sample window)
+ARCHIVE_DAYS = 5 * 365  # daily sessions expected in the price archive
+MAX_GAP = 3  # covered slots a request may span before it is split in two
+
+os.makedirs(DATA_DIR, exist_ok=True)
+logging.basicConfig(filename=LOG_FILE, level=logging.ERROR, format='%(asctime)s: %(message)s')
+
+# Coverage is counted in slots: one per trading session ("1d"), or one per hourly
+# bar of a session ("60m", bars from the open as Yahoo labels them, the last one
+# cut at the close). A sample covers the slot whose bar it falls in; stored daily
+# rows are dated by session, intraday samples by Israel wall-clock time. Every
+# ticker is expected from its first stored sample on (or over the whole window when
+# it has none), so a listing date is not a gap. Missing slots become runs, runs a
+# few slots apart are coalesced, and tickers with the same runs share one request.
+# Slots a fetch could not fill are remembered in STATE_FILE and not asked for again.
+
+# --- Slots ---
+
+def _sessions(start, end):
+    """(open, close) of every session with start <= open and close <= end (aware NY datetimes)."""
+    d, last, out = start.astimezone(market_hours.NY).date(), end.astimezone(market_hours.NY).date(), []
+    while d <= last:
+        s = market_hours.session(d)
+        if s and start <= s[0] and s[1] <= end:
+            out.append(s)
+        d += timedelta(days=1)
+    return out
+
+def _wall(ts):
+    return pd.DatetimeIndex(ts).tz_convert(TZ).tz_localize(None)
+
+def slots(kind, start, end):
+    """Expected slots between two aware datetimes: labels (stored timestamps) and bar starts."""
+    sessions = _sessions(start, end)
+    if kind == "1d":
+        labels = pd.DatetimeIndex([o.date() for o, _ in sessions])
+        return {"kind": kind, "labels": labels, "starts": labels, "last": np.ones(len(labels), bool)}
+    ends, starts, last = [], [], []
+    for o, c in sessions:
+        n = int(np.ceil((c - o) / BAR))
+        ends += [min(o + BAR * (k + 1), c) for k in range(n)]
+        starts += [o + BAR * k for k in range(n)]
+        last += [False] * (n - 1) + [True]
+    if not ends:
+        empty = pd.DatetimeIndex([])
+        return {"kind": kind, "labels": empty, "starts": empty, "last": np.zeros(0, bool)}
+    return {"kind": kind, "labels": _wall(ends), "starts": _wall(starts), "last": np.array(last)}
+
+def locate(grid, ts):
+    """Slot position of each stored timestamp, -1 where it falls in no slot."""
+    ts = pd.DatetimeIndex(ts)
+    labels = grid['labels']
+    if grid['kind'] == "1d":
+        return labels.get_indexer(ts.normalize())
+    idx = labels.searchsorted(ts, side='left')
+    inside = idx < len(labels)
+    pos = np.where(inside, idx, -1)
+    pos[inside] = np.where(ts[inside] >= grid['starts'][idx[inside]], idx[inside], -1)
+    # Late prints after the bell still belong to the session's last bar
+    prev = idx - 1
+    late = (pos < 0) & (prev >= 0)
+    late[late] = grid['last'][prev[late]] & (ts[late] - labels[prev[late]] <= market_hours.GRACE)
+    pos[late] = prev[late]
+    return pos
+
+# --- Planner ---
+
+def runs(positions, max_gap=MAX_GAP):
+    """Sorted slot positions as [first, last] runs; runs at most max_gap covered slots apart are joined."""
+    if not len(positions):
+        return []
+    positions = np.asarray(positions)
+    breaks = np.flatnonzero(np.diff(positions) > max_gap + 1)
+    return [(int(a), int(b)) for a, b in zip(positions[np.r_[0, breaks + 1]], positions[np.r_[breaks, len(positions) - 1]])]
+
+def plan(grid, observed, tickers, skip=None, max_gap=MAX_GAP):
+    """Minimal requests covering every missing slot.
+
+    observed: ticker -> stored timestamps with a value; skip: ticker -> slot labels known to be unfillable.
+    Returns [{'first', 'last' (slot positions), 'tickers', 'missing' (ticker -> positions)}].
+    """
+    labels = grid['labels']
+    groups = {}
+    for t in tickers:
+        ts = pd.DatetimeIndex(observed.get(t, []))
+        have = np.zeros(len(labels), bool)
+        pos = locate(grid, ts)
+        have[pos[pos >= 0]] = True
+        if len(ts):
+            have[:labels.searchsorted(ts.min().normalize() if grid['kind'] == "1d" else ts.min())] = True
+        if skip and skip.get(t):
+            have |= labels.isin(pd.DatetimeIndex(skip[t]))
+        missing = np.flatnonzero(~have)
+        for first, last in runs(missing, max_gap):
+            group = groups.setdefault((first, last), {"first": first, "last": last, "tickers": [], "missing": {}})
+            group['tickers'].append(t)
+            group['missing'][t] = missing[(missing >= first) & (missing <= last)]
+    return sorted(groups.values(), key=lambda g: (g['first'], g['last']))
+
+def _dates(grid, request):
+    """Provider start/end dates (end exclusive) for a request."""
+    labels = grid['labels']
+    return labels[request['first']].strftime("%Y-%m-%d"), (labels[request['last']] + timedelta(days=1)).strftime("%Y-%m-%d")
+
+def _fill_frame(grid, request, closes):
+    """Wide frame of fetched closes for the request's missing slots only, indexed by slot label."""
+    idx = pd.DatetimeIndex(closes.index)
+    if grid['kind'] == "1d":
+        stamps = (idx.tz_localize(None) if idx.tz is not None else idx).normalize()
+    else:
+        idx = idx if idx.tz is not None else idx.tz_localize(market_hours.NY)
+        stamps = _wall(idx + pd.Timedelta(minutes=1))  # a bar's label is its start: find the slot it closes
+    pos = locate(grid, stamps)
+    out = pd.DataFrame(index=grid['labels'][sorted(set(p for m in request['missing'].values() for p in m))])
+    for t in request['tickers']:
+        if t not in closes:
+            continue
+        wanted = np.isin(pos, request['missing'][t]) & closes[t].notna().to_numpy()
+        values = pd.Series(closes[t].to_numpy()[wanted], index=grid['labels'][pos[wanted]])
+        out[t] = values[~values.index.duplicated(keep='last')]
+    return out.dropna(how='all')
+
+# --- Unfillable slots ---
+
+def load_state(path=STATE_FILE):
+    try:
+        with open(path, 'r') as f: return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_state(state, path=STATE_FILE, keys=None):
+    """Write the state; with keys, only those entries replace what is stored (the rest may belong to another run)."""
+    with storage.lock(path):
+        if keys is not None:
+            state = dict(load_state(path), **{k: state[k] for k in keys if k in state})
+        storage.write_json(path, state, indent=2)
+
+def _remember(state, key, grid, requests, filled):
+    """Record requested slots that came back empty, dropping those now outside the window.
+
+    A ticker the fetch returned nothing for at all is left out: that is more likely a
+    failed request than a real hole, so its slots are asked for again next run.
+    """
+    first = grid['labels'].min() if len(grid['labels']) else None
+    known = {t: [s for s in slots_ if first is not None and pd.Timestamp(s) >= first]
+             for t, slots_ in state.get(key, {}).items()}
+    for r in requests:
+        for t, positions in r['missing'].items():
+            if t not in filled:
+                continue
+            empty = grid['labels'][positions].difference(filled[t].dropna().index)
+            known[t] = sorted(set(known.get(t, [])) | set(empty.strftime("%Y-%m-%d %H:%M:%S")))
+    state[key] = {t: v for t, v in known.items() if v}
+
+# --- Targets ---
+
+def _now(now):
+    return now or datetime.now(pytz.utc)
+
+def _observed(frame, tickers):
+    return {t: frame.loc[frame[t].notna(), 'ts'] for t in tickers if t in frame}
+
+def fill_history(tickers, now=None, dry_run=False, store_dir=history_store.STORE_DIR, root=retention.ROLLUP_DIR):
+    """Backfill daily closes over HISTORY_DAYS and hourly bars over INTRADAY_DAYS into the history store.
+
+    Returns the requests made (or planned, with dry_run).
+    """
+    now = _now(now)
+    split = now - timedelta(days=INTRADAY_DAYS)
+    stored = retention.load_range(start=_wall([now - timedelta(days=HISTORY_DAYS)])[0], store_dir=store_dir, root=root)
+    observed = _observed(stored, tickers)
+    state = load_state()
+    made = []
+    for kind, start, end in (("1d", now - timedelta(days=HISTORY_DAYS), split), ("60m", split, now)):
+        grid = slots(kind, start, end)
+        key = f"history_{kind}"
+        requests = plan(grid, observed, tickers, state.get(key))
+        made += [dict(r, kind=kind, dates=_dates(grid, r)) for r in requests]
+        if dry_run or not requests:
+            continue
+        filled = {}
+        for r in requests:
+            first, last = _dates(grid, r)
+            closes = market_data.download_closes(r['tickers'], interval=kind, start=first, end=last)
+            frame = _fill_frame(grid, r, closes)
+            merged = retention.merge(frame, store_dir, root)
+            if merged.get("raw") and store_dir == history_store.STORE_DIR:
+                feature_store.rebuild(store_dir)
+            for t in frame.columns[frame.notna().any()]:
+                filled[t] = pd.concat([filled[t], frame[t]]) if t in filled else frame[t]
+        _remember(state, key, grid, requests, filled)
+    if not dry_run:
+        save_state(state, keys=("history_1d", "history_60m"))
+    return made
+
+def fill_archive(tickers, now=None, dry_run=False):
+    """Backfill missing daily sessions over ARCHIVE_DAYS into the price archive and its index."""
+    import history_logger
+    now = _now(now)
+    grid = slots("1d", now - timedelta(days=ARCHIVE_DAYS), now)
+    if not len(grid['labels']):
+        return []
+    stored = archive_index.load_prices(tickers, start=grid['labels'][0], columns=())
+    observed = {t: rows['timestamp'] for t, rows in stored.groupby('ticker', observed=True)}
+    state = load_state()
+    requests = plan(grid, observed, tickers, state.get("archive"))
+    if dry_run or not requests:
+        return [dict(r, kind="1d", dates=_dates(grid, r)) for r in requests]
+    fx.update()
+    fundamentals.refresh(tickers)
+    filled = {}
+    for r in requests:
+        first, last = _dates(grid, r)
+        closes = market_data.download_closes(r['tickers'], interval="1d", start=first, end=last)
+        frame = _fill_frame(grid, r, closes)
+        if frame.empty:
+            continue
+        rows = history_logger.build_history_frame(frame, fundamentals.dividends(r['tickers']), fx.series(), {})
+        archive.upsert(rows, reopen=True)
+        archive_index.append(rows)
+        for t in frame.columns[frame.notna().any()]:
+            filled[t] = frame[t]
+    _remember(state, "archive", grid, requests, filled)
+    save_state(state, keys=("archive",))
+    return [dict(r, kind="1d", dates=_dates(grid, r)) for r in requests]
+
+if __name__ == "__main__":
+    import sys
+    with open(PORTFOLIO_FILE, 'r') as f: names = list(json.load(f))
+    dry = "--dry-run" in sys.argv
+    history_store.ensure_store()
+    archive.ensure_archive()
+    for label, made in (("history", fill_history(names + ([] if "SPY" in names else ["SPY"]), dry_run=dry)),
+                        ("archive", fill_archive(names, dry_run=dry))):
+        for r in made:
+            print(f"{label:<8} {r['kind']:<4} {r['dates'][0]} .. {r['dates'][1]}  {len(r['tickers'])} tickers, "
+                  f"{sum(len(m) for m in r['missing'].values())} slots")
+        print(f"{label:<8} {len(made)} request(s){' planned' if dry else ''}")
@@ -0,0 +1,192 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import archive
+import storage
+from indicators import MA_SHORT, MA_LONG, RSI_PERIOD
+
+# --- Paths & Config ---
+DATA_DIR = "data_hub"
+PARTITION_DIR = archive.PARTITION_DIR
+RESULTS_FILE = os.path.join(DATA_DIR, "backtest_results.csv")
+WORKERS = int(os.environ.get("BACKTEST_WORKERS", os.cpu_count() or 1))
+CHUNK_CELLS = 8_000_000  # parameter sets per task are sized to keep (params x days x tickers) below this
+TRADING_DAYS = 252
+
+# Grids around the rules analysis_pro reports: z-score beyond +-1.5, MA 20/50 crossover, RSI 30/70.
+# Every rule is long-only: a position taken at a day's close earns the next day's move.
+GRIDS = {
+    "reversion": {"window": list(range(10, 260, 10)), "entry": list(np.round(np.arange(0.5, 3.01, 0.1), 2))},
+    "momentum": {"short": list(range(5, 65, 5)), "long": list(range(20, 260, 10))},
+    "rsi": {"period": list(range(5, 31)), "lower": list(range(10, 50, 5)), "upper": list(range(50, 95, 5))},
+}
+DEFAULTS = {
+    "reversion": {"window": 250, "entry": 1.5},
+    "momentum": {"short": MA_SHORT, "long": MA_LONG},
+    "rsi": {"period": RSI_PERIOD, "lower": 30, "upper": 70},
+}
+
+def load_closes(root=PARTITION_DIR, tickers=None):
+    """Daily close matrix (date x ticker) from the archive partitions; intraday rows keep the day's last."""
+    closes = {}
+    for ticker in archive.tickers(root):
+        if tickers is not None and ticker not in tickers:
+            continue
+        df = archive.read([ticker], root=root)
+        days = pd.to_datetime(df['timestamp']).dt.normalize()
+        closes[ticker] = df['price'].groupby(days.to_numpy()).last()
+    return pd.DataFrame(closes).sort_index().ffill()
+
+def param_grid(strategy, grid=None):
+    """Every parameter combination of a strategy as a frame, invalid ones (short >= long...) removed."""
+    grid = grid or GRIDS[strategy]
+    mesh = np.meshgrid(*grid.values(), indexing='ij')
+    params = pd.DataFrame({k: m.ravel() for k, m in zip(grid, mesh)})
+    if strategy == "momentum":
+        params = params[params['short'] < params['long']]
+    if strategy == "rsi":
+        params = params[params['lower'] < params['upper']]
+    return params.reset_index(drop=True)
+
+# --- Rolling statistics (time on axis 0, NaN-aware, all windows from one cumulative sum) ---
+
+def rolling_sum(x, w):
+    """Sum over the trailing w rows, NaN until w valid values are in the window."""
+    valid = ~np.isnan(x)
+    cs = np.vstack([np.zeros((1, x.shape[1])), np.cumsum(np.where(valid, x, 0.0), axis=0)])
+    cn = np.vstack([np.zeros((1, x.shape[1])), np.cumsum(valid, axis=0)])
+    out = np.full(x.shape, np.nan)
+    if w <= len(x):
+        full = (cn[w:] - cn[:-w]) == w
+        out[w - 1:] = np.where(full, cs[w:] - cs[:-w], np.nan)
+    return out
+
+def _zscore(prices, w):
+    centred = prices - np.nanmean(prices, axis=0)  # keeps the sum of squares well conditioned
+    mean = rolling_sum(centred, w) / w
+    var = (rolling_sum(centred ** 2, w) / w - mean ** 2) * w / max(w - 1, 1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (centred - mean) / np.sqrt(np.maximum(var, 0))
+
+def _rsi(prices, period):
+    """Simple-average RSI over the trailing `period` moves, as indicators.compute_indicators."""
+    delta = np.vstack([np.full((1, prices.shape[1]), np.nan), np.diff(prices, axis=0)])
+    gains = rolling_sum(np.where(delta > 0, delta, np.where(np.isnan(delta), np.nan, 0.0)), period)
+    losses = rolling_sum(np.where(delta < 0, -delta, np.where(np.isnan(delta), np.nan, 0.0)), period)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return 100 - 100 / (1 + gains / losses)
+
+def _hold(entry, exit):
+    """True from each entry until the next exit - a forward fill of the last signal along time (axis -2)."""
+    state = np.where(entry, np.int8(1), np.where(exit, np.int8(0), np.int8(-1)))
+    steps = np.arange(state.shape[-2], dtype=np.int32).reshape(-1, 1)
+    last = np.where(state < 0, np.int32(0), steps)
+    np.maximum.accumulate(last, axis=-2, out=last)
+    return np.take_along_axis(state, last, axis=-2) > 0
+
+# --- Positions per strategy: (params, days, tickers) ---
+
+def positions(strategy, params, prices):
+    out = np.empty((len(params),) + prices.shape, dtype=bool)
+    if strategy == "reversion":
+        for w, idx in params.groupby('window').groups.items():
+            z = _zscore(prices, int(w))[None]
+            entry = params.loc[idx, 'entry'].to_numpy()[:, None, None]
+            out[params.index.get_indexer(idx)] = _hold(z < -entry, z >= 0)
+    elif strategy == "momentum":
+        means = {w: rolling_sum(prices, w) / w for w in set(params['short']) | set(params['long'])}
+        for i, (s, l) in enumerate(zip(params['short'], params['long'])):
+            out[i] = means[s] > means[l]
+    elif strategy == "rsi":
+        for p, idx in params.groupby('period').groups.items():
+            rsi = _rsi(prices, int(p))[None]
+            lower = params.loc[idx, 'lower'].to_numpy()[:, None, None]
+            upper = params.loc[idx, 'upper'].to_numpy()[:, None, None]
+            out[params.index.get_indexer(idx)] = _hold(rsi < lower, rsi > upper)
+    elif strategy == "buy_and_hold":
+        out[:] = ~np.isnan(prices)
+    return out
+
+def evaluate(pos, prices):
+    """Equal-weight performance of boolean positions (params x days x tickers): one row of stats per parameter set."""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        moves = np.nan_to_num(prices[1:] / prices[:-1] - 1)
+    held = pos[:, :-1]
+    pnl = np.where(held, moves[None], 0.0)
+    daily = pnl.mean(axis=2)  # capital split evenly; a flat ticker's share sits in cash
+    equity = np.cumprod(1 + daily, axis=1)
+    drawdown = 1 - equity / np.maximum.accumulate(equity, axis=1)
+    years = max(daily.shape[1], 1) / TRADING_DAYS
+    std = daily.std(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return pd.DataFrame({
+            "total_return": equity[:, -1] - 1 if equity.shape[1] else 0.0,
+            "annual_return": (equity[:, -1] if equity.shape[1] else 1.0) ** (1 / years) - 1,
+            "sharpe": np.where(std > 0, daily.mean(axis=1) / std * np.sqrt(TRADING_DAYS), 0.0),
+            "hit_rate": (pnl > 0).sum(axis=(1, 2)) / np.maximum((held & (moves[None] != 0)).sum(axis=(1, 2)), 1),
+            "max_drawdown": drawdown.max(axis=1) if drawdown.shape[1] else 0.0,
+            "exposure": held.mean(axis=(1, 2)),
+            "trades": (pos[:, 1:] & ~pos[:, :-1]).sum(axis=(1, 2)) + pos[:, 0].sum(axis=1),
+        })
+
+# --- Grid runner ---
+
+_prices = None
+
+def _init(prices):
+    global _prices
+    _prices = prices
+
+def _run_chunk(task):
+    strategy, params = task
+    stats = evaluate(positions(strategy, params.reset_index(drop=True), _prices), _prices)
+    return pd.concat([params.reset_index(drop=True), stats], axis=1).assign(strategy=strategy)
+
+def run(prices, strategies=None, grids=None, workers=WORKERS):
+    """Backtest every strategy over its full parameter grid; grid chunks run on a process pool."""
+    strategies = strategies or list(GRIDS)
+    matrix = prices.to_numpy(dtype=float)
+    per_task = max(1, CHUNK_CELLS // max(matrix.size, 1))
+    tasks = [("buy_and_hold", pd.DataFrame(index=[0]))]
+    for s in strategies:
+        params = param_grid(s, (grids or {}).get(s))
+        if s == "reversion":
+            params = params.sort_values('window', kind='stable')  # one z-score per window per chunk
+        if s == "rsi":
+            params = params.sort_values('period', kind='stable')
+        tasks += [(s, params.iloc[i:i + per_task]) for i in range(0, len(params), per_task)]
+    if workers > 1 and len(tasks) > 2:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), initializer=_init, initargs=(matrix,)) as pool:
+            parts = list(pool.map(_run_chunk, tasks))
+    else:
+        _init(matrix)
+        parts = [_run_chunk(t) for t in tasks]
+    results = pd.concat(parts, ignore_index=True)
+    first = ["strategy"] + [c for c in results.columns if c in {p for g in GRIDS.values() for p in g}]
+    return results[first + [c for c in results.columns if c not in first]]
+
+def main():
+    import time
+    start = time.perf_counter()
+    prices = load_closes()
+    if prices.empty:
+        print(f"No archive partitions in {PARTITION_DIR}")
+        return
+    results = run(prices)
+    with storage.replacing(RESULTS_FILE, 'w') as f:
+        results.to_csv(f, index=False)
+    print(f"Backtested {len(results)} configurations on {prices.shape[1]} tickers x {prices.shape[0]} days "
+          f"in {time.perf_counter() - start:.1f}s -> {RESULTS_FILE}")
+    for strategy, rows in results.groupby('strategy', sort=False):
+        default = DEFAULTS.get(strategy, {})
+        mask = np.logical_and.reduce([rows[k] == v for k, v in default.items()]) if default else np.ones(len(rows), bool)
+        best = rows.sort_values('sharpe', ascending=False).iloc[0]
+        for label, row in (("current", rows[mask].iloc[0] if mask.any() else None), ("best", best)):
+            if row is None: continue
+            params = ", ".join(f"{k}={row[k]:g}" for k in GRIDS.get(strategy, {}))
+            print(f"{strategy:<13} {label:<8} {params:<32} return {row['total_return']:+8.1%}  "
+                  f"hit {row['hit_rate']:.1%}  max DD {row['max_drawdown']:.1%}  sharpe {row['sharpe']:.2f}")
+
+if __name__ == "__main__":
+    main()
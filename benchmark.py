@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+from backtest import TRADING_DAYS, rolling_sum
+
+# --- Config ---
+BENCHMARK = "SPY"  # sampled into every history row by stock_tracker
+WINDOW = 60  # daily returns per rolling window (about three months)
+MIN_DAYS = 5  # fewer daily returns than this and nothing is reported
+
+# Every rolling statistic comes from trailing sums of the daily return matrix x
+# (portfolio + holdings), the benchmark column y broadcast against it, and their
+# squares and product. The five blocks are stacked side by side, so a single
+# cumulative-sum pass gives the window sums of every asset on every day:
+#   beta           cov(x, y) / var(y)
+#   alpha          (mean(x) - beta * mean(y)) * TRADING_DAYS
+#   tracking error std(x - y) * sqrt(TRADING_DAYS), with var(x - y) = var(x) + var(y) - 2 cov(x, y)
+#   sharpe         mean(x) / std(x) * sqrt(TRADING_DAYS), no risk-free rate (as backtest.evaluate)
+# Max drawdown is the deepest fall from a running peak over the whole history.
+
+def daily_returns(df, val):
+    """Daily close-to-close returns (date x [portfolio, holdings...]) and the benchmark's, from the history frame.
+
+    val is valuation.value_portfolio(df, holdings); a day's close is its last sample.
+    The portfolio return counts only positions priced on both days, so a holding
+    whose history starts later is not read as a jump in value.
+    Returns (returns, None) when the history has no benchmark column.
+    """
+    cols = val['tickers'] + ([BENCHMARK] if BENCHMARK not in val['tickers'] and BENCHMARK in df.columns else [])
+    closes = df[cols].groupby(df['ts'].dt.normalize().to_numpy()).last()
+    bench = closes[BENCHMARK].pct_change(fill_method=None) if BENCHMARK in closes else None
+    held = closes[val['tickers']]
+    prices, amounts = held.to_numpy(dtype=float), val['amounts']
+    both = ~np.isnan(prices[1:]) & ~np.isnan(prices[:-1])
+    moved = np.where(both, prices[1:] - prices[:-1], 0) @ amounts
+    base = np.where(both, prices[:-1], 0) @ amounts
+    returns = held.pct_change(fill_method=None)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        returns.insert(0, 'portfolio', np.concatenate(([np.nan], np.where(base > 0, moved / base, np.nan))))
+    return returns, bench
+
+def rolling(returns, bench, window=WINDOW):
+    """Rolling beta, alpha, tracking error and Sharpe over the trailing `window` days: one date x asset frame each.
+
+    A day is NaN until the window holds `window` days on which both the asset and the benchmark have a return.
+    """
+    x = returns.to_numpy(dtype=float)
+    y = np.broadcast_to(bench.to_numpy(dtype=float)[:, None], x.shape)
+    pair = ~np.isnan(x) & ~np.isnan(y)
+    x, y = np.where(pair, x, np.nan), np.where(pair, y, np.nan)
+    n, w = x.shape[1], window
+    sums = rolling_sum(np.hstack([x, y, x * x, y * y, x * y]), w)
+    sx, sy, sxx, syy, sxy = (sums[:, i * n:(i + 1) * n] for i in range(5))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mx, my = sx / w, sy / w
+        var_x = (sxx - w * mx ** 2) / (w - 1)
+        var_y = (syy - w * my ** 2) / (w - 1)
+        cov = (sxy - w * mx * my) / (w - 1)
+        beta = np.where(var_y > 0, cov / var_y, np.nan)
+        stats = {
+            "beta": beta,
+            "alpha": (mx - beta * my) * TRADING_DAYS,
+            "tracking_error": np.sqrt(np.maximum(var_x + var_y - 2 * cov, 0) * TRADING_DAYS),
+            "sharpe": np.where(var_x > 0, mx / np.sqrt(var_x) * np.sqrt(TRADING_DAYS), np.nan),
+        }
+    return {k: pd.DataFrame(v, index=returns.index, columns=returns.columns) for k, v in stats.items()}
+
+def max_drawdown(returns):
+    """Deepest peak-to-trough fall (fraction) of each column's compounded returns."""
+    equity = np.cumprod(1 + np.nan_to_num(returns.to_numpy(dtype=float)), axis=0)
+    drawdown = 1 - equity / np.maximum.accumulate(equity, axis=0)
+    return pd.Series(drawdown.max(axis=0), index=returns.columns)
+
+def summary(df, val, window=WINDOW):
+    """Latest rolling statistics and max drawdown, one row per asset ('portfolio' first).
+
+    Empty without a benchmark column or MIN_DAYS of returns; a shorter history than
+    `window` is measured as one window over all of it (column 'window').
+    """
+    returns, bench = daily_returns(df, val)
+    returns = returns.iloc[1:]  # the first day has no previous close
+    if bench is None or len(returns) < MIN_DAYS:
+        return pd.DataFrame(columns=["beta", "alpha", "tracking_error", "sharpe", "max_drawdown", "window"])
+    window = min(window, len(returns))
+    stats = rolling(returns, bench.iloc[1:], window)
+    table = pd.DataFrame({k: v.iloc[-1] for k, v in stats.items()})
+    table['max_drawdown'] = max_drawdown(returns)
+    table['window'] = window
+    return table
@@ -0,0 +1,143 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+import synthetic  # noqa: E402  (benchmarks/ is on sys.path when run as a script)
+
+RESULTS_DIR = os.path.join(REPO_DIR, "benchmarks", "results")
+
+def _version():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def _reset_caches():
+    """Module-level caches must not leak from one workspace into the next."""
+    import price_cache
+    price_cache._index = None
+    price_cache._memory.clear()
+
+def measure(fn, trace=True):
+    """Wall time, CPU time and peak Python-heap MB of one call."""
+    if trace:
+        tracemalloc.start()
+    wall, cpu = time.perf_counter(), time.process_time()
+    error = None
+    try:
+        fn()
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    result = {"wall_s": round(time.perf_counter() - wall, 4), "cpu_s": round(time.process_time() - cpu, 4)}
+    if trace:
+        result["peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 2)
+        tracemalloc.stop()
+    if error:
+        result["error"] = error
+    return result
+
+def stages():
+    """Benchmarked stages in pipeline order; each is a zero-argument callable."""
+    import market_data, history_store, valuation, indicators, feature_store
+    import stock_tracker, history_logger, generate_report, analysis_pro
+
+    def holdings():
+        with open(os.path.join("data_hub", "portfolio.json")) as f: return json.load(f)
+
+    def archive_initial():
+        shutil.rmtree(history_logger.PARTITION_DIR)
+        history_logger.update_csv_history()
+
+    return [
+        ("load_history", lambda: history_store.load_frame()),
+        ("valuation", lambda: valuation.value_portfolio(history_store.load_frame(), holdings())),
+        ("indicators", lambda: indicators.compute_indicators(history_store.load_frame())),
+        ("feature_store_build", lambda: feature_store.update()),
+        ("fetch_histories", lambda: market_data.fetch_histories(list(holdings()), period="1y")),
+        ("track", stock_tracker.main),
+        ("feature_store_incremental", lambda: feature_store.update()),
+        ("archive_update", history_logger.update_csv_history),
+        ("archive_initial", archive_initial),
+        ("report", generate_report.main),
+        ("analysis", analysis_pro.main),
+    ]
+
+def run_preset(name, params, latency, rate_limit, trace, keep):
+    import market_data, price_cache
+    root = tempfile.mkdtemp(prefix=f"bench-{name}-")
+    cwd = os.getcwd()
+    gen = measure(lambda: synthetic.make_workspace(root, **params), trace=False)
+    os.chdir(root)
+    try:
+        _reset_caches()
+        price_cache.ENABLED = False  # every stage pays for its own fetches
+        provider = market_data.FakeProvider(latency=latency, rate_limit=rate_limit)
+        market_data.set_provider(provider)
+        results = {"generate": gen}
+        for stage, fn in stages():
+            calls = provider.calls
+            results[stage] = measure(fn, trace)
+            results[stage]["provider_calls"] = provider.calls - calls
+            print(f"  {stage:<26} {results[stage]['wall_s']:>9.3f}s  "
+                  f"{results[stage].get('peak_mb', 0):>9.1f} MB  {results[stage]['provider_calls']:>5} calls"
+                  + (f"  ERROR {results[stage]['error']}" if 'error' in results[stage] else ""))
+        return results
+    finally:
+        os.chdir(cwd)
+        price_cache.ENABLED = True
+        if not keep:
+            shutil.rmtree(root, ignore_errors=True)
+        else:
+            print(f"  workspace kept at {root}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks against synthetic portfolios")
+    parser.add_argument("--preset", action="append", choices=synthetic.PRESETS,
+                        help="scale to run (repeatable, default: small)")
+    parser.add_argument("--tickers", type=int, help="custom scale: number of tickers")
+    parser.add_argument("--rows", type=int, help="custom scale: history samples")
+    parser.add_argument("--freq", default="h", help="custom scale: sample spacing (pandas offset, e.g. h, min, or 'session' for trading-session minutes)")
+    parser.add_argument("--latency", type=float, default=0.0, help="fake provider seconds per call")
+    parser.add_argument("--rate-limit", type=int, default=None, help="fake provider calls per second")
+    parser.add_argument("--no-trace", action="store_true", help="skip tracemalloc (faster, no peak memory)")
+    parser.add_argument("--keep", action="store_true", help="keep the generated workspaces")
+    parser.add_argument("--out", help="results JSON path (default: benchmarks/results/<version>-<utc>.json)")
+    args = parser.parse_args()
+
+    runs = {p: synthetic.PRESETS[p] for p in (args.preset or [])}
+    if args.tickers or args.rows:
+        runs["custom"] = {"tickers": args.tickers or 6, "rows": args.rows or 11000, "freq": args.freq, "archive_days": 1260}
+    runs = runs or {"small": synthetic.PRESETS["small"]}
+
+    report = {
+        "version": _version(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "provider": {"latency": args.latency, "rate_limit": args.rate_limit},
+        "runs": {},
+    }
+    for name, params in runs.items():
+        print(f"[{name}] {params}")
+        stages_result = run_preset(name, params, args.latency, args.rate_limit, not args.no_trace, args.keep)
+        report["runs"][name] = {"params": params, "stages": stages_result}
+    report["max_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+    out = args.out or os.path.join(RESULTS_DIR, f"{report['version']}-{datetime.now(timezone.utc):%Y%m%dT%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, 'w') as f: json.dump(report, f, indent=2)
+    print(f"Results written to {out}")
+
+if __name__ == "__main__":
+    main()
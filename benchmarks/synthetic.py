@@ -0,0 +1,90 @@
+import json
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SESSION_MINUTES = 390  # 09:30-16:00, one regular trading session
+SESSION_DAYS = 252
+
+# Scales from today's tree (6 tickers, ~11k rows) up to a large minute-level book.
+# freq "session" means regular-session minutes on weekdays (no nights or weekends).
+# "large" is two years of them for 1000 tickers: ~197k rows, ~1.6 GB of history
+# store, which load_history then reads whole - run it only where that much disk
+# and memory are free. It is never part of the default run.
+PRESETS = {
+    "small": {"tickers": 6, "rows": 11000, "freq": "h", "archive_days": 1260},
+    "medium": {"tickers": 100, "rows": 50000, "freq": "h", "archive_days": 1260},
+    "large": {"tickers": 1000, "rows": 2 * SESSION_DAYS * SESSION_MINUTES, "freq": "session", "archive_days": 1260},
+}
+CHUNK_ROWS = 20000
+
+def tickers_for(n):
+    return [f"T{i:04d}" for i in range(n)]
+
+def random_walk(rng, rows, cols, start=None):
+    """Geometric random walk prices, rows x cols, starting between 20 and 500."""
+    start = rng.uniform(20, 500, cols) if start is None else start
+    steps = rng.normal(0, 0.002, (rows, cols))
+    return np.round(start * np.exp(np.cumsum(steps, axis=0)), 2)
+
+def session_index(rows):
+    """The last `rows` regular-session minutes, ending with the previous weekday's close."""
+    days = pd.bdate_range(end=pd.Timestamp.now().normalize() - pd.Timedelta(days=1), periods=-(-rows // SESSION_MINUTES))
+    offsets = pd.to_timedelta(np.arange(SESSION_MINUTES), unit="min") + pd.Timedelta(hours=9, minutes=30)
+    return pd.DatetimeIndex((days.values[:, None] + offsets.values[None, :]).ravel())[-rows:]
+
+def make_portfolio(root, tickers, rng):
+    holdings = {t: {"amount": int(rng.integers(1, 100)), "avg_price": round(float(rng.uniform(20, 500)), 2)} for t in tickers}
+    path = os.path.join(root, "data_hub", "portfolio.json")
+    with open(path, 'w') as f: json.dump(holdings, f, indent=2)
+    return holdings
+
+def make_history(root, tickers, rows, freq, rng, json_export=False):
+    """Fill the columnar history store (and optionally the legacy JSON) with synthetic samples."""
+    import history_store
+    store_dir = os.path.join(root, "data_hub", "history_store")
+    columns = tickers + ["SPY"]
+    if freq == "session":
+        index = session_index(rows)
+    else:
+        index = pd.date_range(end=pd.Timestamp.now().floor(freq), periods=rows, freq=freq)
+    last = None
+    for lo in range(0, rows, CHUNK_ROWS):
+        hi = min(lo + CHUNK_ROWS, rows)
+        block = random_walk(rng, hi - lo, len(columns), last)
+        last = block[-1]
+        history_store.append_frame(pd.DataFrame(block, index=index[lo:hi], columns=columns), store_dir)
+    if json_export:
+        history_store.export_json(os.path.join(root, "data_hub", "stock_history.json"), store_dir)
+
+def make_archive(root, tickers, days, rng):
+    """Ticker/month archive partitions, as history_logger writes them."""
+    import archive, history_logger
+    index = pd.bdate_range(end=pd.Timestamp.now().normalize(), periods=days)
+    closes = pd.DataFrame(random_walk(rng, days, len(tickers)), index=index, columns=tickers)
+    fx = pd.Series(3.6 + rng.normal(0, 0.05, days), index=index)
+    df = history_logger.build_history_frame(closes, {}, fx, {t: 20.0 for t in tickers})
+    archive.upsert(df, os.path.join(root, archive.PARTITION_DIR), reopen=True)
+
+def make_workspace(root, tickers=6, rows=11000, freq="h", archive_days=1260, seed=0, json_export=False):
+    """Create a self-contained data_hub under root for the scripts to run against."""
+    rng = np.random.default_rng(seed)
+    os.makedirs(os.path.join(root, "data_hub"), exist_ok=True)
+    names = tickers_for(tickers)
+    make_portfolio(root, names, rng)
+    make_history(root, names, rows, freq, rng, json_export)
+    make_archive(root, names, archive_days, rng)
+    return names
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Generate a synthetic data_hub workspace")
+    parser.add_argument("root")
+    parser.add_argument("--preset", choices=PRESETS, default="small")
+    parser.add_argument("--json", action="store_true", help="also write the legacy stock_history.json")
+    args = parser.parse_args()
+    make_workspace(args.root, json_export=args.json, **PRESETS[args.preset])
+    print(f"Workspace ready in {args.root}")
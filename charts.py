@@ -0,0 +1,167 @@
+import hashlib
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import metrics
+import storage
+
+# --- Paths & Config ---
+DATA_DIR = "data_hub"
+CACHE_FILE = os.path.join(DATA_DIR, "chart_cache.json")
+RENDER_VERSION = 1  # bump when a render function changes so every figure is redrawn
+DPI = int(os.environ["CHART_DPI"]) if os.environ.get("CHART_DPI") else None
+MAX_POINTS = int(os.environ["CHART_MAX_POINTS"]) if os.environ.get("CHART_MAX_POINTS") else None
+WORKERS = int(os.environ.get("CHART_WORKERS", min(3, os.cpu_count() or 1)))
+
+# --- Downsampling ---
+
+def lttb_indices(x, y, n):
+    """Largest-Triangle-Three-Buckets: indices of n points that keep the visual shape of (x, y)."""
+    size = len(x)
+    if n >= size or n < 3:
+        return np.arange(size)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(1, size - 1, n - 1).astype(int)
+    out = np.empty(n, dtype=int)
+    out[0], out[-1] = 0, size - 1
+    a = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nlo, nhi = edges[i + 1], (edges[i + 2] if i + 2 < n - 1 else size)
+        avg_x, avg_y = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(area.argmax())
+        out[i + 1] = a
+    return out
+
+def downsample(x, y, n):
+    """Drop NaNs and reduce a line to at most n points with LTTB."""
+    x, y = np.asarray(x), np.asarray(y, dtype=float)
+    keep = ~np.isnan(y)
+    x, y = x[keep], y[keep]
+    idx = lttb_indices(x.astype('datetime64[ns]').astype(np.int64) if x.dtype.kind == 'M' else x, y, n)
+    return x[idx], y[idx]
+
+def line(x, y, width_in, dpi):
+    """Downsampled (x, y) for a line drawn on a figure width_in inches wide."""
+    return downsample(x, y, MAX_POINTS or int(width_in * (DPI or dpi)))
+
+# --- Renderers (module level so worker processes can unpickle them) ---
+
+def _pyplot():
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+def _savefig(plt, path, dpi):
+    """Save the current figure so the old PNG is replaced whole, never left half-written.
+
+    path may also be an open binary file (render_bytes), which is written as PNG.
+    """
+    if hasattr(path, 'write'):
+        plt.savefig(path, format='png', dpi=dpi, bbox_inches='tight')
+        return
+    with storage.replacing(path, 'wb') as f:
+        plt.savefig(f, format=os.path.splitext(path)[1][1:] or 'png', dpi=dpi, bbox_inches='tight')
+
+def render_performance(path, data, dpi):
+    plt = _pyplot()
+    plt.figure(figsize=(12, 6))
+    plt.plot(data['x'], data['y'], label='My Portfolio', color='#007AFF', linewidth=3)
+    if 'spy_x' in data:
+        plt.plot(data['spy_x'], data['spy_y'], label='S&P 500 (SPY)', color='#FF9500', linestyle='--', alpha=0.8, linewidth=2)
+    plt.title('Performance vs Benchmark (Normalized to 100)', fontsize=14, fontweight='bold')
+    plt.grid(True, linestyle=':', alpha=0.6)
+    plt.legend(frameon=True, shadow=True)
+    _savefig(plt, path, dpi)
+    plt.close()
+
+def render_allocation(path, data, dpi):
+    plt = _pyplot()
+    values = data['values']
+    plt.figure(figsize=(10, 10))
+    colors = ['#FF595E', '#FFCA3A', '#8AC926', '#1982C4', '#6A4C93', '#4267B2']
+    plt.pie(values, labels=data['labels'], autopct='%1.1f%%', startangle=140, colors=colors[:len(values)], pctdistance=0.85, explode=[0.02]*len(values))
+    centre_circle = plt.Circle((0,0), 0.70, fc='white')
+    plt.gcf().gca().add_artist(centre_circle)
+    plt.title('Asset Allocation (USD Weight)', fontsize=16, fontweight='bold')
+    _savefig(plt, path, dpi)
+    plt.close()
+
+def render_predictions(path, data, dpi):
+    plt = _pyplot()
+    with plt.style.context('dark_background'):
+        plt.figure(figsize=(12, 6))
+        for label, x, y in data['series']:
+            plt.plot(x, y, label=label, alpha=0.8, linewidth=2)
+        plt.title("Portfolio Performance Comparison (Normalized)")
+        plt.legend(); _savefig(plt, path, dpi); plt.close()
+
+# --- Render Cache ---
+
+def fingerprint(render, data, dpi):
+    h = hashlib.sha256(f"{render.__name__}|{dpi}|{RENDER_VERSION}".encode())
+    def feed(obj):
+        if isinstance(obj, np.ndarray):
+            h.update(str(obj.dtype).encode()); h.update(np.ascontiguousarray(obj).tobytes())
+        elif isinstance(obj, (list, tuple)):
+            for item in obj: feed(item)
+        elif isinstance(obj, dict):
+            for k in sorted(obj): h.update(k.encode()); feed(obj[k])
+        else:
+            h.update(repr(obj).encode())
+    feed(data)
+    return h.hexdigest()
+
+def _load_cache():
+    try:
+        with open(CACHE_FILE, 'r') as f: return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_cache(cache):
+    storage.write_json(CACHE_FILE, cache, indent=2, sort_keys=True)
+
+def render_bytes(render, data, dpi):
+    """PNG of one figure in memory, for callers that serve charts instead of committing them."""
+    buf = io.BytesIO()
+    render(buf, data, DPI or dpi)
+    return buf.getvalue()
+
+def _render(job):
+    render, path, data, dpi = job
+    render(path, data, dpi)
+    return path
+
+def render_all(figures):
+    """Render figures whose data fingerprint changed; independent figures go to a process pool.
+
+    figures: list of (render_fn, path, data, dpi). Returns the paths actually redrawn.
+    """
+    cache = _load_cache()
+    jobs, digests = [], {}
+    for render, path, data, dpi in figures:
+        dpi = DPI or dpi
+        digest = fingerprint(render, data, dpi)
+        if cache.get(path) == digest and os.path.exists(path):
+            continue
+        jobs.append((render, path, data, dpi))
+        digests[path] = digest
+    if not jobs:
+        return []
+    if len(jobs) > 1 and WORKERS > 1:
+        with ProcessPoolExecutor(max_workers=min(WORKERS, len(jobs))) as pool:
+            done = list(pool.map(_render, jobs))
+    else:
+        done = [_render(job) for job in jobs]
+    with storage.lock(CACHE_FILE):  # re-read: another stage may have rendered meanwhile
+        cache = _load_cache()
+        cache.update({p: digests[p] for p in done})
+        _save_cache(cache)
+    for p in done:
+        metrics.wrote(p)
+    return done
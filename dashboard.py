@@ -0,0 +1,286 @@
+import argparse
+import hashlib
+import json
+import logging
+import math
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import pandas as pd
+import analysis_pro
+import charts
+import feature_store
+import fx
+import generate_report
+import history_store
+import retention
+import storage
+import valuation
+
+# --- Paths & Config ---
+DATA_DIR = "data_hub"
+PORTFOLIO_FILE = os.path.join(DATA_DIR, "portfolio.json")
+RISK_FILE = os.path.join(DATA_DIR, "risk_report.json")
+LOG_FILE = os.path.join(DATA_DIR, "error_log.txt")
+HOST = "127.0.0.1"
+PORT = 8050
+POLL_INTERVAL = 10.0  # seconds between checks for new samples
+CHART_DPI = 100
+HISTORY_POINTS = 1000  # points per series in /api/history (LTTB-downsampled)
+
+os.makedirs(DATA_DIR, exist_ok=True)
+logging.basicConfig(filename=LOG_FILE, level=logging.ERROR, format='%(asctime)s: %(message)s')
+
+# The server loads holdings, history and the indicator state once. A background
+# thread then checks the store's row count every POLL_INTERVAL; new samples are read
+# from the store's tail only and folded in: the forward-filled price matrix, the
+# USD totals and the as-of FX rates grow by the new rows, feature_store.ingest
+# advances the indicators, and valuation.summarize derives the figures from those
+# arrays. After each change every response (JSON and PNG, charts redrawn only when
+# their data changed) is rebuilt with its ETag and the whole set is swapped in at
+# once, so a request is a dict lookup that never reads a file, and a matching
+# If-None-Match gets a bodiless 304. A changed portfolio.json, or samples inserted
+# mid-history by a backfill, trigger a full reload. Nothing is written to data_hub.
+
+INDEX_HTML = """<!doctype html>
+<html><head><meta charset="utf-8"><title>Portfolio Dashboard</title>
+<style>body{font-family:sans-serif;margin:2em}table{border-collapse:collapse}td,th{padding:4px 10px;border-bottom:1px solid #ddd;text-align:right}
+img{max-width:48%;margin:1em 1% 0 0}</style></head>
+<body><h1>Portfolio Dashboard</h1><div id="summary"></div><table id="holdings"></table><table id="indicators"></table>
+<img data-src="/charts/performance.png"><img data-src="/charts/allocation.png"><img data-src="/charts/predictions.png">
+<script>
+const fmt = v => v === null ? "-" : (typeof v === "number" ? v.toLocaleString(undefined, {maximumFractionDigits: 2}) : v);
+function table(el, rows) {
+  if (!rows.length) return;
+  const cols = Object.keys(rows[0]);
+  el.innerHTML = "<tr>" + cols.map(c => `<th>${c}</th>`).join("") + "</tr>" +
+    rows.map(r => "<tr>" + cols.map(c => `<td>${fmt(r[c])}</td>`).join("") + "</tr>").join("");
+}
+let version = null;
+async function load() {
+  const s = await (await fetch("/api/summary")).json();
+  if (s.version === version) return;
+  version = s.version;
+  document.getElementById("summary").innerHTML = Object.entries(s).map(([k, v]) => `<b>${k}</b>: ${fmt(v)}`).join(" &nbsp; ");
+  table(document.getElementById("holdings"), await (await fetch("/api/holdings")).json());
+  table(document.getElementById("indicators"), await (await fetch("/api/indicators")).json());
+  document.querySelectorAll("img").forEach(i => i.src = i.dataset.src + "?v=" + version);
+}
+load(); setInterval(load, POLL_MS);
+</script></body></html>
+"""
+
+def _num(x, digits=4):
+    x = float(x)
+    return round(x, digits) if math.isfinite(x) else None
+
+def _stamp(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+class Dashboard:
+    """Portfolio state held in memory, and the prebuilt responses served from it."""
+
+    def __init__(self, store_dir=history_store.STORE_DIR, root=retention.ROLLUP_DIR, portfolio_path=PORTFOLIO_FILE,
+                 risk_path=RISK_FILE, poll_interval=POLL_INTERVAL):
+        self.store_dir, self.root = store_dir, root
+        self.portfolio_path, self.risk_path = portfolio_path, risk_path
+        self.poll_interval = poll_interval
+        self.resources = {}  # path -> (body, etag, content type); replaced whole, never mutated
+        self.version = 0
+        self._charts = {}  # chart path -> (fingerprint, png)
+        self.reload()
+
+    # --- State ---
+
+    def reload(self):
+        """Load holdings, history and indicators from the files (start-up, or when folding in is not enough)."""
+        self.holdings_stamp = _stamp(self.portfolio_path)
+        with open(self.portfolio_path, 'r') as f: self.holdings = json.load(f)
+        with storage.lock(self.store_dir):  # row count, history and feature tail must agree
+            self.rows = history_store.total_rows(self.store_dir)
+            self.df = retention.load_range(store_dir=self.store_dir, root=self.root)
+            self.features = feature_store.load_state()
+            if self.features['rows'] > self.rows:
+                self.features = {"rows": 0, "tickers": {}}
+            if self.rows > self.features['rows']:
+                feature_store.ingest(self.features, history_store.load_frame(self.store_dir, tail=self.rows - self.features['rows']))
+        self.tickers = [t for t in self.holdings if t in self.df.columns]
+        self.prices = valuation.price_matrix(self.df, self.tickers)
+        self.total_usd = np.nan_to_num(self.prices) @ valuation.amounts_of(self.holdings, self.tickers)
+        self.fx_stamp = _stamp(fx.FX_FILE)
+        self.rates = fx.rates_at(self.df['ts'])
+        self.risk_stamp = None
+        self.publish()
+
+    def _extend(self, new, rows):
+        """Fold samples appended to the store into the in-memory history."""
+        # The last forward-filled row seeds the fill, so a ticker missing from a new sample keeps its price
+        carry = pd.DataFrame(self.prices[-1:], columns=self.tickers)
+        prices = valuation.price_matrix(pd.concat([carry, new], ignore_index=True), self.tickers)[1:]
+        self.prices = np.concatenate([self.prices, prices])
+        self.total_usd = np.concatenate([self.total_usd, np.nan_to_num(prices) @ valuation.amounts_of(self.holdings, self.tickers)])
+        self.rates = np.concatenate([self.rates, fx.rates_at(new['ts'])])
+        self.df = pd.concat([self.df, new], ignore_index=True)
+        feature_store.ingest(self.features, new)
+        self.rows = rows
+
+    def refresh(self):
+        """Fold in whatever changed since the last look. Returns True when the responses were rebuilt."""
+        if _stamp(self.portfolio_path) != self.holdings_stamp or (self.df.empty and history_store.total_rows(self.store_dir)):
+            self.reload()
+            return True
+        if self.df.empty:
+            return False
+        with storage.lock(self.store_dir):
+            rows = history_store.total_rows(self.store_dir)
+            new = history_store.load_frame(self.store_dir, tail=rows - self.rows) if rows > self.rows else None
+        inserted = new is not None and (new['ts'].iloc[0] <= self.df['ts'].iloc[-1]
+                                        or bool(set(self.holdings) & set(new.columns) - set(self.tickers)))
+        if rows < self.rows or inserted:
+            self.reload()  # history rewritten, a backfill filled in the past, or a holding got its first price
+            return True
+        changed = new is not None
+        if changed:
+            self._extend(new, rows)
+        if _stamp(fx.FX_FILE) != self.fx_stamp:
+            self.fx_stamp = _stamp(fx.FX_FILE)
+            self.rates = fx.rates_at(self.df['ts'])  # a newly stored day re-rates the samples after it
+            changed = True
+        if _stamp(self.risk_path) != self.risk_stamp:
+            changed = True
+        if changed:
+            self.publish()
+        return changed
+
+    def watch(self, stop):
+        while not stop.wait(self.poll_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                logging.error(f"Dashboard refresh failed: {e}")
+
+    # --- Responses ---
+
+    def _views(self, val):
+        """JSON documents for the API, from the summarized state."""
+        summary = {
+            "updated": self.df['ts'].iloc[-1].strftime("%Y-%m-%d %H:%M:%S"),
+            "samples": len(self.df),
+            "usd_ils": _num(val['usd_ils_now']),
+            "current_val_usd": _num(val['current_val_usd'], 2),
+            "current_val_ils": _num(val['current_val_ils'], 2),
+            "total_invested_usd": _num(val['total_invested_usd'], 2),
+            "total_pnl_usd": _num(val['total_pnl_usd'], 2),
+            "total_pnl_ils": _num(val['total_pnl_ils'], 2),
+            "total_pnl_pct": _num(val['total_pnl_pct'], 2),
+            "daily_change_pct": _num(val['daily_change_pct'], 2),
+            "daily_change_ils_pct": _num(val['daily_change_ils_pct'], 2),
+        }
+        holdings = [{"ticker": t, "shares": _num(val['amounts'][i]), "avg_price": _num(val['avg_prices'][i], 2),
+                     "price": _num(val['current_prices'][i], 2), "weight_pct": _num(val['weights'][i] * 100, 2),
+                     "pnl_pct": _num(val['pnl_pct'][i], 2), "pnl_usd": _num(val['pnl_usd'][i], 2),
+                     "pnl_ils": _num(val['pnl_ils'][i], 2)}
+                    for i, t in enumerate(val['tickers'])]
+        table = feature_store.table(self.features, self.tickers)
+        indicators = [{"ticker": t, **{k: (bool(v) if isinstance(v, (bool, np.bool_)) else _num(v)) for k, v in row.items()}}
+                      for t, row in table.iterrows()]
+        epochs = self.df['ts'].to_numpy().astype('datetime64[s]').astype(np.int64)
+        idx = charts.lttb_indices(epochs, self.total_usd, HISTORY_POINTS)
+        history = {"ts": self.df['ts'].iloc[idx].dt.strftime("%Y-%m-%d %H:%M:%S").tolist(),
+                   "total_usd": [_num(v, 2) for v in self.total_usd[idx]],
+                   "total_ils": [_num(v, 2) for v in val['total_ils'].to_numpy()[idx]]}
+        return {"summary": summary, "holdings": holdings, "indicators": indicators, "history": history}, table
+
+    def _chart(self, name, render, data):
+        digest = charts.fingerprint(render, data, CHART_DPI)
+        if self._charts.get(name, (None,))[0] != digest:
+            self._charts[name] = (digest, charts.render_bytes(render, data, CHART_DPI))
+        return self._charts[name][1]
+
+    def publish(self):
+        """Rebuild every response from the in-memory state and swap the set in at once."""
+        self.version += 1
+        resources = {}
+        def add(path, body, content_type):
+            resources[path] = (body, '"' + hashlib.sha1(body).hexdigest()[:20] + '"', content_type)
+        add("/", INDEX_HTML.replace("POLL_MS", str(int(self.poll_interval * 1000))).encode(), "text/html; charset=utf-8")
+
+        self.risk_stamp = _stamp(self.risk_path)
+        if self.risk_stamp is not None:
+            with open(self.risk_path, 'rb') as f: add("/api/risk", f.read(), "application/json")
+
+        if self.df.empty or not self.tickers:
+            add("/api/summary", json.dumps({"version": self.version, "samples": 0}).encode(), "application/json")
+            self.resources = resources
+            return
+        val = valuation.summarize(self.holdings, self.tickers, self.df['ts'], self.prices, self.total_usd, self.rates)
+        views, table = self._views(val)
+        views['summary'] = {"version": self.version, **views['summary']}
+        for name, doc in views.items():
+            add(f"/api/{name}", json.dumps(doc).encode(), "application/json")
+
+        data = generate_report.chart_data(self.df, val, CHART_DPI)
+        add("/charts/performance.png", self._chart("performance", charts.render_performance, data['performance']), "image/png")
+        if 'allocation' in data:
+            add("/charts/allocation.png", self._chart("allocation", charts.render_allocation, data['allocation']), "image/png")
+        series = {"series": analysis_pro.prediction_series(self.df, table.index, CHART_DPI)}
+        add("/charts/predictions.png", self._chart("predictions", charts.render_predictions, series), "image/png")
+        self.resources = resources
+
+class Handler(BaseHTTPRequestHandler):
+    def do_HEAD(self):
+        self.do_GET(head=True)
+
+    def do_GET(self, head=False):
+        entry = self.server.dashboard.resources.get(self.path.split('?', 1)[0])
+        if entry is None:
+            self.send_error(404)
+            return
+        body, etag, content_type = entry
+        tags = [t.strip() for t in self.headers.get('If-None-Match', '').split(',')]
+        if etag in tags or '*' in tags:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'no-cache')  # revalidate every time; unchanged state costs a 304
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description="Local portfolio dashboard: JSON endpoints and charts served from memory")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--poll", type=float, default=POLL_INTERVAL, help="seconds between checks for new samples")
+    args = parser.parse_args()
+
+    history_store.ensure_store()
+    dashboard = Dashboard(poll_interval=args.poll)
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    server.dashboard = dashboard
+    stop = threading.Event()
+    threading.Thread(target=dashboard.watch, args=(stop,), daemon=True).start()
+    print(f"Serving {len(dashboard.df)} samples on http://{args.host}:{args.port}/ "
+          f"(/api/summary, /api/holdings, /api/indicators, /api/history, /api/risk, /charts/*.png)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+import json
+import math
+import os
+import numpy as np
+import pandas as pd
+import history_store
+import metrics
+import storage
+from indicators import MA_SHORT, MA_LONG, RSI_PERIOD
+
+# --- Paths & Config ---
+DATA_DIR = "data_hub"
+STATE_FILE = os.path.join(DATA_DIR, "feature_store.json")
+WILDER_ALPHA = 1 - 1 / RSI_PERIOD
+
+# Per-ticker running state, enough to produce the indicators.compute_indicators
+# columns without the history:
+#   count / mean / m2      Welford accumulators over all valid samples (z-score)
+#   window                 last MA_LONG valid prices, with sum_short / sum_long
+#   prev / moves           previous raw sample and the last RSI_PERIOD moves (RSI)
+#   n_moves / avg_*        Wilder-smoothed gain and loss (rsi_wilder)
+
+def _new_state():
+    return {"count": 0, "mean": 0.0, "m2": 0.0, "last": None,
+            "window": [], "sum_short": 0.0, "sum_long": 0.0,
+            "prev": None, "moves": [0.0] * RSI_PERIOD,
+            "n_moves": 0, "avg_gain": 0.0, "avg_loss": 0.0}
+
+def _wilder(avg, n_done, xs):
+    """Advance a Wilder average over xs: plain mean for the first RSI_PERIOD values, then smoothing."""
+    i = 0
+    while i < len(xs) and n_done < RSI_PERIOD:
+        n_done += 1
+        avg += (xs[i] - avg) / n_done
+        i += 1
+    rest = xs[i:]
+    if len(rest):
+        decay = WILDER_ALPHA ** np.arange(len(rest) - 1, -1, -1)
+        avg = avg * WILDER_ALPHA ** len(rest) + (rest * decay).sum() / RSI_PERIOD
+    return float(avg)
+
+def push(state, values):
+    """Fold new samples (NaN = no price) for one ticker into its state.
+
+    Cost is proportional to the number of new samples only; one sample is O(1).
+    """
+    values = np.asarray(values, dtype=float)
+    valid = values[~np.isnan(values)]
+
+    # RSI moves against the previous raw sample; a missing side counts as no move
+    prev = np.nan if state['prev'] is None else state['prev']
+    moves = np.nan_to_num(np.diff(np.concatenate(([prev], values))))
+    state['moves'] = (state['moves'] + moves.tolist())[-RSI_PERIOD:]
+    n_before = state['n_moves']
+    state['avg_gain'] = _wilder(state['avg_gain'], n_before, np.maximum(moves, 0))
+    state['avg_loss'] = _wilder(state['avg_loss'], n_before, np.maximum(-moves, 0))
+    state['n_moves'] = n_before + len(moves)
+    last = values[-1] if len(values) else np.nan
+    state['prev'] = state['last'] = None if np.isnan(last) else float(last)
+
+    if len(valid):
+        # Chan et al. merge of the batch into the Welford accumulators
+        n_a, n_b = state['count'], len(valid)
+        mean_b = valid.mean()
+        m2_b = ((valid - mean_b) ** 2).sum()
+        delta = mean_b - state['mean']
+        n = n_a + n_b
+        state['mean'] += delta * n_b / n
+        state['m2'] += m2_b + delta ** 2 * n_a * n_b / n
+        state['count'] = n
+
+        old = state['window']
+        window = (old + valid.tolist())[-MA_LONG:]
+        if n_b == 1:
+            # Single sample: slide both sums instead of re-adding the window
+            x = float(valid[0])
+            state['sum_long'] += x - (old[0] if len(old) == MA_LONG else 0.0)
+            state['sum_short'] += x - (old[-MA_SHORT] if len(old) >= MA_SHORT else 0.0)
+        else:
+            state['sum_long'] = math.fsum(window)
+            state['sum_short'] = math.fsum(window[-MA_SHORT:])
+        state['window'] = window
+    return state
+
+def _features(s, rows):
+    count = s['count']
+    std = math.sqrt(s['m2'] / (count - 1)) if count > 1 else float('nan')
+    last = float('nan') if s['last'] is None else s['last']
+    z_score = (last - s['mean']) / std if std > 0 else 0.0
+    window = len(s['window'])
+    gains = sum(m for m in s['moves'] if m > 0)
+    losses = -sum(m for m in s['moves'] if m < 0)
+    if rows < RSI_PERIOD or gains == losses == 0:
+        rsi = 50.0
+    else:
+        rsi = 100.0 if losses == 0 else 100 - 100 / (1 + gains / losses)
+    if s['n_moves'] < RSI_PERIOD or s['avg_gain'] == s['avg_loss'] == 0:
+        rsi_wilder = 50.0
+    else:
+        rsi_wilder = 100.0 if s['avg_loss'] == 0 else 100 - 100 / (1 + s['avg_gain'] / s['avg_loss'])
+    return {
+        "last": last,
+        "z_score": z_score,
+        "ma_short": s['sum_short'] / MA_SHORT if count >= MA_SHORT else float('nan'),
+        "ma_long": s['sum_long'] / window if window else float('nan'),
+        "momentum_ready": count >= MA_SHORT,
+        "rsi": rsi,
+        "rsi_wilder": rsi_wilder,
+        "mean": s['mean'] if count else float('nan'),
+        "std": std,
+        "count": count,
+    }
+
+def load_state(path=STATE_FILE):
+    try:
+        with open(path, 'r') as f: return json.load(f)
+    except (OSError, ValueError):
+        return {"rows": 0, "tickers": {}}
+
+def save_state(state, path=STATE_FILE):
+    storage.write_json(path, state)
+    metrics.wrote(path)
+
+def ingest(state, df):
+    """Fold a wide frame of new rows ('ts' + ticker columns) into the store state."""
+    cols = [c for c in df.columns if c != 'ts']
+    for t in set(cols) | set(state['tickers']):
+        values = df[t].to_numpy(dtype=float) if t in cols else np.full(len(df), np.nan)
+        push(state['tickers'].setdefault(t, _new_state()), values)
+    state['rows'] += len(df)
+    return state
+
+def update(store_dir=history_store.STORE_DIR, path=STATE_FILE):
+    """Catch the state up with the history store, reading only the rows it has not seen."""
+    with storage.lock(path), storage.lock(store_dir):  # no append may land between the count and the read
+        state = load_state(path)
+        rows = history_store.total_rows(store_dir)  # counts compacted rows too, so offsets stay stable
+        if state['rows'] > rows:
+            state = {"rows": 0, "tickers": {}}  # history was rebuilt; start over
+        if rows > state['rows']:
+            ingest(state, history_store.load_frame(store_dir, tail=rows - state['rows']))
+            save_state(state, path)
+        return state
+
+def rebuild(store_dir=history_store.STORE_DIR, path=STATE_FILE):
+    """Recompute the state from the samples still in the store, after rows were inserted mid-history."""
+    with storage.lock(path), storage.lock(store_dir):
+        state = {"rows": history_store.head_rows(store_dir), "tickers": {}}
+        ingest(state, history_store.load_frame(store_dir))
+        save_state(state, path)
+        return state
+
+def latest(tickers=None, store_dir=history_store.STORE_DIR, path=STATE_FILE):
+    """Current features per ticker, same columns as indicators.compute_indicators plus extras."""
+    return table(update(store_dir, path), tickers)
+
+def table(state, tickers=None):
+    """Feature frame (one row per ticker) from a state held in memory, without touching the store."""
+    if tickers is None:
+        tickers = sorted(state['tickers'])
+    tickers = [t for t in tickers if t in state['tickers']]
+    rows = [_features(state['tickers'][t], state['rows']) for t in tickers]
+    return pd.DataFrame(rows, index=pd.Index(tickers, name='ticker'))
@@ -0,0 +1,135 @@
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+import pandas as pd
+import pytz
+import market_data
+import metrics
+import storage
+
+# --- Paths & Config ---
+DATA_DIR = "data_hub"
+FUNDAMENTALS_FILE = os.path.join(DATA_DIR, "fundamentals.json")
+EVENTS_FILE = os.path.join(DATA_DIR, "corporate_actions.csv")
+EVENT_COLUMNS = ["date", "ticker", "action", "value"]
+FIELDS = ("trailingPE", "forwardPE", "dividendYield", "marketCap")  # kept from provider info
+ACTIONS = {"Dividends": "dividend", "Stock Splits": "split"}
+TZ = pytz.timezone('Israel')
+
+# fundamentals.json holds, per ticker, the info fields above and the date it was
+# last checked; a ticker is refreshed at most once a day. corporate_actions.csv is
+# an append-only log of dividend and split events. A ticker's first refresh reads
+# its full action history; later ones fetch only the days since it was last
+# checked and append events newer than the last one logged. Readers (pe_ratio,
+# dividends, splits) never touch the network.
+
+def load(path=FUNDAMENTALS_FILE):
+    try:
+        with open(path, 'r') as f: return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save(state, path=FUNDAMENTALS_FILE):
+    storage.write_json(path, state, indent=2, sort_keys=True)
+    metrics.wrote(path)
+
+def events(path=EVENTS_FILE):
+    """The whole event log (date, ticker, action, value), oldest first."""
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=EVENT_COLUMNS)
+    df = pd.read_csv(path, parse_dates=['date'])
+    metrics.read(len(df))
+    return df
+
+def _event_rows(ticker, frame):
+    """Log rows from a provider frame with 'Dividends' / 'Stock Splits' columns."""
+    if frame is None or frame.empty:
+        return pd.DataFrame(columns=EVENT_COLUMNS)
+    idx = pd.DatetimeIndex(frame.index)
+    days = (idx.tz_localize(None) if idx.tz is not None else idx).normalize()
+    parts = []
+    for column, action in ACTIONS.items():
+        if column not in frame:
+            continue
+        values = frame[column].to_numpy(dtype=float)
+        hit = values > 0
+        parts.append(pd.DataFrame({"date": days[hit], "ticker": ticker, "action": action, "value": values[hit]}))
+    return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=EVENT_COLUMNS)
+
+def _append_events(rows, path=EVENTS_FILE):
+    if rows.empty:
+        return 0
+    rows = rows.sort_values(['date', 'ticker', 'action'], kind='stable')
+    out = rows.assign(date=rows['date'].dt.strftime("%Y-%m-%d"), value=rows['value'].round(6))
+    header = not os.path.exists(path) or not os.path.getsize(path)
+    size = storage.append(path, out[EVENT_COLUMNS].to_csv(header=header, index=False))
+    metrics.add(rows_written=len(out), bytes_written=size)
+    return len(out)
+
+def refresh(tickers, now=None, path=FUNDAMENTALS_FILE, events_path=EVENTS_FILE):
+    """Update info fields and the event log for tickers not yet checked today. Returns the state."""
+    today = (now or datetime.now(TZ)).strftime("%Y-%m-%d")
+    with storage.lock(path):  # the tracker, archive and backfill all refresh on the same run
+        state = load(path)
+        stale = [t for t in tickers if state.get(t, {}).get('checked') != today]
+        if not stale:
+            return state
+
+        infos = market_data.fetch_info(stale)
+        log = events(events_path)
+        last_event = log.groupby('ticker')['date'].max() if not log.empty else pd.Series(dtype='datetime64[ns]')
+        new = [t for t in stale if 'checked' not in state.get(t, {})]
+        fetched = {t: _event_rows(t, a) for t, a in market_data.fetch_actions(new).items()} if new else {}
+        # Known tickers: only the days since their last check, one fetch per distinct start date
+        by_start = {}
+        for t in stale:
+            if t not in new:
+                by_start.setdefault(state[t]['checked'], []).append(t)
+        end = (pd.Timestamp(today) + timedelta(days=1)).strftime("%Y-%m-%d")
+        for start, group in by_start.items():
+            for t, hist in market_data.fetch_histories(group, start=start, end=end).items():
+                fetched[t] = _event_rows(t, hist)
+
+        rows = []
+        for t, ev in fetched.items():
+            if t in last_event.index:
+                ev = ev[ev['date'] > last_event[t]]
+            rows.append(ev)
+        _append_events(pd.concat(rows, ignore_index=True) if rows else pd.DataFrame(columns=EVENT_COLUMNS), events_path)
+
+        # A ticker counts as checked only once both of its fetches came back
+        for t in stale:
+            if t not in infos or t not in fetched:
+                logging.error(f"Fundamentals refresh incomplete for {t}")
+                continue
+            entry = {k: infos[t].get(k) for k in FIELDS}
+            entry['checked'] = today
+            state[t] = entry
+        save(state, path)
+        return state
+
+def pe_ratio(ticker, state=None):
+    value = (state if state is not None else load()).get(ticker, {}).get('trailingPE')
+    return float(value) if value is not None else None
+
+def _action(action, tickers, path):
+    log = events(path)
+    log = log[log['action'] == action]
+    return {t: rows.set_index('date')['value'] for t, rows in log.groupby('ticker') if tickers is None or t in tickers}
+
+def dividends(tickers=None, path=EVENTS_FILE):
+    """Dividend amounts per ticker as date-indexed Series, from the log."""
+    return _action("dividend", tickers, path)
+
+def splits(tickers=None, path=EVENTS_FILE):
+    return _action("split", tickers, path)
+
+if __name__ == "__main__":
+    with open(os.path.join(DATA_DIR, "portfolio.json"), 'r') as f: names = list(json.load(f))
+    state = refresh(names)
+    log = events()
+    for t in names:
+        entry = state.get(t, {})
+        print(f"{t:<8} P/E {entry.get('trailingPE') or float('nan'):>7.2f}  checked {entry.get('checked', '-')}  "
+              f"{(log['ticker'] == t).sum()} events")
@@ -0,0 +1,106 @@
+import logging
+import os
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+import pytz
+import market_data
+import metrics
+import storage
+
+# --- Paths & Config ---
+DATA_DIR = "data_hub"
+FX_FILE = os.path.join(DATA_DIR, "fx_usd_ils.csv")
+SYMBOL = "ILS=X"
+FIRST_PERIOD = "5y"  # depth fetched when there is no series yet, as history_logger's archive
+TZ = pytz.timezone('Israel')
+
+# One row per completed weekday (date, USD/ILS close), appended as days complete.
+# update() asks the provider only when the previous weekday is not stored yet, and
+# then only for the days after the last stored one - one small request a day at
+# most; every other lookup is served from the file. Rates are as-of: a timestamp
+# takes the close of the last stored day on or before it (the first one for
+# anything older).
+
+_cache = {}
+
+def series(path=FX_FILE):
+    """Stored daily USD/ILS closes as a Series indexed by date (re-read only when the file changes)."""
+    try:
+        stamp = os.stat(path).st_mtime_ns
+    except OSError:
+        return pd.Series(dtype=float, index=pd.DatetimeIndex([], name='date'), name='rate')
+    if _cache.get(path, (None,))[0] != stamp:
+        df = pd.read_csv(path, parse_dates=['date'])
+        metrics.read(len(df))
+        _cache[path] = (stamp, df.set_index('date')['rate'])
+    return _cache[path][1]
+
+def _daily(closes, before):
+    """Close per calendar day strictly before `before`, from a download_closes frame."""
+    if closes.empty or SYMBOL not in closes:
+        return pd.Series(dtype=float)
+    s = closes[SYMBOL].dropna()
+    idx = pd.DatetimeIndex(s.index)
+    s.index = (idx.tz_localize(None) if idx.tz is not None else idx).normalize()
+    s = s.groupby(level=0).last()
+    return s[s.index < before]
+
+def update(now=None, path=FX_FILE):
+    """Append the days completed since the last stored one. Returns the number of days added."""
+    today = pd.Timestamp((now or datetime.now(TZ)).date())
+    with storage.lock(path):  # parallel stages would otherwise fetch and append the same days
+        stored = series(path)
+        last = stored.index[-1] if len(stored) else None
+        if last is not None and last >= today - pd.offsets.BDay(1):
+            return 0
+        try:
+            if last is None:
+                closes = market_data.download_closes([SYMBOL], period=FIRST_PERIOD, interval="1d")
+            else:
+                closes = market_data.download_closes([SYMBOL], interval="1d", start=(last + timedelta(days=1)).strftime("%Y-%m-%d"),
+                                                     end=today.strftime("%Y-%m-%d"))
+        except Exception as e:
+            logging.error(f"FX update failed: {e}")
+            return 0
+        new = _daily(closes, today)
+        if last is not None:
+            new = new[new.index > last]
+        if new.empty:
+            return 0
+        frame = pd.DataFrame({"date": new.index.strftime("%Y-%m-%d"), "rate": np.round(new.to_numpy(dtype=float), 4)})
+        header = not os.path.exists(path) or not os.path.getsize(path)
+        size = storage.append(path, frame.to_csv(header=header, index=False))
+        metrics.add(rows_written=len(frame), bytes_written=size)
+        return len(frame)
+
+def rates_at(ts, path=FX_FILE):
+    """As-of USD/ILS rate for every timestamp in one searchsorted; NaN only when nothing is stored."""
+    s = series(path)
+    ts = pd.DatetimeIndex(ts)
+    if s.empty:
+        return np.full(len(ts), np.nan)
+    pos = np.searchsorted(s.index.to_numpy(), ts.normalize().to_numpy(), side='right') - 1
+    return s.to_numpy(dtype=float)[np.maximum(pos, 0)]
+
+def rates_for(ts, path=FX_FILE):
+    """rates_at for reports: (rates, approximate), seeding the series first when nothing is stored.
+
+    If the series still cannot be seeded, every timestamp takes today's live rate and
+    approximate is True; the rates are NaN only when the provider has no rate either.
+    """
+    if series(path).empty:
+        update(path=path)
+    rates = rates_at(ts, path)
+    if not series(path).empty:
+        return rates, False
+    live = market_data.latest_close(SYMBOL)
+    return np.full(len(rates), np.nan if live is None else float(live)), True
+
+def rate_at(ts=None, path=FX_FILE):
+    return float(rates_at([ts or datetime.now(TZ).replace(tzinfo=None)], path)[0])
+
+if __name__ == "__main__":
+    added = update()
+    s = series()
+    print(f"{added} day(s) added; {len(s)} stored" + (f", last {s.index[-1]:%Y-%m-%d} = {s.iloc[-1]:.4f}" if len(s) else ""))
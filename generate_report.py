@@ -1,20 +1,27 @@
 import json
-import pandas as pd
-import yfinance as yf
-import matplotlib.pyplot as plt
-from datetime import datetime, timedelta
+import numpy as np
+from datetime import datetime
 import pytz
 import os
+import history_store
+import retention
+import valuation
+import benchmark
+import charts
+import fx
+import metrics
+import storage
 import logging
 
 # --- Paths Configuration ---
 DATA_DIR = "data_hub"
-HISTORY_FILE = os.path.join(DATA_DIR, "stock_history.json")
 PORTFOLIO_FILE = os.path.join(DATA_DIR, "portfolio.json")
 LOG_FILE = os.path.join(DATA_DIR, "error_log.txt")
 CHART_FILE = os.path.join(DATA_DIR, "portfolio_performance.png")
 PIE_FILE = os.path.join(DATA_DIR, "asset_allocation.png")
+RISK_FILE = os.path.join(DATA_DIR, "risk_report.json")
 README_FILE = "README.md"
+CHART_DPI = 300
 TZ = pytz.timezone('Israel')
 
 os.makedirs(DATA_DIR, exist_ok=True)
@@ -22,124 +29,128 @@ os.makedirs(DATA_DIR, exist_ok=True)
 logging.basicConfig(filename=LOG_FILE, level=logging.ERROR, 
                     format='%(asctime)s - %(levelname)s - %(message)s')
 
-def get_live_usd_ils():
-    try:
-        ticker = yf.Ticker("ILS=X")
-        data = ticker.history(period="1d")
-        return data['Close'].iloc[-1] if not data.empty else 3.65
-    except Exception as e:
-        logging.error(f"Exchange rate error: {e}")
-        return 3.65
-
-def generate_visuals(df, holdings_data):
-    plt.switch_backend('Agg')
-    plt.rcParams['figure.dpi'] = 300
-    plt.rcParams['savefig.dpi'] = 300
-    
+def chart_data(df, val, dpi=CHART_DPI):
+    """Data of the performance chart and, when anything is held, the allocation donut"""
     # 1. Performance Graph
-    plt.figure(figsize=(12, 6))
-    portfolio_norm = (df['total_usd'] / df['total_usd'].iloc[0]) * 100
-    plt.plot(df['ts'], portfolio_norm, label='My Portfolio', color='#007AFF', linewidth=3)
-    
-    try:
-        spy = yf.Ticker("^GSPC").history(start=df['ts'].min(), end=df['ts'].max() + timedelta(days=1))
-        if not spy.empty:
-            spy.index = spy.index.tz_localize(None) 
-            spy_norm = (spy['Close'] / spy['Close'].iloc[0]) * 100
-            plt.plot(spy.index, spy_norm, label='S&P 500 (Benchmark)', color='#FF9500', linestyle='--', alpha=0.8, linewidth=2)
-    except Exception as e:
-        logging.error(f"Benchmark error: {e}")
-
-    plt.title('Performance vs Benchmark (Normalized to 100)', fontsize=14, fontweight='bold')
-    plt.grid(True, linestyle=':', alpha=0.6)
-    plt.legend(frameon=True, shadow=True)
-    plt.savefig(CHART_FILE, dpi=300, bbox_inches='tight')
-    plt.close()
+    portfolio_norm = (val['total_usd'] / val['total_usd'].iloc[0]) * 100
+    x, y = charts.line(df['ts'].to_numpy(), portfolio_norm.to_numpy(), 12, dpi)
+    data = {"performance": {"x": x, "y": y}}
+    # SPY is sampled into every history row by stock_tracker, so no benchmark download is needed
+    if 'SPY' in df.columns and df['SPY'].notna().any():
+        spy = df[['ts', 'SPY']].dropna()
+        spy_norm = (spy['SPY'] / spy['SPY'].iloc[0]) * 100
+        data['performance']["spy_x"], data['performance']["spy_y"] = charts.line(spy['ts'].to_numpy(), spy_norm.to_numpy(), 12, dpi)
 
     # 2. Asset Allocation (Donut)
-    plt.figure(figsize=(10, 10))
-    last_row = df.iloc[-1]
-    tickers = list(holdings_data.keys())
-    values = [last_row[t] * holdings_data[t]['amount'] for t in tickers if t in last_row and pd.notnull(last_row[t])]
-    labels = [t for t in tickers if t in last_row and pd.notnull(last_row[t])]
-    
+    held = ~np.isnan(val['positions_usd'])
+    values = val['positions_usd'][held].tolist()
+    labels = [t for t, h in zip(val['tickers'], held) if h]
     if values:
-        colors = ['#FF595E', '#FFCA3A', '#8AC926', '#1982C4', '#6A4C93', '#4267B2']
-        plt.pie(values, labels=labels, autopct='%1.1f%%', startangle=140, colors=colors[:len(values)], pctdistance=0.85, explode=[0.02]*len(values))
-        centre_circle = plt.Circle((0,0), 0.70, fc='white')
-        plt.gcf().gca().add_artist(centre_circle)
-        plt.title('Asset Allocation (USD Weight)', fontsize=16, fontweight='bold')
-        plt.savefig(PIE_FILE, dpi=300, bbox_inches='tight')
-    plt.close()
-
-def main():
-    if not os.path.exists(HISTORY_FILE) or not os.path.exists(PORTFOLIO_FILE):
+        data['allocation'] = {"values": values, "labels": labels}
+    return data
+
+def generate_visuals(df, val):
+    """Redraws only the charts whose underlying data changed since the last run"""
+    data = chart_data(df, val)
+    figures = [(charts.render_performance, CHART_FILE, data['performance'], CHART_DPI)]
+    if 'allocation' in data:
+        figures.append((charts.render_allocation, PIE_FILE, data['allocation'], CHART_DPI))
+    charts.render_all(figures)
+
+def ils(value, fmt=",.0f", approx=False):
+    """₪ amount for the README: '≈' when converted at a live rate, '—' when there is no rate at all"""
+    if np.isnan(value):
+        return "—"
+    return f"{'≈' if approx else ''}₪{value:{fmt}}"
+
+def risk_rows(usd_to_ils, approx=False):
+    """Monte Carlo summary written by risk.py, if it has run"""
+    try:
+        with open(RISK_FILE, 'r') as f: risk = json.load(f)
+    except (OSError, ValueError):
+        return []
+    dd = risk['drawdown_pct']
+    return [
+        f"| **1-Day VaR / CVaR (95%)** | `{ils(risk['var_1d_95'] * usd_to_ils, approx=approx)}` / `{ils(risk['cvar_1d_95'] * usd_to_ils, approx=approx)}` | **הפסד יומי חריג** |",
+        f"| **1-Day VaR / CVaR (99%)** | `{ils(risk['var_1d_99'] * usd_to_ils, approx=approx)}` / `{ils(risk['cvar_1d_99'] * usd_to_ils, approx=approx)}` | **הפסד יומי קיצוני** |",
+        f"| **10-Day VaR / CVaR (99%)** | `{ils(risk['var_10d_99'] * usd_to_ils, approx=approx)}` / `{ils(risk['cvar_10d_99'] * usd_to_ils, approx=approx)}` | **הפסד ל-10 ימים** |",
+        f"| **Max Drawdown, next {risk['horizon_days']}d (median / 95%)** | `{dd['p50']:.1f}%` / `{dd['p95']:.1f}%` | **ירידה מהשיא** |",
+        f"| **Simulation** | {risk['paths']:,} paths ({risk['method']}), {risk['history_days']} days of history | **סימולציה** |",
+    ]
+
+def benchmark_rows(table):
+    """benchmark.summary table as README rows, portfolio first"""
+    def pct(x, sign="+"): return "—" if np.isnan(x) else f"{x * 100:{sign}.1f}%"
+    def num(x): return "—" if np.isnan(x) else f"{x:.2f}"
+    return [f"| {'**Portfolio**' if name == 'portfolio' else name} | {num(r['beta'])} | {pct(r['alpha'])} | "
+            f"{pct(r['tracking_error'], '')} | {num(r['sharpe'])} | {pct(-r['max_drawdown'])} |"
+            for name, r in table.iterrows()]
+
+def pipeline_health_rows():
+    """One table row per stage from the tail of the metrics log"""
+    rows = []
+    for r in metrics.health(metrics.load_records()):
+        status = {"ok": "🟢", "skipped": "⏭️", "failed": "🔴"}.get(r.get('status'), "⚪")
+        net = f"{r.get('network_calls', 0)}"
+        if r.get('network_calls'):
+            net += f" ({r['network_s'] / r['network_calls'] * 1000:.0f} ms avg)"
+        rows.append(f"| {r['stage']} | {status} {r.get('status')} | {r.get('ts', '')} | {r.get('wall_s', 0):.2f}s | "
+                    f"{r.get('cpu_s', 0):.2f}s | {r.get('peak_rss_mb', 0):.0f} MB | {net} | "
+                    f"{r.get('rows_written', 0):,} / {r.get('bytes_written', 0) / 1024:,.0f} KB | {r['failures']}/{r['runs']} |")
+    return rows
+
+def main(holdings=None, df=None):
+    if holdings is None and not os.path.exists(PORTFOLIO_FILE):
         return
 
     try:
-        with open(PORTFOLIO_FILE, 'r') as f: holdings = json.load(f)
-        with open(HISTORY_FILE, 'r') as f: history = json.load(f)
+        if holdings is None:
+            with open(PORTFOLIO_FILE, 'r') as f: holdings = json.load(f)
+        if df is None:
+            history_store.ensure_store()
+            df = retention.load_range()
     except Exception as e:
-        logging.error(f"JSON Load error: {e}")
+        logging.error(f"History Load error: {e}")
         return
 
-    if not history: return
+    if df.empty: return
 
-    usd_to_ils = get_live_usd_ils()
-    tickers = list(holdings.keys())
-    
-    df = pd.DataFrame([{"ts": e['timestamp'], **e['prices']} for e in history])
-    df['ts'] = pd.to_datetime(df['ts']).dt.tz_localize(None)
-    df = df.sort_values('ts')
-    
-    # Fill missing prices
-    price_cols = [t for t in tickers if t in df.columns]
-    df[price_cols] = df[price_cols].ffill()
-    
-    # Calculate Total Value (New structure)
-    df['total_usd'] = df.apply(lambda r: sum(r[t] * holdings[t]['amount'] for t in tickers if t in r and pd.notnull(r[t])), axis=1)
-    
-    current_val_usd = df['total_usd'].iloc[-1]
-    
-    # 1. Total Invested (Cost Basis)
-    total_invested_usd = sum(h['amount'] * h['avg_price'] for h in holdings.values())
-    total_pnl_usd = current_val_usd - total_invested_usd
-    total_pnl_pct = (total_pnl_usd / total_invested_usd) * 100
+    # One matrix-vector product values the whole history; each row is converted at
+    # its own as-of rate from the stored FX series (kept current by stock_tracker).
+    # Until that series can be seeded, ILS figures use today's live rate and are marked ≈
+    rates, approx = fx.rates_for(df['ts'])
+    val = valuation.value_portfolio(df, holdings, rates)
+    usd_to_ils = val['usd_ils_now']
+    total_pnl_pct = val['total_pnl_pct']
+    daily_change_pct = val['daily_change_pct']
+    daily_change_ils = "—" if np.isnan(val['daily_change_ils_pct']) else f"{val['daily_change_ils_pct']:+.2f}%"
 
-    # 2. Daily Change
-    one_day_ago = df['ts'].max() - timedelta(days=1)
-    past_day_df = df[df['ts'] <= one_day_ago]
-    prev_val_usd = past_day_df['total_usd'].iloc[-1] if not past_day_df.empty else df['total_usd'].iloc[0]
-    daily_change_pct = ((current_val_usd / prev_val_usd) - 1) * 100
-    daily_change_ils = (current_val_usd - prev_val_usd) * usd_to_ils
-
-    generate_visuals(df, holdings)
+    generate_visuals(df, val)
 
     # --- Build Stock Table ---
     stock_rows = []
-    for t in tickers:
-        if t in df.columns:
-            curr_p = df[t].iloc[-1]
-            avg_p = holdings[t]['avg_price']
-            amt = holdings[t]['amount']
-            gain_pct = ((curr_p / avg_p) - 1) * 100
-            gain_ils = (curr_p - avg_p) * amt * usd_to_ils
-            emoji = "🟢" if gain_pct > 0 else "🔴"
-            stock_rows.append(f"| {t} | {amt} | ${avg_p:,.2f} | ${curr_p:,.2f} | {emoji} {gain_pct:+.2f}% | ₪{gain_ils:,.0f} |")
+    for i, t in enumerate(val['tickers']):
+        curr_p = val['current_prices'][i]
+        avg_p = val['avg_prices'][i]
+        amt = holdings[t]['amount']
+        gain_pct = val['pnl_pct'][i]
+        gain_ils = val['pnl_ils'][i]
+        emoji = "🟢" if gain_pct > 0 else "🔴"
+        stock_rows.append(f"| {t} | {amt} | ${avg_p:,.2f} | ${curr_p:,.2f} | {emoji} {gain_pct:+.2f}% | {ils(gain_ils, approx=approx)} |")
 
     update_time = datetime.now(TZ).strftime('%d/%m/%Y %H:%M')
     
     output = [
         f"# 📊 Portfolio Dashboard | מעקב תיק השקעות",
-        f"**Last Update:** {update_time} | **USD/ILS:** ₪{usd_to_ils:.3f}\n",
+        f"**Last Update:** {update_time} | **USD/ILS:** {ils(usd_to_ils, '.3f', approx)}\n",
         
         f"## 💰 Portfolio Summary | סיכום התיק",
         f"| Metric | Value | נתון |",
         f"| :--- | :--- | :--- |",
-        f"| **Current Value** | `₪{current_val_usd * usd_to_ils:,.0f}` | **שווי נוכחי** |",
-        f"| **Total Invested** | `₪{total_invested_usd * usd_to_ils:,.0f}` | **סך השקעה** |",
-        f"| **Total Profit/Loss** | `{total_pnl_pct:+.2f}%` (₪{total_pnl_usd * usd_to_ils:,.0f}) | **רווח/הפסד כולל** |",
-        f"| **Daily Change** | `{daily_change_pct:+.2f}%` | **שינוי יומי** |",
+        f"| **Current Value** | `{ils(val['current_val_ils'], approx=approx)}` | **שווי נוכחי** |",
+        f"| **Total Invested** | `{ils(val['total_invested_ils'], approx=approx)}` | **סך השקעה** |",
+        f"| **Total Profit/Loss** | `{total_pnl_pct:+.2f}%` ({ils(val['total_pnl_ils'], approx=approx)}) | **רווח/הפסד כולל** |",
+        f"| **Daily Change** | `{daily_change_pct:+.2f}%` (₪ `{daily_change_ils}`) | **שינוי יומי** |",
         
         f"\n## 📜 Holdings | פירוט החזקות",
         f"| Ticker | Shares | Avg. Cost | Current Price | P&L % | P&L ILS |",
@@ -149,12 +160,40 @@ def main():
         f"\n## 📈 Charts | גרפים",
         f"![Performance](./{CHART_FILE})",
         f"![Allocation](./{PIE_FILE})",
+    ]
+    rows = risk_rows(usd_to_ils, approx)
+    if rows:
+        output += [
+            f"\n## 🎲 Risk (Monte Carlo) | ניתוח סיכונים",
+            f"| Metric | Value | נתון |",
+            f"| :--- | :--- | :--- |",
+            "\n".join(rows),
+        ]
+    # Against the SPY column already in the history - no benchmark download
+    bench = benchmark.summary(df, val)
+    if len(bench):
+        output += [
+            f"\n## 📐 vs. S&P 500 (SPY), last {bench['window'].iloc[0]} trading days | מול המדד",
+            f"| Asset | Beta | Alpha (ann.) | Tracking Error | Sharpe | Max Drawdown |",
+            f"| :--- | :--- | :--- | :--- | :--- | :--- |",
+            "\n".join(benchmark_rows(bench)),
+        ]
+    health_rows = pipeline_health_rows()
+    if health_rows:
+        output += [
+            f"\n## 🩺 Pipeline Health | תקינות המערכת",
+            f"| Stage | Status | Last Run | Wall | CPU | Peak RSS | Network Calls | Rows / Bytes Written | Failures |",
+            f"| :--- | :--- | :--- | :--- | :--- | :--- | :--- | :--- | :--- |",
+            "\n".join(health_rows),
+        ]
+    output += [
         f"\n---",
         f"📂 *Created by Almog787*"
     ]
 
-    with open(README_FILE, 'w', encoding='utf-8') as f:
-        f.write("\n".join(output))
+    storage.write_text(README_FILE, "\n".join(output))
+    metrics.wrote(README_FILE)
 
 if __name__ == "__main__":
-    main()
+    with metrics.stage("report"):
+        main()
@@ -6,10 +6,10 @@ from datetime import datetime, timedelta
 import pytz
 import os
 import logging
+import history_store
 
 # --- Paths Configuration ---
 DATA_DIR = "data_hub"
-HISTORY_FILE = os.path.join(DATA_DIR, "stock_history.json")
 PORTFOLIO_FILE = os.path.join(DATA_DIR, "portfolio.json")
 LOG_FILE = os.path.join(DATA_DIR, "error_log.txt")
 CHART_FILE = os.path.join(DATA_DIR, "portfolio_performance.png")
@@ -73,25 +73,22 @@ def generate_visuals(df, holdings_data):
     plt.close()
 
 def main():
-    if not os.path.exists(HISTORY_FILE) or not os.path.exists(PORTFOLIO_FILE):
+    if not os.path.exists(PORTFOLIO_FILE):
         return
 
     try:
         with open(PORTFOLIO_FILE, 'r') as f: holdings = json.load(f)
-        with open(HISTORY_FILE, 'r') as f: history = json.load(f)
+        history_store.ensure_store()
+        df = history_store.load_frame()
     except Exception as e:
-        logging.error(f"JSON Load error: {e}")
+        logging.error(f"History Load error: {e}")
         return
 
-    if not history: return
+    if df.empty: return
 
     usd_to_ils = get_live_usd_ils()
     tickers = list(holdings.keys())
     
-    df = pd.DataFrame([{"ts": e['timestamp'], **e['prices']} for e in history])
-    df['ts'] = pd.to_datetime(df['ts']).dt.tz_localize(None)
-    df = df.sort_values('ts')
-    
     # Fill missing prices
     price_cols = [t for t in tickers if t in df.columns]
     df[price_cols] = df[price_cols].ffill()
@@ -1,126 +1,165 @@
 import json
+import numpy as np
 import pandas as pd
-import yfinance as yf
+import archive
+import archive_index
+import backfill
+import fundamentals
+import fx
+import market_data
+import metrics
 import os
 from datetime import datetime
 import pytz
 
 # --- הגדרות נתיבים ---
 DATA_DIR = "data_hub"
-HISTORY_DIR = os.path.join(DATA_DIR, "price_history_archive")
-INDIVIDUAL_DIR = os.path.join(HISTORY_DIR, "individual_stocks") # תיקייה לקבצים נפרדים
+HISTORY_DIR = archive.ARCHIVE_DIR
+PARTITION_DIR = archive.PARTITION_DIR # מחיצה לכל מניה וחודש
 PORTFOLIO_FILE = os.path.join(DATA_DIR, "portfolio.json")
-CSV_HISTORY_FILE = os.path.join(HISTORY_DIR, "full_stocks_extended_history.csv")
 TZ = pytz.timezone('Israel')
 
 # יצירת תיקיות אם לא קיימות
 os.makedirs(HISTORY_DIR, exist_ok=True)
-os.makedirs(INDIVIDUAL_DIR, exist_ok=True)
+
+ARCHIVE_COLUMNS = archive.COLUMNS
+TS_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+def _naive_index(index):
+    """מסיר אזור זמן ומשאיר את השעה המקומית של הבורסה"""
+    index = pd.DatetimeIndex(index)
+    return index.tz_localize(None) if index.tz is not None else index
+
+def _daily_series(series):
+    """ממפה סדרה לפי תאריך מסחר (ללא שעה ואזור זמן) כדי שכל המקורות יתיישרו"""
+    if series is None or series.empty:
+        return pd.Series(dtype=float)
+    if isinstance(series, pd.DataFrame):
+        series = series.iloc[:, 0]
+    series = series.dropna()
+    series.index = _naive_index(series.index).normalize()
+    return series.groupby(level=0).last().sort_index()
+
+def build_history_frame(closes, dividends, usd_ils_hist, pe_ratios):
+    """בונה את הטבלה הארוכה (timestamp, ticker, ...) מכל המניות בפעולה וקטורית אחת.
+
+    closes: טבלה רחבה של מחירי סגירה (תאריך x מניה), dividends / pe_ratios: מילונים לפי מניה.
+    """
+    closes = closes.copy()
+    closes.index = _naive_index(closes.index)
+    days = closes.index.normalize()
+
+    events = {t: pd.Series(d.to_numpy(), index=_naive_index(d.index).normalize())
+              for t, d in dividends.items() if d is not None and not d.empty}
+    divs = pd.concat(events).groupby(level=[1, 0]).sum().unstack() if events else pd.DataFrame()
+    divs = divs.reindex(index=days.unique(), columns=closes.columns).fillna(0).reindex(days)
+    divs.index = closes.index
+
+    # שער חליפין לפי as-of: השער האחרון הידוע עד אותו יום (NaN רק כשאין שער בכלל)
+    usd_ils = _daily_series(usd_ils_hist)
+    rates = usd_ils.reindex(days, method='ffill').bfill() if not usd_ils.empty else pd.Series(np.nan, index=days)
+    rates = rates.to_numpy()
+
+    n_rows, n_tickers = closes.shape
+    prices = closes.to_numpy(dtype=float).T.ravel()
+    df = pd.DataFrame({
+        "timestamp": np.tile(closes.index.strftime(TS_FORMAT).to_numpy(), n_tickers),
+        "ticker": np.repeat(closes.columns.to_numpy(), n_rows),
+        "price": np.round(prices, 2),
+        "dividend": np.round(divs.to_numpy(dtype=float).T.ravel(), 2),
+        "pe_ratio": np.nan,
+        "usd_ils": np.round(np.tile(rates, n_tickers), 4),
+    })
+    df = df[~np.isnan(prices)].reset_index(drop=True)
+
+    # מכפיל רווח נוכחי רק בשורה האחרונה של כל מניה
+    last_rows = df.index[~df['ticker'].duplicated(keep='last')]
+    df.loc[last_rows, 'pe_ratio'] = df.loc[last_rows, 'ticker'].map(pe_ratios).astype(float)
+    return df
 
 def fetch_comprehensive_history(tickers):
     """מושך היסטוריה מלאה של מחירים, דיבידנדים ושערי חליפין (5 שנים)"""
-    all_data = []
-    
-    print("Fetching historical exchange rates (USD/ILS)...")
-    usd_ils_hist = yf.download("ILS=X", period="5y", interval="1d", progress=False)['Close']
-
-    for ticker in tickers:
-        print(f"Fetching full 5-year history for {ticker}...")
-        stock = yf.Ticker(ticker)
-        hist = stock.history(period="5y")
-        dividends = stock.dividends
-        current_pe = stock.info.get('trailingPE', None)
-
-        for date, row in hist.iterrows():
-            date_str = date.strftime('%Y-%m-%d %H:%M:%S')
-            
-            div_val = 0
-            if date in dividends.index:
-                div_val = float(dividends.loc[date])
-            
-            exchange_rate = 3.65 
-            if date in usd_ils_hist.index:
-                exchange_rate = float(usd_ils_hist.loc[date])
-
-            all_data.append({
-                "timestamp": date_str,
-                "ticker": ticker,
-                "price": round(float(row['Close']), 2),
-                "dividend": round(div_val, 2),
-                "pe_ratio": current_pe if date == hist.index[-1] else None,
-                "usd_ils": round(exchange_rate, 4)
-            })
-            
-    return pd.DataFrame(all_data)
-
-def save_individual_files(df):
-    """מפצל את ה-DataFrame המאוחד לקבצים נפרדים לכל מניה"""
-    tickers = df['ticker'].unique()
-    for ticker in tickers:
-        ticker_df = df[df['ticker'] == ticker]
-        file_path = os.path.join(INDIVIDUAL_DIR, f"{ticker}_history.csv")
-        ticker_df.to_csv(file_path, index=False, encoding='utf-8')
-    print(f"Updated {len(tickers)} individual stock files in {INDIVIDUAL_DIR}")
-
-def update_csv_history():
-    if not os.path.exists(PORTFOLIO_FILE):
+    print("Updating stored exchange rates (USD/ILS)...")
+    fx.update()
+    usd_ils_hist = fx.series()
+
+    print(f"Fetching full 5-year history for {len(tickers)} tickers...")
+    closes = market_data.download_closes(tickers, period="5y", interval="1d")
+
+    # מכפיל רווח ודיבידנדים מהמטמון היומי ויומן האירועים - לא מהרשת בכל הרצה
+    state = fundamentals.refresh(tickers)
+    dividends = fundamentals.dividends(tickers)
+    pe_ratios = {t: fundamentals.pe_ratio(t, state) for t in tickers}
+
+    return build_history_frame(closes.dropna(how='all'), dividends, usd_ils_hist, pe_ratios)
+
+def update_csv_history(holdings=None):
+    if holdings is None and not os.path.exists(PORTFOLIO_FILE):
         print("Portfolio file not found.")
         return
     
-    with open(PORTFOLIO_FILE, 'r') as f:
-        holdings = json.load(f)
+    if holdings is None:
+        with open(PORTFOLIO_FILE, 'r') as f:
+            holdings = json.load(f)
     tickers = list(holdings.keys())
 
-    if not os.path.exists(CSV_HISTORY_FILE):
-        # הרצה ראשונה - בנייה מאפס
+    if not archive.ensure_archive():
+        # הרצה ראשונה - בנייה מאפס (קובץ CSV ישן, אם קיים, מפוצל למחיצות ב-ensure_archive)
         print("Initial run: Building full historical database...")
         combined_df = fetch_comprehensive_history(tickers)
+        written = archive.upsert(combined_df, reopen=True)
+        archive_index.build()
+        print(f"Wrote {len(combined_df)} rows into {written} partitions in {PARTITION_DIR}")
     else:
-        # עדכון שוטף - הוספת נתוני היום
+        # עדכון שוטף - קודם השלמת ימים חסרים (מניה חדשה, הרצות שהוחמצו), אחר כך נתוני היום
+        state = fundamentals.refresh(tickers)
+        requests = backfill.fill_archive(tickers)
+        if requests:
+            print(f"Backfilled {len(requests)} gap(s) in the archive")
         print("Existing history found. Fetching today's update...")
         current_time = datetime.now(TZ).strftime("%Y-%m-%d %H:%M:%S")
         
-        # שער חליפין נוכחי
-        try:
-            usd_ils = yf.Ticker("ILS=X").history(period="1d")['Close'].iloc[-1]
-        except:
-            usd_ils = 3.65
+        # שער חליפין מהסדרה השמורה - בקשה לרשת רק כשנסגר יום מסחר חדש
+        fx.update()
+        usd_ils = fx.rate_at()
+
+        # בקשה מרוכזת אחת למחירים; דיבידנד ומכפיל רווח נקראים מהמטמון בלי רשת
+        closes = market_data.download_closes(tickers, period="1d", interval="1d")
+        dividends = fundamentals.dividends(tickers)
+        today = pd.Timestamp(current_time).normalize()
 
         new_entries = []
         for ticker in tickers:
-            try:
-                stock = yf.Ticker(ticker)
-                hist = stock.history(period="1d")
-                if hist.empty: continue
-                
-                price = round(hist['Close'].iloc[-1], 2)
-                divs = stock.dividends
-                today_div = round(divs.iloc[-1], 2) if not divs.empty and (datetime.now().date() == divs.index[-1].date()) else 0
-                pe = stock.info.get('trailingPE', None)
-
-                new_entries.append({
-                    "timestamp": current_time,
-                    "ticker": ticker,
-                    "price": price,
-                    "dividend": today_div,
-                    "pe_ratio": round(pe, 2) if pe else None,
-                    "usd_ils": round(usd_ils, 4)
-                })
-            except Exception as e:
-                print(f"Error updating {ticker}: {e}")
-
-        new_df = pd.DataFrame(new_entries)
-        old_df = pd.read_csv(CSV_HISTORY_FILE)
-        combined_df = pd.concat([old_df, new_df], ignore_index=True)
-        combined_df.drop_duplicates(subset=['timestamp', 'ticker'], keep='last', inplace=True)
-    
-    # שמירת הקובץ המאוחד הראשי
-    combined_df.to_csv(CSV_HISTORY_FILE, index=False, encoding='utf-8')
-    
-    # פיצול ושמירה לקבצים נפרדים
-    save_individual_files(combined_df)
-    
+            prices = closes[ticker].dropna() if ticker in closes else pd.Series(dtype=float)
+            if prices.empty: continue
+
+            price = round(prices.iloc[-1], 2)
+            divs = dividends.get(ticker)
+            today_div = round(float(divs[divs.index == today].sum()), 2) if divs is not None else 0
+            pe = fundamentals.pe_ratio(ticker, state)
+
+            new_entries.append({
+                "timestamp": current_time,
+                "ticker": ticker,
+                "price": price,
+                "dividend": today_div,
+                "pe_ratio": round(pe, 2) if pe else None,
+                "usd_ils": round(usd_ils, 4)
+            })
+
+        new_df = pd.DataFrame(new_entries, columns=ARCHIVE_COLUMNS)
+        if new_df.empty:
+            print("No new prices.")
+            return
+
+        # כתיבה למחיצה של החודש הנוכחי בלבד: הוספה לסוף, או מיזוג לפי מפתח אם הרגע כבר נשמר
+        archive_index.ensure_index()
+        archive.upsert(new_df)
+        archive_index.append(new_df)
+        print(f"Upserted {len(new_df)} rows into {PARTITION_DIR}")
+
     print("All updates completed successfully.")
 
 if __name__ == "__main__":
-    update_csv_history()
+    with metrics.stage("archive"):
+        update_csv_history()
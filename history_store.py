@@ -0,0 +1,259 @@
+import json
+import os
+import shutil
+from urllib.parse import quote, unquote
+import numpy as np
+import pandas as pd
+import metrics
+import storage
+
+# --- Paths & Config ---
+DATA_DIR = "data_hub"
+STORE_DIR = os.path.join(DATA_DIR, "history_store")
+LEGACY_JSON_FILE = os.path.join(DATA_DIR, "stock_history.json")
+TS_FILE = "timestamps.i64"
+HEAD_FILE = "head.i64"  # rows dropped from the front by compaction
+COL_EXT = ".f64"
+TS_DTYPE = np.dtype('<i8')
+PRICE_DTYPE = np.dtype('<f8')
+TS_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Layout: one raw little-endian int64 file of epoch seconds (the naive wall-clock
+# time of each sample, exactly as the legacy JSON strings) plus one raw float64
+# file per ticker, NaN where a sample has no price. Every column file has the same
+# row count, so an append is a fixed-size write at the end of each file and a read
+# is a plain memory map. The timestamp file is written last and acts as the commit
+# marker: columns longer than it are leftovers from an interrupted append.
+# Compaction (drop_before) and backfill merges (merge_frame) rewrite the store into
+# a sibling directory and swap it in, so readers always see either the old or the
+# new store as a whole. Writers hold storage.lock(store_dir), one at a time.
+
+def _col_path(store_dir, ticker):
+    return os.path.join(store_dir, quote(ticker, safe='') + COL_EXT)
+
+def _ts_path(store_dir):
+    return os.path.join(store_dir, TS_FILE)
+
+def _epochs(index):
+    """Epoch seconds of the wall-clock time; tz-aware stamps keep their local time."""
+    idx = pd.DatetimeIndex(index)
+    if idx.tz is not None:
+        idx = idx.tz_localize(None)
+    return np.asarray((idx - pd.Timestamp(0)) // pd.Timedelta(seconds=1), dtype=TS_DTYPE)
+
+def _map(path, dtype, rows):
+    """Read-only memory map of the first `rows` items of a column file."""
+    if rows <= 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', shape=(rows,))
+
+def tickers(store_dir=STORE_DIR):
+    if not os.path.isdir(store_dir):
+        return []
+    return sorted(unquote(f[:-len(COL_EXT)]) for f in os.listdir(store_dir) if f.endswith(COL_EXT))
+
+def row_count(store_dir=STORE_DIR):
+    path = _ts_path(store_dir)
+    return os.path.getsize(path) // TS_DTYPE.itemsize if os.path.exists(path) else 0
+
+def head_rows(store_dir=STORE_DIR):
+    """Rows compacted away so far; head_rows + row_count is the all-time sample count."""
+    path = os.path.join(store_dir, HEAD_FILE)
+    if not os.path.exists(path):
+        return 0
+    with open(path, 'rb') as f:
+        return int(np.frombuffer(f.read(TS_DTYPE.itemsize), dtype=TS_DTYPE)[0])
+
+def total_rows(store_dir=STORE_DIR):
+    return head_rows(store_dir) + row_count(store_dir)
+
+def first_timestamp(store_dir=STORE_DIR):
+    if not row_count(store_dir):
+        return None
+    with open(_ts_path(store_dir), 'rb') as f:
+        return pd.Timestamp(int(np.frombuffer(f.read(TS_DTYPE.itemsize), dtype=TS_DTYPE)[0]), unit='s')
+
+def last_timestamp(store_dir=STORE_DIR):
+    """Timestamp of the newest sample, read from the last 8 bytes only."""
+    rows = row_count(store_dir)
+    if not rows:
+        return None
+    with open(_ts_path(store_dir), 'rb') as f:
+        f.seek((rows - 1) * TS_DTYPE.itemsize)
+        return pd.Timestamp(int(np.frombuffer(f.read(TS_DTYPE.itemsize), dtype=TS_DTYPE)[0]), unit='s')
+
+def _fit_column(path, rows):
+    """Truncate or NaN-pad a column file so it holds exactly `rows` values."""
+    size = os.path.getsize(path) if os.path.exists(path) else 0
+    want = rows * PRICE_DTYPE.itemsize
+    if size > want:
+        with open(path, 'r+b') as f: f.truncate(want)
+    elif size < want:
+        with open(path, 'ab') as f:
+            f.write(np.full((want - size) // PRICE_DTYPE.itemsize, np.nan, dtype=PRICE_DTYPE).tobytes())
+
+def append_frame(df, store_dir=STORE_DIR):
+    """Append a wide frame (DatetimeIndex, one column per ticker) in one write per file."""
+    if df.empty:
+        return 0
+    os.makedirs(store_dir, exist_ok=True)
+    with storage.lock(store_dir):  # one writer at a time: the sampler and stages may share the store
+        rows = row_count(store_dir)
+        epochs = _epochs(df.index)
+
+        for t in sorted(set(tickers(store_dir)) | set(df.columns)):
+            path = _col_path(store_dir, t)
+            _fit_column(path, rows)
+            values = df[t].to_numpy(dtype=PRICE_DTYPE, na_value=np.nan) if t in df.columns \
+                else np.full(len(df), np.nan, dtype=PRICE_DTYPE)
+            with open(path, 'ab') as f:
+                f.write(np.round(values, 2).astype(PRICE_DTYPE).tobytes())
+
+        with open(_ts_path(store_dir), 'ab') as f:
+            f.write(epochs.tobytes())
+        metrics.add(rows_written=len(df), bytes_written=len(df) * (len(tickers(store_dir)) + 1) * 8)
+        return len(df)
+
+def append(prices, ts, store_dir=STORE_DIR):
+    """Append a single sample: one 8-byte write per column, independent of history size."""
+    frame = pd.DataFrame([prices], index=pd.DatetimeIndex([pd.Timestamp(ts)]))
+    return append_frame(frame, store_dir)
+
+def _row_range(store_dir, rows, start, end):
+    """First and past-the-end rows with start <= ts < end (binary search; samples are appended in time order)."""
+    ts = _map(_ts_path(store_dir), TS_DTYPE, rows)
+    lo = int(np.searchsorted(ts, _epochs([start])[0])) if start is not None else 0
+    hi = int(np.searchsorted(ts, _epochs([end])[0])) if end is not None else rows
+    return lo, max(lo, hi)
+
+def load_frame(store_dir=STORE_DIR, tail=None, start=None, end=None, columns=None):
+    """Wide DataFrame with a 'ts' column and one float column per ticker, sorted by time.
+
+    tail keeps the newest rows only; start/end (end exclusive) and columns (tickers) narrow the read.
+    """
+    rows = row_count(store_dir)
+    lo, hi = _row_range(store_dir, rows, start, end) if start is not None or end is not None else (0, rows)
+    if tail:
+        lo = max(lo, hi - tail)
+    ts = _map(_ts_path(store_dir), TS_DTYPE, rows)[lo:hi]
+    data = {"ts": pd.to_datetime(np.asarray(ts), unit='s')}
+    stored = tickers(store_dir)
+    for t in (stored if columns is None else [t for t in columns if t in stored]):
+        path = _col_path(store_dir, t)
+        have = min(os.path.getsize(path) // PRICE_DTYPE.itemsize, hi)
+        col = np.full(hi - lo, np.nan, dtype=PRICE_DTYPE)
+        if have > lo:
+            col[:have - lo] = _map(path, PRICE_DTYPE, have)[lo:]
+        data[t] = col
+    df = pd.DataFrame(data)
+    if len(ts) > 1 and (np.diff(ts) < 0).any():
+        df = df.sort_values('ts', kind='stable', ignore_index=True)
+    metrics.read(len(df))
+    return df
+
+def drop_before(cutoff, store_dir=STORE_DIR, min_fraction=0.0):
+    """Compact away samples older than cutoff, only once they are at least min_fraction of the store.
+
+    The kept rows are written to a sibling directory that then replaces the store.
+    Returns the number of rows dropped.
+    """
+    with storage.lock(store_dir):
+        recover(store_dir)
+        rows = row_count(store_dir)
+        n = _row_range(store_dir, rows, cutoff, None)[0]
+        if not n or n < min_fraction * rows:
+            return 0
+        new_dir, old_dir = store_dir + ".compact", store_dir + ".old"
+        shutil.rmtree(new_dir, ignore_errors=True)
+        os.makedirs(new_dir)
+        for t in tickers(store_dir):
+            path = _col_path(store_dir, t)
+            have = min(os.path.getsize(path) // PRICE_DTYPE.itemsize, rows)
+            col = np.full(rows - n, np.nan, dtype=PRICE_DTYPE)
+            if have > n:
+                col[:have - n] = _map(path, PRICE_DTYPE, have)[n:]
+            with open(_col_path(new_dir, t), 'wb') as f: f.write(col.tobytes())
+        with open(os.path.join(new_dir, HEAD_FILE), 'wb') as f:
+            f.write(np.array([head_rows(store_dir) + n], dtype=TS_DTYPE).tobytes())
+        with open(_ts_path(new_dir), 'wb') as f:
+            f.write(np.asarray(_map(_ts_path(store_dir), TS_DTYPE, rows)[n:]).tobytes())
+        os.rename(store_dir, old_dir)
+        os.rename(new_dir, store_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+        return n
+
+def merge_frame(df, store_dir=STORE_DIR):
+    """Fill holes from a wide frame (DatetimeIndex, one column per ticker); values already stored win.
+
+    Rows at new timestamps are inserted in time order and NaN cells are filled. Like
+    drop_before, the merged store is written to a sibling directory and swapped in.
+    Returns the number of cells filled.
+    """
+    if df.empty:
+        return 0
+    with storage.lock(store_dir):
+        recover(store_dir)
+        new = df.set_axis(pd.to_datetime(_epochs(df.index), unit='s'))
+        new = new[~new.index.duplicated(keep='last')].round(2)
+        rows = row_count(store_dir)
+        if not rows:
+            return int(new.notna().sum().sum()) if append_frame(new.sort_index(), store_dir) else 0
+        old = load_frame(store_dir).set_index('ts')
+        merged = old.combine_first(new).sort_index()
+        filled = int(merged.notna().sum().sum() - old.notna().sum().sum())
+        if not filled:
+            return 0
+        new_dir, old_dir = store_dir + ".merge", store_dir + ".old"
+        shutil.rmtree(new_dir, ignore_errors=True)
+        os.makedirs(new_dir)
+        if head_rows(store_dir):
+            shutil.copy(os.path.join(store_dir, HEAD_FILE), os.path.join(new_dir, HEAD_FILE))
+        append_frame(merged, new_dir)
+        os.rename(store_dir, old_dir)
+        os.rename(new_dir, store_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+        return filled
+
+def recover(store_dir=STORE_DIR):
+    """Finish a compaction or merge that stopped between its two renames."""
+    if os.path.isdir(store_dir):
+        return
+    for leftover in (store_dir + ".compact", store_dir + ".merge", store_dir + ".old"):
+        if os.path.isdir(leftover):
+            os.rename(leftover, store_dir)
+            return
+
+def import_json(json_path=LEGACY_JSON_FILE, store_dir=STORE_DIR):
+    """One-off migration of the legacy list-of-samples JSON into the store."""
+    with open(json_path, 'r', encoding='utf-8') as f: history = json.load(f)
+    if not history:
+        return 0
+    df = pd.DataFrame([e['prices'] for e in history],
+                      index=pd.to_datetime([e['timestamp'] for e in history]))
+    return append_frame(df.sort_index(kind='stable'), store_dir)
+
+def ensure_store(store_dir=STORE_DIR, json_path=LEGACY_JSON_FILE):
+    """Migrate the legacy JSON on first use so existing history is not lost."""
+    recover(store_dir)
+    if not row_count(store_dir) and os.path.exists(json_path):
+        import_json(json_path, store_dir)
+    return row_count(store_dir)
+
+def export_json(json_path=LEGACY_JSON_FILE, store_dir=STORE_DIR):
+    """Write the store back out in the legacy stock_history.json layout."""
+    df = load_frame(store_dir).set_index('ts')
+    stamps = df.index.strftime(TS_FORMAT)
+    records = df.to_dict(orient='records')
+    history = [{"timestamp": s, "prices": {t: v for t, v in r.items() if pd.notna(v)}}
+               for s, r in zip(stamps, records)]
+    storage.write_json(json_path, history, indent=4)
+    return len(history)
+
+if __name__ == "__main__":
+    import sys
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "export"
+    if cmd == "import":
+        print(f"Imported {import_json()} samples into {STORE_DIR}")
+    else:
+        ensure_store()
+        print(f"Exported {export_json()} samples to {LEGACY_JSON_FILE}")
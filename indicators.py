@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+
+# --- Indicator Config ---
+MA_SHORT = 20
+MA_LONG = 50
+RSI_PERIOD = 14
+
+def _tail_mean(prices, valid, rank, counts, k):
+    """Mean of the last k non-NaN values of every column (k may differ per column)."""
+    take = valid & (rank > counts - k)
+    return np.where(take, prices, 0).sum(axis=0) / np.maximum(k, 1)
+
+def compute_indicators(df, tickers=None):
+    """z-score, MA crossover and RSI for every ticker column in one pass over the matrix.
+
+    Returns a frame indexed by ticker with: last, z_score, ma_short, ma_long,
+    momentum_ready (enough samples for MA_SHORT) and rsi.
+    """
+    if tickers is None:
+        tickers = [c for c in df.columns if c != 'ts']
+    tickers = [t for t in tickers if t in df.columns]
+    prices = df[tickers].to_numpy(dtype=float)
+    n_rows = len(prices)
+    valid = ~np.isnan(prices)
+    counts = valid.sum(axis=0)
+    rank = np.cumsum(valid, axis=0)  # 1-based position among each column's valid values
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # Mean reversion: distance of the latest sample from the full-history mean
+        last = prices[-1] if n_rows else np.full(len(tickers), np.nan)
+        filled = np.where(valid, prices, 0.0)
+        mean = filled.sum(axis=0) / counts
+        std = np.sqrt((np.where(valid, prices - mean, 0.0) ** 2).sum(axis=0) / (counts - 1))
+        z_score = np.where(std > 0, (last - mean) / std, 0.0)
+
+        # Momentum: short vs long moving average over the valid samples; NaN until
+        # there are enough of them, as a rolling mean would give
+        ma_short = np.where(counts >= MA_SHORT, _tail_mean(prices, valid, rank, counts, MA_SHORT), np.nan)
+        ma_long = np.where(counts > 0, _tail_mean(prices, valid, rank, counts, np.minimum(counts, MA_LONG)), np.nan)
+
+        # RSI: simple average of gains and losses over the last RSI_PERIOD moves;
+        # a missing move counts as no change
+        tail = prices[-(RSI_PERIOD + 1):]
+        delta = np.diff(tail, axis=0, prepend=np.nan) if n_rows <= RSI_PERIOD else np.diff(tail, axis=0)
+        if n_rows >= RSI_PERIOD:
+            rs = np.where(delta > 0, delta, 0.0).mean(axis=0) / np.where(delta < 0, -delta, 0.0).mean(axis=0)
+        else:
+            rs = np.full(len(tickers), np.nan)
+        rsi = np.where(np.isnan(rs), 50.0, 100 - 100 / (1 + rs))
+
+    return pd.DataFrame({
+        "last": last,
+        "z_score": z_score,
+        "ma_short": ma_short,
+        "ma_long": ma_long,
+        "momentum_ready": counts >= MA_SHORT,
+        "rsi": rsi,
+    }, index=pd.Index(tickers, name='ticker'))
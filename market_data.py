@@ -0,0 +1,302 @@
+import logging
+import os
+import random
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import metrics
+import price_cache
+
+# --- Fetch Config ---
+MAX_WORKERS = int(os.environ.get("MARKET_DATA_WORKERS", 4))
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0  # seconds, doubled on every retry
+BACKOFF_CAP = 30.0
+RETRYABLE = ("ratelimit", "too many requests", "database is locked", "timed out")
+
+# yfinance keeps ticker timezones in a sqlite file; concurrent first lookups are
+# what produces "database is locked". All cache writes go through this lock.
+_TZ_CACHE_LOCK = threading.Lock()
+_tz_warm = set()
+
+def is_retryable(exc):
+    text = f"{type(exc).__name__} {exc}".lower().replace("_", "")
+    return any(k in text for k in RETRYABLE)
+
+def with_retry(fn, *args, **kwargs):
+    """Call fn, retrying rate-limit style failures with exponential backoff and full jitter."""
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            return metrics.timed_call(fn, *args, **kwargs)
+        except Exception as e:
+            if attempt == MAX_RETRIES or not is_retryable(e):
+                raise
+            time.sleep(random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt)))
+
+def _closes(frame, tickers):
+    """Normalize a yf.download result to a wide Close frame with one column per ticker."""
+    if frame is None or frame.empty:
+        return pd.DataFrame(columns=tickers, dtype=float)
+    close = frame['Close'] if 'Close' in frame else frame
+    if isinstance(close, pd.Series):
+        close = close.to_frame(name=tickers[0])
+    return close.reindex(columns=tickers)
+
+# --- Providers ---
+
+class YahooProvider:
+    """Live data from yfinance. download() is a single batched request for many tickers."""
+    supports_batch = True
+
+    def __init__(self):
+        import yfinance as yf
+        self.yf = yf
+
+    def warm_tz_cache(self, tickers):
+        with _TZ_CACHE_LOCK:
+            for t in tickers:
+                if t in _tz_warm: continue
+                try:
+                    with_retry(lambda: self.yf.Ticker(t).fast_info['timezone'])
+                    _tz_warm.add(t)
+                except Exception as e:
+                    logging.error(f"Timezone lookup failed for {t}: {e}")
+
+    def download(self, tickers, period=None, interval="1d", start=None, end=None):
+        frame = self.yf.download(tickers, period=period, interval=interval, start=start, end=end,
+                                 progress=False, threads=MAX_WORKERS)
+        return _closes(frame, tickers)
+
+    def history(self, ticker, period=None, interval="1d", start=None, end=None):
+        return self.yf.Ticker(ticker).history(period=period, interval=interval, start=start, end=end)
+
+    def dividends(self, ticker):
+        return self.yf.Ticker(ticker).dividends
+
+    def actions(self, ticker):
+        return self.yf.Ticker(ticker).actions
+
+    def info(self, ticker):
+        return self.yf.Ticker(ticker).info
+
+    def quote(self, ticker):
+        return float(self.yf.Ticker(ticker).fast_info['last_price'])
+
+def _localize(ts, tz="America/New_York"):
+    ts = pd.Timestamp(ts)
+    return ts.tz_localize(tz) if ts.tzinfo is None else ts.tz_convert(tz)
+
+class FakeRateLimitError(Exception):
+    pass
+
+PERIOD_DAYS = {"1d": 1, "5d": 5, "1mo": 21, "3mo": 63, "6mo": 126, "1y": 252, "2y": 504, "5y": 1260, "10y": 2520, "max": 5040}
+INTRADAY_STEPS = {"1m": 390, "2m": 195, "5m": 78, "15m": 26, "30m": 13, "60m": 7, "1h": 7}
+
+class FakeProvider:
+    """Deterministic offline market: seeded random-walk prices per symbol.
+
+    latency adds a sleep to every call and rate_limit (calls/second) makes excess
+    calls raise FakeRateLimitError, so retry and concurrency paths can be exercised.
+    """
+    supports_batch = True
+
+    def __init__(self, latency=0.0, rate_limit=None, end=None):
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.end = _localize(end) if end is not None else pd.Timestamp.now(tz="America/New_York").floor("min")
+        self.calls = 0
+        self._window = []
+        self._lock = threading.Lock()
+
+    def _tick(self):
+        with self._lock:
+            self.calls += 1
+            now = time.monotonic()
+            self._window = [t for t in self._window if now - t < 1.0]
+            limited = self.rate_limit is not None and len(self._window) >= self.rate_limit
+            if not limited:
+                self._window.append(now)
+        if self.latency:
+            time.sleep(self.latency)
+        if limited:
+            raise FakeRateLimitError("Too Many Requests. Rate limited.")
+
+    def warm_tz_cache(self, tickers):
+        pass
+
+    def _index(self, period, interval, start, end):
+        last = self.end if end is None else min(self.end, _localize(end))
+        if start is not None:
+            sessions = pd.bdate_range(start=_localize(start).tz_localize(None).normalize(),
+                                      end=last.normalize().tz_localize(None))
+        else:
+            sessions = pd.bdate_range(end=last.normalize().tz_localize(None), periods=PERIOD_DAYS.get(period or "1mo", 21))
+        if interval in INTRADAY_STEPS:
+            step = 390 // INTRADAY_STEPS[interval]
+            offsets = pd.to_timedelta(np.arange(0, 390, step), unit="min") + pd.Timedelta(hours=9, minutes=30)
+            idx = pd.DatetimeIndex((sessions.values[:, None] + offsets.values[None, :]).ravel())
+        else:
+            idx = sessions
+        idx = idx.tz_localize("America/New_York")
+        return idx[idx <= last]
+
+    def _prices(self, ticker, idx):
+        # Prices are a pure function of (symbol, timestamp), so overlapping ranges agree
+        seed = zlib.crc32(ticker.encode())
+        minutes = (idx.tz_convert("UTC").tz_localize(None) - pd.Timestamp("2000-01-01")) // pd.Timedelta(minutes=1)
+        base = 3 + seed % 100 / 100 if ticker.endswith("=X") else 20 + seed % 500
+        drift = np.asarray(minutes, dtype=float) * 1e-8  # ~15% since 2000, so fake FX stays near real USD/ILS levels
+        wave = 0.1 * np.sin(np.asarray(minutes, dtype=float) / (500 + seed % 997) + seed % 7)
+        return np.round(base * np.exp(drift + wave), 4)
+
+    def download(self, tickers, period=None, interval="1d", start=None, end=None):
+        self._tick()
+        idx = self._index(period, interval, start, end)
+        return pd.DataFrame({t: self._prices(t, idx) for t in tickers}, index=idx)
+
+    def history(self, ticker, period=None, interval="1d", start=None, end=None):
+        self._tick()
+        idx = self._index(period, interval, start, end)
+        close = self._prices(ticker, idx)
+        quarterly = (idx.month % 3 == 0) & (idx.day == 15) & (interval not in INTRADAY_STEPS)
+        divs = np.where(quarterly, np.round(close * 0.004, 2), 0.0)
+        return pd.DataFrame({"Open": close, "High": close * 1.01, "Low": close * 0.99, "Close": close,
+                             "Volume": 1_000_000, "Dividends": divs, "Stock Splits": 0.0}, index=idx)
+
+    def dividends(self, ticker):
+        hist = self.history(ticker, period="max")
+        return hist.loc[hist['Dividends'] > 0, 'Dividends']
+
+    def actions(self, ticker):
+        hist = self.history(ticker, period="max")
+        return hist.loc[(hist['Dividends'] > 0) | (hist['Stock Splits'] > 0), ['Dividends', 'Stock Splits']]
+
+    def info(self, ticker):
+        self._tick()
+        return {"symbol": ticker, "trailingPE": round(10 + zlib.crc32(ticker.encode()) % 40 + 0.5, 2)}
+
+    def quote(self, ticker):
+        self._tick()
+        now = min(pd.Timestamp.now(tz="America/New_York"), self.end)
+        return float(self._prices(ticker, pd.DatetimeIndex([now]))[0])
+
+_provider = None
+
+def get_provider():
+    """Provider chosen by MARKET_DATA_PROVIDER ('yahoo' by default, 'fake' for offline runs)."""
+    global _provider
+    if _provider is None:
+        _provider = FakeProvider() if os.environ.get("MARKET_DATA_PROVIDER") == "fake" else YahooProvider()
+    return _provider
+
+def set_provider(provider):
+    global _provider
+    _provider = provider
+
+# --- Public API ---
+
+def _pool_map(fn, tickers):
+    """Run fn(ticker) with retries on a bounded pool. Failed tickers are logged and omitted."""
+    def task(t):
+        try:
+            return t, with_retry(fn, t)
+        except Exception as e:
+            logging.error(f"Fetch failed for {t}: {e}")
+            return t, None
+    with ThreadPoolExecutor(max_workers=max(1, min(MAX_WORKERS, len(tickers)))) as pool:
+        return {t: r for t, r in pool.map(task, tickers) if r is not None}
+
+def _combine(series, tickers):
+    """Wide frame from per-ticker Close series; naive and tz-aware indexes are put on wall time."""
+    if not series:
+        return pd.DataFrame(columns=tickers, dtype=float)
+    if len({s.index.tz is None for s in series.values()}) > 1:
+        series = {t: s.tz_localize(None) if s.index.tz is not None else s for t, s in series.items()}
+    return pd.concat(series, axis=1).sort_index().reindex(columns=tickers)
+
+def _fetch_closes(tickers, period, interval, start, end):
+    """One batched request, then per-ticker retries for anything the batch left empty."""
+    provider = get_provider()
+    provider.warm_tz_cache(tickers)
+    closes = pd.DataFrame(columns=tickers, dtype=float)
+    if provider.supports_batch:
+        try:
+            closes = with_retry(provider.download, tickers, period=period, interval=interval, start=start, end=end)
+        except Exception as e:
+            logging.error(f"Batch download failed: {e}")
+    series = {t: closes[t].dropna() for t in tickers if t in closes and closes[t].notna().any()}
+    missing = [t for t in tickers if t not in series]
+    if missing:
+        hists = _pool_map(lambda t: provider.history(t, period=period, interval=interval, start=start, end=end), missing)
+        series.update({t: h['Close'].dropna() for t, h in hists.items() if not h.empty})
+    return series
+
+def download_closes(tickers, period=None, interval="1d", start=None, end=None):
+    """Wide Close frame (time x ticker). Served from the price cache where fresh, fetched otherwise."""
+    tickers = list(dict.fromkeys(tickers))
+    rng = price_cache.range_key(period, start, end)
+    series = {}
+    for t in tickers:
+        cached = price_cache.get(t, interval, rng)
+        if cached is not None:
+            series[t] = cached['Close'].dropna()
+    misses = [t for t in tickers if t not in series]
+    if misses:
+        fetched = _fetch_closes(misses, period, interval, start, end)
+        for t, s in fetched.items():
+            price_cache.put(t, interval, rng, s.to_frame('Close'))
+        series.update(fetched)
+    price_cache.flush()
+    return _combine(series, tickers)
+
+def fetch_histories(tickers, period=None, interval="1d", start=None, end=None):
+    """Full OHLC + actions frame per ticker, from the price cache or fetched concurrently."""
+    rng = price_cache.range_key(period, start, end)
+    out = {}
+    for t in tickers:
+        cached = price_cache.get(t, interval, rng, columns=("Close", "Dividends"))
+        if cached is not None:
+            out[t] = cached
+    misses = [t for t in tickers if t not in out]
+    if misses:
+        provider = get_provider()
+        provider.warm_tz_cache(misses)
+        fetched = _pool_map(lambda t: provider.history(t, period=period, interval=interval, start=start, end=end), misses)
+        for t, h in fetched.items():
+            price_cache.put(t, interval, rng, h)
+        out.update(fetched)
+    price_cache.flush()
+    return {t: out[t] for t in tickers if t in out}
+
+def fetch_history(ticker, period=None, interval="1d", start=None, end=None):
+    return fetch_histories([ticker], period=period, interval=interval, start=start, end=end).get(ticker, pd.DataFrame())
+
+def fetch_dividends(tickers):
+    return _pool_map(get_provider().dividends, tickers)
+
+def fetch_actions(tickers):
+    """Full dividend and split history per ticker ('Dividends', 'Stock Splits' columns, event rows only)."""
+    return _pool_map(get_provider().actions, tickers)
+
+def fetch_info(tickers):
+    out = {}
+    for t in tickers:
+        cached = price_cache.get(t, "info", "current", columns=())
+        if cached is not None:
+            out[t] = cached.iloc[0].to_dict()
+    misses = [t for t in tickers if t not in out]
+    if misses:
+        fetched = _pool_map(get_provider().info, misses)
+        for t, info in fetched.items():
+            price_cache.put(t, "info", "current", pd.DataFrame([info]))
+        out.update(fetched)
+    price_cache.flush()
+    return {t: out[t] for t in tickers if t in out}
+
+def latest_close(symbol, default=None):
+    """Last close of the past day, or default when the source has nothing."""
+    hist = fetch_history(symbol, period="1d")
+    return float(hist['Close'].iloc[-1]) if not hist.empty else default
@@ -0,0 +1,113 @@
+import os
+import struct
+from datetime import date, datetime, time, timedelta
+import pytz
+
+# Stdlib + pytz only: this module runs before pandas/matplotlib/yfinance are imported.
+
+# --- Paths & Config ---
+DATA_DIR = "data_hub"
+TS_FILE = os.path.join(DATA_DIR, "history_store", "timestamps.i64")
+NY = pytz.timezone('America/New_York')
+SAMPLE_TZ = pytz.timezone('Israel')  # wall-clock zone of stored timestamps
+OPEN = time(9, 30)
+CLOSE = time(16, 0)
+EARLY_CLOSE = time(13, 0)
+GRACE = timedelta(minutes=15)  # late prints after the bell
+
+def _easter(year):
+    """Gregorian Easter Sunday (anonymous algorithm)."""
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = b // 4, b % 4
+    g = (8 * b + 13) // 25
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month = (h + l - 7 * m + 114) // 31
+    return date(year, month, (h + l - 7 * m + 114) % 31 + 1)
+
+def _nth_weekday(year, month, weekday, n):
+    first = date(year, month, 1)
+    return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+
+def _last_weekday(year, month, weekday):
+    last = date(year, month + 1, 1) - timedelta(days=1) if month < 12 else date(year, 12, 31)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+def _observed(d):
+    """Saturday holidays move to Friday, Sunday holidays to Monday."""
+    if d.weekday() == 5: return d - timedelta(days=1)
+    if d.weekday() == 6: return d + timedelta(days=1)
+    return d
+
+def holidays(year):
+    """NYSE full-day holidays for a year."""
+    days = {
+        _nth_weekday(year, 1, 0, 3),               # Martin Luther King Jr. Day
+        _nth_weekday(year, 2, 0, 3),               # Presidents' Day
+        _easter(year) - timedelta(days=2),         # Good Friday
+        _last_weekday(year, 5, 0),                 # Memorial Day
+        _observed(date(year, 7, 4)),               # Independence Day
+        _nth_weekday(year, 9, 0, 1),               # Labor Day
+        _nth_weekday(year, 11, 3, 4),              # Thanksgiving
+        _observed(date(year, 12, 25)),             # Christmas
+    }
+    if year >= 2022:
+        days.add(_observed(date(year, 6, 19)))     # Juneteenth
+    new_year = date(year, 1, 1)
+    if new_year.weekday() != 5:                    # NYSE does not observe it on Dec 31
+        days.add(_observed(new_year))
+    return days
+
+def is_trading_day(d):
+    return d.weekday() < 5 and d not in holidays(d.year)
+
+def session(d):
+    """(open, close) as aware NY datetimes, or None when the exchange is shut."""
+    if not is_trading_day(d):
+        return None
+    early = (d == _nth_weekday(d.year, 11, 3, 4) + timedelta(days=1)
+             or (d.month, d.day) in ((7, 3), (12, 24)))
+    return (NY.localize(datetime.combine(d, OPEN)),
+            NY.localize(datetime.combine(d, EARLY_CLOSE if early else CLOSE)))
+
+def last_close(now):
+    """Close of the most recent session that has already ended at `now`."""
+    d = now.astimezone(NY).date()
+    while True:
+        s = session(d)
+        if s and s[1] <= now:
+            return s[1]
+        d -= timedelta(days=1)
+
+def next_open(now):
+    """Open of the next session starting after `now` (aware NY datetime)."""
+    d = now.astimezone(NY).date()
+    while True:
+        s = session(d)
+        if s and s[0] > now:
+            return s[0]
+        d += timedelta(days=1)
+
+def is_open(now):
+    s = session(now.astimezone(NY).date())
+    return bool(s) and s[0] <= now <= s[1] + GRACE
+
+def last_sample_time(path=TS_FILE):
+    """Newest stored sample as an aware datetime, read from the store's last 8 bytes."""
+    try:
+        with open(path, 'rb') as f:
+            f.seek(-8, os.SEEK_END)
+            epoch = struct.unpack('<q', f.read(8))[0]
+    except OSError:
+        return None
+    return SAMPLE_TZ.localize(datetime(1970, 1, 1) + timedelta(seconds=epoch))
+
+def new_data_possible(now=None, path=TS_FILE):
+    """False only when the market is shut and the last session's close is already stored."""
+    now = now or datetime.now(pytz.utc)
+    if is_open(now):
+        return True
+    last = last_sample_time(path)
+    return last is None or last < last_close(now)
@@ -0,0 +1,160 @@
+import json
+import logging
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+import storage
+
+# Stdlib only: history_store and market_data import this on every run.
+
+# --- Paths & Config ---
+DATA_DIR = "data_hub"
+METRICS_FILE = os.path.join(DATA_DIR, "metrics.jsonl")
+PROFILE_DIR = os.path.join(DATA_DIR, "profiles")
+MAX_BYTES = 2 * 2**20  # older half of the log is dropped past this size
+# PIPELINE_PROFILE=cprofile and/or tracemalloc (comma separated) adds a profile per stage
+PROFILE = {p.strip() for p in os.environ.get("PIPELINE_PROFILE", "").lower().split(",") if p.strip()}
+RUN_ID = datetime.now().strftime("%Y%m%dT%H%M%S") + f"-{os.getpid()}"
+
+_lock = threading.Lock()
+_active = []  # counters of every open stage; nested stages also count towards their parents
+
+def _counters():
+    return {"network_calls": 0, "network_errors": 0, "network_s": 0.0,
+            "rows_read": 0, "rows_written": 0, "bytes_written": 0, "latencies": []}
+
+def add(**counts):
+    """Add to the counters of the running stage(s). A no-op outside any stage."""
+    with _lock:
+        for c in _active:
+            for k, v in counts.items():
+                c[k] += v
+
+def read(rows):
+    add(rows_read=int(rows))
+
+def wrote(path, rows=0):
+    """Count a file just written (its full size) and the rows it holds."""
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        size = 0
+    add(rows_written=int(rows), bytes_written=size)
+
+def timed_call(fn, *args, **kwargs):
+    """Call fn as one network request: counted, timed, and flagged when it raises."""
+    start = time.perf_counter()
+    try:
+        return fn(*args, **kwargs)
+    except Exception:
+        add(network_errors=1)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        with _lock:
+            for c in _active:
+                c['network_calls'] += 1
+                c['network_s'] += elapsed
+                c['latencies'].append(elapsed)
+
+def peak_rss_mb():
+    """Process high-water RSS (ru_maxrss is KB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (2**20 if sys.platform == "darwin" else 1024), 1)
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def append_record(record, path=METRICS_FILE):
+    """Append one JSON line, halving the file first when it has outgrown MAX_BYTES."""
+    try:
+        with storage.lock(path):  # stages running in parallel all log here
+            if os.path.exists(path) and os.path.getsize(path) > MAX_BYTES:
+                with open(path, 'r', encoding='utf-8') as f: lines = f.readlines()
+                storage.write_text(path, "".join(lines[len(lines) // 2:]))
+            storage.append(path, json.dumps(record, sort_keys=True) + "\n")
+    except (OSError, TimeoutError) as e:
+        logging.error(f"Metrics write failed: {e}")
+
+@contextmanager
+def stage(name, path=METRICS_FILE):
+    """Measure a block as one pipeline stage and append its record to the metrics log.
+
+    Yields the record; callers may set record['status'] (e.g. 'skipped') or extra keys.
+    """
+    counters, record = _counters(), {"run": RUN_ID, "stage": name, "status": "ok"}
+    profiler = None
+    if "cprofile" in PROFILE:
+        import cProfile
+        profiler = cProfile.Profile()
+    if "tracemalloc" in PROFILE:
+        import tracemalloc
+        tracemalloc.start()
+    with _lock:
+        _active.append(counters)
+    record["ts"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    wall, cpu = time.perf_counter(), time.process_time()
+    if profiler: profiler.enable()
+    try:
+        yield record
+    except BaseException as e:
+        record["status"], record["error"] = "failed", f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        if profiler: profiler.disable()
+        record["wall_s"] = round(time.perf_counter() - wall, 3)
+        record["cpu_s"] = round(time.process_time() - cpu, 3)
+        record["peak_rss_mb"] = peak_rss_mb()
+        with _lock:
+            _active.remove(counters)
+        latencies = counters.pop("latencies")
+        counters["network_s"] = round(counters["network_s"], 3)
+        if latencies:
+            counters["network_p95_s"] = round(_percentile(latencies, 0.95), 3)
+            counters["network_max_s"] = round(max(latencies), 3)
+        record.update(counters)
+        if profiler:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            record["profile"] = os.path.join(PROFILE_DIR, f"{name}.prof")
+            profiler.dump_stats(record["profile"])
+        if "tracemalloc" in PROFILE:
+            import tracemalloc
+            record["heap_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 2)
+            snapshot = tracemalloc.take_snapshot().filter_traces(
+                [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "*cProfile.py")])
+            top = snapshot.statistics('lineno')[:5]
+            record["heap_top"] = [f"{s.traceback[0].filename}:{s.traceback[0].lineno} {s.size / 2**20:.2f}MB" for s in top]
+            tracemalloc.stop()
+        append_record(record, path)
+
+def load_records(path=METRICS_FILE, tail_bytes=256 * 1024):
+    """Most recent records, parsed from the tail of the log."""
+    try:
+        with open(path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(0, f.tell() - tail_bytes))
+            lines = f.read().decode('utf-8', errors='ignore').splitlines()
+    except OSError:
+        return []
+    records = []
+    for line in lines:
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            continue  # the first line of a tail read is usually cut
+    return records
+
+def health(records):
+    """Latest record per stage plus failure counts over the records given, in first-seen order."""
+    latest, failures, runs = {}, {}, {}
+    for r in records:
+        name = r.get("stage")
+        latest[name] = r
+        runs[name] = runs.get(name, 0) + 1
+        failures[name] = failures.get(name, 0) + (r.get("status") == "failed")
+    return [dict(latest[n], runs=runs[n], failures=failures[n]) for n in latest]
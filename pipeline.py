@@ -0,0 +1,217 @@
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import metrics
+import storage
+
+# --- Paths & Config ---
+DATA_DIR = "data_hub"
+PORTFOLIO_FILE = os.path.join(DATA_DIR, "portfolio.json")
+STATE_FILE = os.path.join(DATA_DIR, "pipeline_state.json")
+RISK_FILE = os.path.join(DATA_DIR, "risk_report.json")
+FX_FILE = os.path.join(DATA_DIR, "fx_usd_ils.csv")
+LOG_FILE = os.path.join(DATA_DIR, "error_log.txt")
+
+os.makedirs(DATA_DIR, exist_ok=True)
+logging.basicConfig(filename=LOG_FILE, level=logging.ERROR, format='%(asctime)s: %(message)s')
+
+# --- Shared In-Memory Inputs ---
+# Stages read holdings and history through these loaders, so each is parsed once
+# per run and handed to every stage that needs it.
+
+def holdings(ctx):
+    if 'holdings' not in ctx:
+        with open(PORTFOLIO_FILE, 'r') as f: ctx['holdings'] = json.load(f)
+    return ctx['holdings']
+
+def history(ctx):
+    if 'history' not in ctx:
+        import history_store, retention
+        history_store.ensure_store()
+        ctx['history'] = retention.load_range()
+    return ctx['history']
+
+def fingerprint(*parts):
+    """sha256 over strings, bytes and DataFrames (hashed by content, not identity)."""
+    h = hashlib.sha256()
+    for part in parts:
+        if hasattr(part, 'columns'):
+            import pandas as pd
+            h.update(",".join(map(str, part.columns)).encode())
+            h.update(pd.util.hash_pandas_object(part, index=False).to_numpy().tobytes())
+        elif isinstance(part, bytes):
+            h.update(part)
+        else:
+            h.update(json.dumps(part, sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+# --- Stages ---
+
+def run_track(ctx):
+    import stock_tracker
+    stock_tracker.main()
+    ctx.pop('history', None)  # new sample may have landed
+
+def run_archive(ctx):
+    import history_logger
+    history_logger.update_csv_history(holdings(ctx))
+
+def run_risk(ctx):
+    import risk
+    risk.main(holdings(ctx))
+
+def archive_state(ctx):
+    """Row counts of the archive index - they change exactly when new archive rows land."""
+    import archive_index
+    meta = archive_index.ensure_index()
+    return [meta['main_rows'], meta['delta_rows'], meta['source']]
+
+def file_bytes(path):
+    try:
+        with open(path, 'rb') as f: return f.read()
+    except OSError:
+        return b""
+
+def run_report(ctx):
+    import generate_report
+    generate_report.main(holdings(ctx), history(ctx))
+
+def run_analysis(ctx):
+    import analysis_pro
+    analysis_pro.main(holdings(ctx), history(ctx))
+
+# inputs=None means the stage talks to the network and always runs.
+STAGES = {
+    "track": {"deps": [], "run": run_track, "inputs": None},
+    "archive": {"deps": [], "run": run_archive, "inputs": None},
+    "risk": {"deps": ["archive"], "run": run_risk,
+             "inputs": lambda ctx: fingerprint(holdings(ctx), archive_state(ctx))},
+    # The dashboard also shows the risk summary and ILS values, so it waits for this run's simulation
+    # and FX update (archive) and a new one of either redraws it
+    "report": {"deps": ["track", "archive", "risk"], "run": run_report,
+               "inputs": lambda ctx: fingerprint(holdings(ctx), history(ctx), file_bytes(RISK_FILE), file_bytes(FX_FILE))},
+    "analysis": {"deps": ["track"], "run": run_analysis,
+                 "inputs": lambda ctx: fingerprint(holdings(ctx), history(ctx))},
+}
+
+def topo_order(names):
+    """Requested stages plus their dependencies, dependencies first."""
+    order = []
+    def visit(name):
+        if name in order: return
+        for dep in STAGES[name]['deps']:
+            visit(dep)
+        order.append(name)
+    for name in names:
+        visit(name)
+    return order
+
+def load_state():
+    try:
+        with open(STATE_FILE, 'r') as f: return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_state(updates):
+    """Record stage digests; re-read under the lock so stages finishing elsewhere are kept."""
+    with storage.lock(STATE_FILE):
+        state = load_state()
+        state.update(updates)
+        storage.write_json(STATE_FILE, state, indent=2)
+
+def execute(name, ctx, previous=None, force=False):
+    """Run one stage as a metrics stage unless its input digest equals `previous`.
+
+    Returns (status, digest): status is 'ok' or 'skipped', digest None for stages that always run.
+    """
+    stage = STAGES[name]
+    with metrics.stage(name) as record:
+        digest = stage['inputs'](ctx) if stage['inputs'] else None
+        if digest is not None and not force and previous == digest:
+            record['status'] = "skipped"
+        else:
+            stage['run'](ctx)
+    return record['status'], digest
+
+def _finished(name, status, digest, elapsed, timings):
+    if status == "skipped":
+        print(f"[pipeline] {name:<9} skipped (inputs unchanged)  {elapsed:.2f}s")
+        return
+    if digest is not None:
+        save_state({name: digest})
+    timings[name] = elapsed
+    print(f"[pipeline] {name:<9} {elapsed:.2f}s")
+
+def _failed(name, e, failed):
+    failed.add(name)
+    logging.error(f"Pipeline stage {name} failed: {e}")
+    print(f"[pipeline] {name:<9} FAILED: {e}")
+
+def _run_stages(names, state, ctx, failed, timings, force):
+    for name in names:
+        start = time.perf_counter()
+        if any(dep in failed for dep in STAGES[name]['deps']):
+            failed.add(name)
+            print(f"[pipeline] {name:<9} skipped (dependency failed)")
+            continue
+        try:
+            status, digest = execute(name, ctx, state.get(name), force)
+        except Exception as e:
+            _failed(name, e, failed)
+            continue
+        _finished(name, status, digest, time.perf_counter() - start, timings)
+
+def run(names=None, force=False):
+    """Run the stage DAG in one process, skipping stages whose input hash is unchanged."""
+    names = topo_order(names or list(STAGES))
+    state, ctx, failed, timings = load_state(), {}, set(), {}
+    total = time.perf_counter()
+    _run_stages(names, state, ctx, failed, timings, force)
+    print(f"[pipeline] total     {time.perf_counter() - total:.2f}s")
+    return timings
+
+def run_parallel(names=None, force=False):
+    """As run(), but the network stages without dependencies (track, archive) fetch side by side first.
+
+    Each of them runs in a worker process and leaves its results in data_hub, where
+    storage serializes writers on the same file. Every later stage then runs here,
+    in one process with one ctx, so holdings and history are still parsed once.
+    """
+    names = topo_order(names or list(STAGES))
+    network = [n for n in names if STAGES[n]['inputs'] is None and not STAGES[n]['deps']]
+    state, ctx, failed, timings = load_state(), {}, set(), {}
+    total = time.perf_counter()
+    if network:
+        with ProcessPoolExecutor(max_workers=len(network)) as pool:
+            futures = {pool.submit(execute, name, {}, state.get(name), force): name for name in network}
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    status, digest = future.result()
+                except Exception as e:
+                    _failed(name, e, failed)
+                    continue
+                _finished(name, status, digest, time.perf_counter() - total, timings)
+    _run_stages([n for n in names if n not in network], state, ctx, failed, timings, force)
+    print(f"[pipeline] total     {time.perf_counter() - total:.2f}s")
+    return timings
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    unknown = [a for a in args if a not in STAGES]
+    if unknown:
+        sys.exit(f"Unknown stage(s): {', '.join(unknown)}. Available: {', '.join(STAGES)}")
+    force = "--force" in sys.argv
+    # Calendar check before any heavy import: nothing new can exist while the market is shut
+    import market_hours
+    if not force and not os.environ.get("FORCE_RUN") and not market_hours.new_data_possible():
+        print("[pipeline] market closed and last session already stored - nothing to do")
+        sys.exit(0)
+    recovered = storage.recover()
+    if recovered:
+        print(f"[pipeline] rolled forward {recovered} interrupted write(s)")
+    (run_parallel if "--parallel" in sys.argv else run)(args or None, force=force)
@@ -0,0 +1,146 @@
+import atexit
+import hashlib
+import json
+import os
+import threading
+import time
+import pandas as pd
+import metrics
+import storage
+
+# --- Cache Config ---
+DATA_DIR = "data_hub"
+CACHE_DIR = os.path.join(DATA_DIR, "cache")
+INDEX_FILE = os.path.join(CACHE_DIR, "index.json")
+ENABLED = os.environ.get("PRICE_CACHE", "1") != "0"
+MAX_ENTRIES = 1024
+MAX_BYTES = 256 * 1024 * 1024
+
+# Seconds a series stays fresh, by bar interval. Long enough that every stage of
+# one hourly run shares a download, short enough that the next run refetches.
+TTL = {"1m": 300, "2m": 300, "5m": 600, "15m": 900, "30m": 1800, "60m": 1800, "1h": 1800,
+       "1d": 1800, "5d": 1800, "1wk": 6 * 3600, "1mo": 24 * 3600, "3mo": 24 * 3600,
+       "info": 24 * 3600}
+DEFAULT_TTL = 1800
+
+_lock = threading.Lock()
+_index = None
+_memory = {}
+_dirty = False  # index changed in memory since the last flush
+
+def range_key(period=None, start=None, end=None):
+    """Canonical string for the requested range: the period, or 'start~end' dates."""
+    if start is None and end is None:
+        return period or "1mo"
+    fmt = lambda ts: "" if ts is None else pd.Timestamp(ts).strftime("%Y-%m-%d")
+    return f"{fmt(start)}~{fmt(end)}"
+
+def _key(symbol, interval, rng):
+    return hashlib.sha1(f"{symbol}|{interval}|{rng}".encode()).hexdigest()
+
+def _path(key):
+    return os.path.join(CACHE_DIR, key + ".pkl")
+
+def _load_index():
+    global _index
+    if _index is None:
+        try:
+            with open(INDEX_FILE, 'r') as f: _index = json.load(f)
+        except (OSError, ValueError):
+            _index = {}
+    return _index
+
+def _save_index():
+    """Write the index, first taking in entries another process saved since it was loaded."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with storage.lock(INDEX_FILE):
+        try:
+            with open(INDEX_FILE, 'r') as f: stored = json.load(f)
+        except (OSError, ValueError):
+            stored = {}
+        for key, entry in stored.items():
+            mine = _index.get(key)
+            if (mine is None and os.path.exists(_path(key))) or (mine is not None and entry['fetched_at'] > mine['fetched_at']):
+                _index[key] = entry
+        storage.write_json(INDEX_FILE, _index)
+
+def _evict(index):
+    """Drop least-recently-used entries until both the count and byte limits hold."""
+    total = sum(e['bytes'] for e in index.values())
+    for key in sorted(index, key=lambda k: index[k]['last_access']):
+        if len(index) <= MAX_ENTRIES and total <= MAX_BYTES:
+            break
+        total -= index.pop(key)['bytes']
+        _memory.pop(key, None)
+        try:
+            os.remove(_path(key))
+        except OSError:
+            pass
+
+def flush():
+    """Evict and save the index once for a batch of get/put calls; a no-op when nothing changed."""
+    global _dirty
+    with _lock:
+        if not _dirty:
+            return
+        _evict(_load_index())
+        _save_index()
+        _dirty = False
+
+atexit.register(flush)  # a caller that skipped flush() still leaves its entries indexed
+
+def get(symbol, interval, rng, columns=("Close",)):
+    """Cached frame for (symbol, interval, range) if still fresh and holding `columns`, else None."""
+    global _dirty
+    if not ENABLED:
+        return None
+    key = _key(symbol, interval, rng)
+    with _lock:
+        entry = _load_index().get(key)
+        if entry is None or time.time() - entry['fetched_at'] > TTL.get(interval, DEFAULT_TTL):
+            return None
+        if not set(columns) <= set(entry['columns']):
+            return None
+        frame = _memory.get(key)
+        if frame is None:
+            try:
+                frame = pd.read_pickle(_path(key))
+            except (OSError, ValueError, EOFError):
+                return None
+            _memory[key] = frame
+        entry['last_access'] = time.time()
+        _dirty = True
+        return frame
+
+def put(symbol, interval, rng, frame):
+    global _dirty
+    if not ENABLED or frame is None or frame.empty:
+        return
+    key = _key(symbol, interval, rng)
+    with _lock:
+        index = _load_index()
+        old = index.get(key)
+        fresh = old is not None and time.time() - old['fetched_at'] <= TTL.get(interval, DEFAULT_TTL)
+        if fresh and set(old['columns']) > set(frame.columns):
+            return  # keep the richer frame (full history beats a bare Close column) until it expires
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with storage.replacing(_path(key), 'wb') as f: frame.to_pickle(f)
+        now = time.time()
+        index[key] = {"symbol": symbol, "interval": interval, "range": rng, "columns": list(frame.columns),
+                      "fetched_at": now, "last_access": now, "bytes": os.path.getsize(_path(key))}
+        metrics.add(bytes_written=index[key]['bytes'])
+        _memory[key] = frame
+        _dirty = True
+
+def clear():
+    global _index, _dirty
+    with _lock:
+        for key in _load_index():
+            try:
+                os.remove(_path(key))
+            except OSError:
+                pass
+        _index = {}
+        _memory.clear()
+        _save_index()
+        _dirty = False
@@ -0,0 +1,120 @@
+import os
+import pandas as pd
+import history_store
+import storage
+
+# --- Paths & Config ---
+DATA_DIR = "data_hub"
+ROLLUP_DIR = os.path.join(DATA_DIR, "history_rollups")
+FIELDS = ("open", "high", "low", "close")
+AGG = {"open": "first", "high": "max", "low": "min", "close": "last"}
+RAW_KEEP = pd.Timedelta(days=30)
+# (tier, bucket width, how long the tier keeps bars; None = forever), finest first
+TIERS = [
+    ("hourly", pd.Timedelta(hours=1), pd.Timedelta(days=365)),
+    ("daily", pd.Timedelta(days=1), None),
+]
+COMPACT_FRACTION = 0.25  # rewrite a tier only once this share of it has expired
+
+# Raw samples live in the history store. Each rollup tier is four more stores of the
+# same layout (open/high/low/close, one column per ticker, bars labelled by bucket
+# start), so appends and range reads work exactly as for raw samples. Bars are only
+# written for buckets that have closed, and every tier is rolled up from the one
+# below it before that one is compacted, so nothing is dropped before it is summarized.
+# update() and merge() hold storage.lock(root) throughout, so only one runs at a time.
+
+def tier_dir(tier, field, root=ROLLUP_DIR):
+    return os.path.join(root, tier, field)
+
+def _bars(sources, width, until):
+    """OHLC bars for the buckets that closed before `until`, from one wide frame per field."""
+    bars = {}
+    for field, how in AGG.items():
+        df = sources[field]
+        bucket = df['ts'].dt.floor(width)
+        keep = (bucket < until).to_numpy()
+        bars[field] = df.loc[keep].drop(columns='ts').groupby(bucket[keep]).agg(how)
+    return bars
+
+def update(store_dir=history_store.STORE_DIR, root=ROLLUP_DIR):
+    """Roll newly closed buckets up tier by tier, then compact what every tier has outlived.
+
+    Only samples past each tier's last bar are read, so the cost follows the new data.
+    Returns the number of bars written per tier.
+    """
+    with storage.lock(root):  # the sampler and the tracker both roll up
+        newest = history_store.last_timestamp(store_dir)
+        if newest is None:
+            return {}
+        written, below, raw = {}, None, None
+        for tier, width, _ in TIERS:
+            dirs = {f: tier_dir(tier, f, root) for f in FIELDS}
+            last = history_store.last_timestamp(dirs['close'])
+            since = None if last is None else last + width
+            if below is None:
+                raw = history_store.load_frame(store_dir, start=since)
+                sources = dict.fromkeys(FIELDS, raw)  # a raw sample is its own open/high/low/close
+            else:
+                sources = {f: history_store.load_frame(below[f], start=since) for f in FIELDS}
+            bars = _bars(sources, width, newest.floor(width))
+            for f in FIELDS:
+                history_store.append_frame(bars[f], dirs[f])
+            written[tier] = len(bars['close'])
+            below = dirs
+
+        # Drop from each level only what the next tier up has already rolled up
+        levels = [({"raw": store_dir}, RAW_KEEP)] + [({f: tier_dir(t, f, root) for f in FIELDS}, keep) for t, _, keep in TIERS]
+        for (dirs, keep), (tier, width, _) in zip(levels, TIERS):
+            rolled = history_store.last_timestamp(tier_dir(tier, 'close', root))
+            if keep is None or rolled is None:
+                continue
+            cutoff = min(rolled + width, (newest - keep).floor(width))
+            for d in dirs.values():
+                history_store.drop_before(cutoff, d, min_fraction=COMPACT_FRACTION)
+        return written
+
+def merge(df, store_dir=history_store.STORE_DIR, root=ROLLUP_DIR):
+    """Fill holes in every level with backfilled samples (wide frame, DatetimeIndex); stored values win.
+
+    Raw samples take what falls inside the span they still keep (everything when the
+    store is empty); a tier takes bars for the buckets it has already rolled up, and
+    later buckets are rolled up from below by update(). The coarsest tier keeps
+    everything, so samples older than all levels still land there.
+    Returns the number of cells filled per level.
+    """
+    if df.empty:
+        return {}
+    with storage.lock(root):
+        df = df.sort_index()
+        first = history_store.first_timestamp(store_dir)
+        filled = {"raw": history_store.merge_frame(df if first is None else df[df.index >= first], store_dir)}
+        frame = df.rename_axis('ts').reset_index()
+        for i, (tier, width, _) in enumerate(TIERS):
+            dirs = {f: tier_dir(tier, f, root) for f in FIELDS}
+            last = history_store.last_timestamp(dirs['close'])
+            if last is None:
+                continue
+            bars = _bars(dict.fromkeys(FIELDS, frame), width, last + width)
+            start = history_store.first_timestamp(dirs['close'])
+            if i < len(TIERS) - 1:
+                bars = {f: b[b.index >= start] for f, b in bars.items()}
+            filled[tier] = sum(history_store.merge_frame(bars[f], dirs[f]) for f in FIELDS)
+        return filled
+
+def load_range(start=None, end=None, tickers=None, field="close", store_dir=history_store.STORE_DIR, root=ROLLUP_DIR):
+    """Wide frame ('ts' + one column per ticker) over [start, end) at the finest resolution kept.
+
+    Raw samples where they still exist, hourly bars before that, daily bars before that.
+    """
+    parts, cut = [], end
+    for d in [store_dir] + [tier_dir(t, field, root) for t, _, _ in TIERS]:
+        part = history_store.load_frame(d, start=start, end=cut, columns=tickers)
+        if not part.empty:
+            parts.append(part)
+        first = history_store.first_timestamp(d)
+        if first is not None:
+            cut = first if cut is None else min(cut, first)
+    if not parts:
+        return history_store.load_frame(store_dir, start=start, end=end, columns=tickers)
+    df = pd.concat(parts[::-1], ignore_index=True)
+    return df[['ts'] + [c for c in df.columns if c != 'ts']]
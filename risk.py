@@ -0,0 +1,138 @@
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import archive_index
+import metrics
+import storage
+
+# --- Paths & Config ---
+DATA_DIR = "data_hub"
+PORTFOLIO_FILE = os.path.join(DATA_DIR, "portfolio.json")
+RISK_FILE = os.path.join(DATA_DIR, "risk_report.json")
+PATHS = int(os.environ.get("RISK_PATHS", 100_000))
+HORIZON = 250  # trading days simulated per path
+LOOKBACK = pd.Timedelta(days=3 * 365)
+CHUNK_CELLS = 4_000_000  # paths x days x assets drawn at once; bounds memory at ~100MB per worker
+WORKERS = int(os.environ.get("RISK_WORKERS", 1))
+LEVELS = (0.95, 0.99)
+SEED = 7
+
+# Paths are buy-and-hold: each asset compounds its own simulated returns and the
+# portfolio is the sum of the positions, so weights drift the way the real book does.
+# Only a few numbers per path are kept (1- and 10-day P&L, max drawdown, final value),
+# so memory is bounded by the chunk size whatever the path count.
+
+def daily_returns(tickers, start=None):
+    """Daily close-to-close returns (date x ticker) from the archive, on days every ticker traded."""
+    df = archive_index.load_prices(tickers, start=start, columns=("price",))
+    if df.empty:
+        return pd.DataFrame(columns=tickers, dtype=float)
+    df['day'] = df['timestamp'].dt.normalize()
+    closes = df.pivot_table(index='day', columns='ticker', values='price', aggfunc='last', observed=True)
+    closes = closes.reindex(columns=[t for t in tickers if t in closes.columns]).astype(float)
+    return closes.pct_change(fill_method=None).dropna(how='any')
+
+def latest_prices(tickers):
+    df = archive_index.load_prices(tickers, columns=("price",))
+    return df.groupby('ticker', observed=True)['price'].last().astype(float)
+
+def _simulate_chunk(task):
+    """(1-day P&L, 10-day P&L, max drawdown, final value) for one chunk of paths."""
+    method, paths, seed, values, mu, chol, hist = task
+    rng = np.random.default_rng(seed)
+    n = len(values)
+    if method == "bootstrap":
+        returns = hist[rng.integers(0, len(hist), size=(paths, HORIZON))].astype(np.float32)
+    else:
+        returns = rng.standard_normal((paths, HORIZON, n), dtype=np.float32) @ chol.T.astype(np.float32)
+        returns += mu.astype(np.float32)
+    np.maximum(returns, -0.99, out=returns)  # a normal draw can fall below -100%; a price cannot
+    np.log1p(returns, out=returns)
+    np.cumsum(returns, axis=1, out=returns)
+    np.exp(returns, out=returns)
+    book = returns @ values.astype(np.float32)  # portfolio value per path and day (float32 halves the memory traffic)
+    total = values.sum()
+    peak = np.maximum.accumulate(np.maximum(book, total), axis=1)
+    return (book[:, 0] - total, book[:, min(9, HORIZON - 1)] - total,
+            (1 - book / peak).max(axis=1), book[:, -1])
+
+def simulate(values, returns, paths=PATHS, method="cholesky", workers=WORKERS, seed=SEED):
+    """Monte Carlo over `paths` buy-and-hold paths of HORIZON days, in memory-bounded chunks.
+
+    values: current USD value per asset; returns: historical daily returns (days x assets).
+    Chunks get independent seeds from one SeedSequence, so results do not depend on workers.
+    """
+    hist = returns.to_numpy(dtype=float)
+    values = np.asarray(values, dtype=float)
+    mu = hist.mean(axis=0)
+    cov = np.cov(hist, rowvar=False).reshape(len(values), len(values))
+    # A tiny ridge keeps Cholesky working when two assets are (nearly) collinear
+    chol = np.linalg.cholesky(cov + np.eye(len(values)) * 1e-12 * max(np.trace(cov), 1e-12))
+    per_chunk = max(1, CHUNK_CELLS // (HORIZON * len(values)))
+    sizes = [min(per_chunk, paths - i) for i in range(0, paths, per_chunk)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [(method, size, s, values, mu, chol, hist) for size, s in zip(sizes, seeds)]
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+            parts = list(pool.map(_simulate_chunk, tasks))
+    else:
+        parts = [_simulate_chunk(t) for t in tasks]
+    pnl_1d, pnl_10d, drawdown, final = (np.concatenate(p) for p in zip(*parts))
+    return {"pnl_1d": pnl_1d, "pnl_10d": pnl_10d, "max_drawdown": drawdown, "final": final, "cov": cov}
+
+def var_cvar(pnl, level):
+    """Value at Risk and Conditional VaR (expected shortfall) as positive losses."""
+    cut = np.quantile(pnl, 1 - level)
+    return float(-cut), float(-pnl[pnl <= cut].mean())
+
+def summarize(sim, total):
+    report = {"portfolio_usd": round(float(total), 2)}
+    for horizon in ("1d", "10d"):
+        for level in LEVELS:
+            var, cvar = var_cvar(sim[f"pnl_{horizon}"], level)
+            key = f"{horizon}_{int(level * 100)}"
+            report[f"var_{key}"] = round(var, 2)
+            report[f"cvar_{key}"] = round(cvar, 2)
+    dd = sim["max_drawdown"]
+    report["drawdown_pct"] = {f"p{q}": round(float(np.percentile(dd, q)) * 100, 2) for q in (5, 25, 50, 75, 95, 99)}
+    report["drawdown_prob"] = {f">{t}%": round(float((dd > t / 100).mean()), 4) for t in (10, 20, 30, 50)}
+    report["final_return_pct"] = {f"p{q}": round(float(np.percentile(sim["final"] / total - 1, q)) * 100, 2)
+                                  for q in (5, 50, 95)}
+    return report
+
+def main(holdings=None, paths=PATHS, method=None, workers=WORKERS):
+    if holdings is None:
+        if not os.path.exists(PORTFOLIO_FILE): return
+        with open(PORTFOLIO_FILE, 'r') as f: holdings = json.load(f)
+    start = time.perf_counter()
+    method = method or os.environ.get("RISK_METHOD", "cholesky")
+    tickers = list(holdings)
+    newest = archive_index.load_prices(tickers, columns=())['timestamp'].max()
+    returns = daily_returns(tickers, start=None if pd.isna(newest) else newest - LOOKBACK)
+    prices = latest_prices(list(returns.columns))
+    held = [t for t in returns.columns if t in prices.index]
+    if len(returns) < 20 or not held:
+        print("Not enough archive history for a risk simulation.")
+        return
+    values = np.array([holdings[t]['amount'] * prices[t] for t in held])
+    sim = simulate(values, returns[held], paths=paths, method=method, workers=workers)
+    report = summarize(sim, values.sum())
+    report.update({
+        "method": method, "paths": paths, "horizon_days": HORIZON, "history_days": len(returns),
+        "tickers": held, "updated": pd.Timestamp.now().strftime("%Y-%m-%d %H:%M"),
+        "volatility_pct": {t: round(float(np.sqrt(sim["cov"][i, i] * 252)) * 100, 2) for i, t in enumerate(held)},
+    })
+    storage.write_json(RISK_FILE, report, indent=2)
+    metrics.wrote(RISK_FILE)
+    print(f"Simulated {paths:,} x {HORIZON}-day paths ({method}) in {time.perf_counter() - start:.1f}s: "
+          f"1-day VaR99 ${report['var_1d_99']:,.0f}, 10-day VaR99 ${report['var_10d_99']:,.0f}, "
+          f"median max drawdown {report['drawdown_pct']['p50']:.1f}%")
+    return report
+
+if __name__ == "__main__":
+    import sys
+    with metrics.stage("risk"):
+        main(method=sys.argv[1] if len(sys.argv) > 1 else None)
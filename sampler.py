@@ -0,0 +1,237 @@
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import signal
+import time
+import zlib
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import pytz
+import feature_store
+import history_store
+import market_data
+import market_hours
+import retention
+
+# --- Paths & Config ---
+DATA_DIR = "data_hub"
+PORTFOLIO_FILE = os.path.join(DATA_DIR, "portfolio.json")
+LOG_FILE = os.path.join(DATA_DIR, "error_log.txt")
+TZ = pytz.timezone('Israel')  # stored timestamps are Israel wall-clock, as stock_tracker writes them
+INTERVAL = 30.0  # seconds between polls
+FLUSH_INTERVAL = 300.0  # seconds between store writes
+BATCH_SIZE = 20  # ...or as soon as this many ticks are pending
+CAPACITY = 4096  # ticks kept in memory
+MAX_IDLE = 3600.0  # longest sleep while the market is shut; the calendar is re-checked after it
+
+os.makedirs(DATA_DIR, exist_ok=True)
+logging.basicConfig(filename=LOG_FILE, level=logging.ERROR, format='%(asctime)s: %(message)s')
+
+# --- Quote Sources ---
+# A source is any object with `async def quote(ticker) -> float`.
+
+class ProviderSource:
+    """Last prices from the market_data provider (Yahoo, or the fake one), called off the event loop."""
+
+    def __init__(self, provider=None):
+        self.provider = provider or market_data.get_provider()
+
+    async def quote(self, ticker):
+        return await asyncio.to_thread(market_data.with_retry, self.provider.quote, ticker)
+
+class FakeFeed:
+    """Local random-walk feed with per-quote latency, for running the daemon offline."""
+
+    def __init__(self, latency=0.05, volatility=0.0005, seed=0):
+        self.latency = latency
+        self.volatility = volatility
+        self.rng = random.Random(seed)
+        self.prices = {}
+
+    async def quote(self, ticker):
+        await asyncio.sleep(self.latency * self.rng.random())
+        price = self.prices.get(ticker, 20 + zlib.crc32(ticker.encode()) % 500)
+        self.prices[ticker] = price * math.exp(self.rng.gauss(0, self.volatility))
+        return round(self.prices[ticker], 4)
+
+# --- Ring Buffer ---
+
+class RingBuffer:
+    """Fixed-size tick buffer: one epoch-second timestamp and one price row per tick.
+
+    `written` and `flushed` are running tick counts; ticks between them are pending.
+    When pending ticks would be overwritten (the store is unreachable for too long)
+    the oldest are dropped and counted in `dropped`.
+    """
+
+    def __init__(self, tickers, capacity=CAPACITY):
+        self.tickers = list(tickers)
+        self.capacity = capacity
+        self.ts = np.zeros(capacity, dtype=np.int64)
+        self.prices = np.full((capacity, len(self.tickers)), np.nan)
+        self.written = self.flushed = self.dropped = 0
+
+    def push(self, epoch, values):
+        i = self.written % self.capacity
+        self.ts[i] = epoch
+        self.prices[i] = values
+        self.written += 1
+        if self.written - self.flushed > self.capacity:
+            self.flushed += 1
+            self.dropped += 1
+
+    def pending(self):
+        return self.written - self.flushed
+
+    def last(self):
+        return None if not self.written else self.prices[(self.written - 1) % self.capacity]
+
+    def frame(self, start, stop):
+        """Ticks start..stop (running counts) as a wide frame indexed by time."""
+        idx = np.arange(start, stop) % self.capacity
+        return pd.DataFrame(self.prices[idx], index=pd.to_datetime(self.ts[idx], unit='s'), columns=self.tickers)
+
+    def recent(self, n):
+        return self.frame(max(self.written - min(n, self.capacity), 0), self.written)
+
+# --- Daemon ---
+
+def load_tickers(path=PORTFOLIO_FILE):
+    with open(path, 'r') as f: tickers = list(json.load(f))
+    return tickers + ([] if "SPY" in tickers else ["SPY"])
+
+class Sampler:
+    def __init__(self, source, tickers, interval=INTERVAL, flush_interval=FLUSH_INTERVAL, batch_size=BATCH_SIZE,
+                 capacity=CAPACITY, market_only=True, store_dir=history_store.STORE_DIR):
+        self.source = source
+        self.interval = interval
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.market_only = market_only
+        self.store_dir = store_dir
+        self.buffer = RingBuffer(tickers, capacity)
+        # Made in run(): before 3.10 asyncio primitives bind to the loop current at creation,
+        # which is not the one asyncio.run() starts
+        self.concurrency = self.batch_ready = self.stop = None
+        self.polls = self.skipped = self.flushes = 0
+
+    async def _quote(self, ticker):
+        async with self.concurrency:
+            try:
+                return await asyncio.wait_for(self.source.quote(ticker), timeout=self.interval)
+            except Exception as e:
+                logging.error(f"Quote failed for {ticker}: {e}")
+                return np.nan
+
+    async def poll(self):
+        """Quote every ticker concurrently and push one tick; unchanged or same-second ticks are skipped."""
+        values = np.array(await asyncio.gather(*(self._quote(t) for t in self.buffer.tickers)), dtype=float)
+        self.polls += 1
+        epoch = int((pd.Timestamp(datetime.now(TZ)).tz_localize(None) - pd.Timestamp(0)) // pd.Timedelta(seconds=1))
+        last = self.buffer.last()
+        if np.isnan(values).all() or (last is not None and np.array_equal(values, last, equal_nan=True)) \
+                or (self.buffer.written and self.buffer.ts[(self.buffer.written - 1) % self.buffer.capacity] == epoch):
+            self.skipped += 1
+            return False
+        self.buffer.push(epoch, values)
+        if self.buffer.pending() >= self.batch_size:
+            self.batch_ready.set()
+        return True
+
+    def _write(self, frame):
+        history_store.append_frame(frame, self.store_dir)
+        # Same follow-up as stock_tracker: fold the batch into indicators and rollups
+        if self.store_dir == history_store.STORE_DIR:
+            feature_store.update()
+            retention.update()
+
+    async def flush(self):
+        """Write pending ticks to the history store in one append; kept pending if the write fails."""
+        start, stop = self.buffer.flushed, self.buffer.written
+        if stop == start:
+            return 0
+        try:
+            await asyncio.to_thread(self._write, self.buffer.frame(start, stop))
+        except Exception as e:
+            logging.error(f"Sampler flush failed: {e}")
+            return 0
+        self.buffer.flushed = max(self.buffer.flushed, stop)
+        self.flushes += 1
+        return stop - start
+
+    async def _sleep(self, seconds):
+        try:
+            await asyncio.wait_for(self.stop.wait(), timeout=max(seconds, 0))
+        except asyncio.TimeoutError:
+            pass
+
+    async def _poll_loop(self):
+        loop = asyncio.get_running_loop()
+        next_at = loop.time()
+        while not self.stop.is_set():
+            now = datetime.now(pytz.utc)
+            if self.market_only and not market_hours.is_open(now):
+                await self._sleep(min(MAX_IDLE, (market_hours.next_open(now) - now).total_seconds()))
+                next_at = loop.time()
+                continue
+            await self.poll()
+            next_at += self.interval  # fixed schedule: slow polls do not push later ones back
+            await self._sleep(next_at - loop.time())
+
+    async def _flush_loop(self):
+        while not self.stop.is_set():
+            try:
+                await asyncio.wait_for(self.batch_ready.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.batch_ready.clear()
+            await self.flush()
+
+    async def run(self, duration=None):
+        """Poll and flush until stopped (signal or duration), then flush what is left."""
+        loop = asyncio.get_running_loop()
+        self.concurrency = asyncio.Semaphore(max(1, market_data.MAX_WORKERS))
+        self.batch_ready = asyncio.Event()
+        self.stop = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.stop.set)
+            except (NotImplementedError, RuntimeError):
+                pass
+        if duration:
+            loop.call_later(duration, self.stop.set)
+        tasks = [asyncio.create_task(self._poll_loop()), asyncio.create_task(self._flush_loop())]
+        await self.stop.wait()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.flush()
+
+def main():
+    parser = argparse.ArgumentParser(description="Intraday sampler daemon: polls quotes and batches them into the history store")
+    parser.add_argument("--interval", type=float, default=INTERVAL, help="seconds between polls")
+    parser.add_argument("--flush-interval", type=float, default=FLUSH_INTERVAL, help="seconds between store writes")
+    parser.add_argument("--batch", type=int, default=BATCH_SIZE, help="flush once this many ticks are pending")
+    parser.add_argument("--capacity", type=int, default=CAPACITY, help="ticks kept in the ring buffer")
+    parser.add_argument("--duration", type=float, help="stop after this many seconds")
+    parser.add_argument("--always", action="store_true", help="poll outside market hours too")
+    parser.add_argument("--fake", action="store_true", help="use the local random-walk feed")
+    args = parser.parse_args()
+
+    source = FakeFeed() if args.fake else ProviderSource()
+    history_store.ensure_store()
+    sampler = Sampler(source, load_tickers(), args.interval, args.flush_interval, args.batch, args.capacity,
+                      market_only=not (args.always or args.fake))
+    start = time.perf_counter()
+    asyncio.run(sampler.run(args.duration))
+    print(f"Sampler stopped after {time.perf_counter() - start:.0f}s: {sampler.polls} polls, "
+          f"{sampler.buffer.written} ticks, {sampler.skipped} skipped, {sampler.flushes} flushes, "
+          f"{sampler.buffer.dropped} dropped")
+
+if __name__ == "__main__":
+    main()
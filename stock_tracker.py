@@ -1,63 +1,67 @@
-import yfinance as yf
 import json
 import os
 from datetime import datetime
 import pytz
 import pandas as pd
 import logging
+import backfill
+import history_store
+import feature_store
+import fx
+import retention
+import market_data
+import metrics
+import storage
 
 # --- Paths & Config ---
 BASE_DIR = "data_hub"
 PORTFOLIO_FILE = os.path.join(BASE_DIR, "portfolio.json")
-HISTORY_FILE = os.path.join(BASE_DIR, "stock_history.json")
 LOG_FILE = os.path.join(BASE_DIR, "error_log.txt")
 TZ = pytz.timezone('Israel')
-MAX_ROWS = 10000
 
 os.makedirs(BASE_DIR, exist_ok=True)
 logging.basicConfig(filename=LOG_FILE, level=logging.ERROR, format='%(asctime)s: %(message)s')
 
 def main():
     if not os.path.exists(PORTFOLIO_FILE):
-        with open(PORTFOLIO_FILE, 'w') as f: json.dump({"SPY": 1}, f)
+        storage.write_json(PORTFOLIO_FILE, {"SPY": 1})
     
     with open(PORTFOLIO_FILE, 'r') as f: holdings = json.load(f)
     tickers = list(holdings.keys())
     if "SPY" not in tickers: tickers.append("SPY")
 
-    if os.path.exists(HISTORY_FILE):
-        with open(HISTORY_FILE, 'r', encoding='utf-8') as f: history = json.load(f)
-    else:
-        history = []
-
-    # Backfill logic
-    if not history:
-        print("Backfilling...")
-        df = yf.download(tickers, period="1y", interval="1d", progress=False)['Close']
-        df = df.ffill().bfill()
-        for dt, row in df.iterrows():
-            history.append({
-                "timestamp": dt.strftime("%Y-%m-%d %H:%M:%S"),
-                "prices": {t: round(float(v), 2) for t, v in row.to_dict().items() if pd.notna(v)}
-            })
+    # Migrates the legacy stock_history.json on first run
+    history_store.ensure_store()
+
+    # Backfill only the sessions and hours missing per ticker (all of them on first run)
+    try:
+        requests = backfill.fill_history(tickers)
+        if requests:
+            print(f"Backfilled {len(requests)} gap(s) for {len({t for r in requests for t in r['tickers']})} ticker(s)")
+    except Exception as e:
+        logging.error(f"Backfill failed: {e}")
 
     # Live sample
     try:
-        live = yf.download(tickers, period="1d", interval="1m", progress=False)['Close']
+        live = market_data.download_closes(tickers, period="1d", interval="1m")
         if not live.empty:
             last = live.iloc[-1]
-            ts = datetime.now(TZ).strftime("%Y-%m-%d %H:%M:%S")
-            if not history or history[-1]['timestamp'][:16] != ts[:16]:
-                history.append({
-                    "timestamp": ts,
-                    "prices": {t: round(float(v), 2) for t, v in last.to_dict().items() if pd.notna(v)}
-                })
+            now = datetime.now(TZ)
+            last_ts = history_store.last_timestamp()
+            if last_ts is None or last_ts.strftime("%Y-%m-%d %H:%M") != now.strftime("%Y-%m-%d %H:%M"):
+                history_store.append({t: float(v) for t, v in last.to_dict().items() if pd.notna(v)}, now)
     except Exception as e:
         logging.error(f"Sampling failed: {e}")
 
-    history = sorted(history, key=lambda x: x['timestamp'])[-MAX_ROWS:]
-    with open(HISTORY_FILE, 'w', encoding='utf-8') as f:
-        json.dump(history, f, indent=4)
+    # Fold the new sample into the running indicator state
+    feature_store.update()
+
+    # Roll closed hours/days into OHLC bars and compact samples past their retention
+    retention.update()
+
+    # Extend the stored USD/ILS series; a request only when a new day has completed
+    fx.update()
 
 if __name__ == "__main__":
-    main()
+    with metrics.stage("track"):
+        main()
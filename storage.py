@@ -0,0 +1,221 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # not POSIX: locks only hold between threads of one process
+    fcntl = None
+
+# Stdlib only: metrics writes through this module.
+
+# --- Paths & Config ---
+DATA_DIR = "data_hub"
+LOCK_DIR = os.path.join(DATA_DIR, ".locks")
+JOURNAL_DIR = os.path.join(DATA_DIR, ".journal")
+LOCK_TIMEOUT = float(os.environ.get("STORAGE_LOCK_TIMEOUT", 300))
+POLL = 0.05
+
+# Every data_hub write goes through here, so stages can run at the same time.
+# - lock(path): an advisory flock on a sidecar file in LOCK_DIR, held across
+#   processes and re-entrant within a thread. Read-modify-write sequences (state
+#   files, caches) hold it around the whole sequence.
+# - replacing(path) / write_*: content goes to a temp file beside the target,
+#   is fsynced, and replaces it with os.replace, so readers see the old file or
+#   the new one, never a torn one.
+# - append(path, data): the bytes and the file's current length are saved first,
+#   then appended.
+# Both kinds of write are recorded in JOURNAL_DIR before they touch the target and
+# the entry is removed once they have. A run that dies in between leaves the entry
+# behind, and the next lock on that path (or recover()) rolls it forward: the temp
+# file is renamed in, or the file is cut back to its old length and the append
+# redone. Binary stores with their own commit marker (history_store,
+# archive_index) keep appending directly.
+
+_guard = threading.Lock()
+_held = {}  # absolute path -> {"rlock", "fd", "depth"}
+
+def _key(path):
+    return os.path.abspath(path)
+
+def _digest(key):
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+def _lock_file(key):
+    return os.path.join(LOCK_DIR, f"{_digest(key)}-{os.path.basename(key)}.lock")
+
+def _flock(key, timeout):
+    os.makedirs(LOCK_DIR, exist_ok=True)
+    fd = os.open(_lock_file(key), os.O_RDWR | os.O_CREAT, 0o644)
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return fd
+        except BlockingIOError:
+            if time.monotonic() > deadline:
+                os.close(fd)
+                raise TimeoutError(f"Timed out after {timeout:.0f}s waiting for the lock on {key}")
+            time.sleep(POLL)
+
+@contextmanager
+def lock(path, timeout=LOCK_TIMEOUT):
+    """Exclusive advisory lock on path across threads and processes; re-entrant within a thread."""
+    key = _key(path)
+    with _guard:
+        entry = _held.setdefault(key, {"rlock": threading.RLock(), "fd": None, "depth": 0})
+    if not entry['rlock'].acquire(timeout=timeout):
+        raise TimeoutError(f"Timed out after {timeout:.0f}s waiting for the lock on {key}")
+    try:
+        if entry['depth'] == 0:
+            if fcntl is not None:
+                entry['fd'] = _flock(key, timeout)
+            _roll_forward(_digest(key))
+        entry['depth'] += 1
+        try:
+            yield
+        finally:
+            entry['depth'] -= 1
+            if entry['depth'] == 0 and entry['fd'] is not None:
+                fcntl.flock(entry['fd'], fcntl.LOCK_UN)
+                os.close(entry['fd'])
+                entry['fd'] = None
+    finally:
+        entry['rlock'].release()
+
+# --- Journal ---
+
+def _sidecar(path, suffix):
+    directory, name = os.path.split(os.path.abspath(path))
+    return os.path.join(directory, f".{name}.{uuid.uuid4().hex[:12]}{suffix}")
+
+def _fsync_dir(path):
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def _journal(op):
+    """Write a journal entry atomically; entries for one path sort in the order they were made."""
+    os.makedirs(JOURNAL_DIR, exist_ok=True)
+    name = f"{_digest(_key(op['path']))}-{time.time_ns():020d}-{uuid.uuid4().hex[:6]}.json"
+    entry = os.path.join(JOURNAL_DIR, name)
+    with open(entry + ".tmp", 'w') as f:
+        json.dump(op, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(entry + ".tmp", entry)
+    return entry
+
+def _apply(op):
+    """Carry out a journaled write; safe to repeat."""
+    if op['op'] == "replace":
+        if os.path.exists(op['tmp']):
+            os.replace(op['tmp'], op['path'])
+            _fsync_dir(op['path'])
+    elif op['op'] == "append":
+        if os.path.exists(op['data']):
+            with open(op['data'], 'rb') as f: data = f.read()
+            with open(op['path'], 'ab') as f:
+                f.truncate(op['offset'])
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.remove(op['data'])
+
+def _commit(op):
+    entry = _journal(op)
+    _apply(op)
+    os.remove(entry)
+
+def _roll_forward(prefix=""):
+    """Finish journaled writes left by an interrupted run (all of them, or one path's by digest)."""
+    if not os.path.isdir(JOURNAL_DIR):
+        return 0
+    names = sorted(n for n in os.listdir(JOURNAL_DIR) if n.endswith(".json") and n.startswith(prefix))
+    for name in names:
+        entry = os.path.join(JOURNAL_DIR, name)
+        try:
+            with open(entry, 'r') as f: op = json.load(f)
+        except (OSError, ValueError):
+            continue
+        _apply(op)
+        os.remove(entry)
+    return len(names)
+
+def recover():
+    """Roll every pending journal entry forward, each under its path's lock. Returns the count."""
+    if not os.path.isdir(JOURNAL_DIR):
+        return 0
+    done = 0
+    for name in sorted(os.listdir(JOURNAL_DIR)):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(JOURNAL_DIR, name), 'r') as f: path = json.load(f)['path']
+        except (OSError, ValueError, KeyError):
+            continue
+        with lock(path):  # taking the lock rolls the path's entries forward
+            done += 1
+    return done
+
+# --- Writes ---
+
+@contextmanager
+def replacing(path, mode='w', encoding=None):
+    """File object whose content atomically replaces path when the block exits cleanly."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with lock(path):
+        tmp = _sidecar(path, ".tmp")
+        try:
+            with open(tmp, mode, encoding=encoding) as f:
+                yield f
+                f.flush()
+                os.fsync(f.fileno())
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+        _commit({"op": "replace", "path": os.path.abspath(path), "tmp": tmp})
+
+def write_bytes(path, data):
+    with replacing(path, 'wb') as f:
+        f.write(data)
+
+def write_text(path, text, encoding='utf-8'):
+    with replacing(path, 'w', encoding=encoding) as f:
+        f.write(text)
+
+def write_json(path, obj, **kwargs):
+    with replacing(path, 'w') as f:
+        json.dump(obj, f, **kwargs)
+
+def append(path, data, encoding='utf-8'):
+    """Append bytes or text under the path's lock. Returns the number of bytes added."""
+    if isinstance(data, str):
+        data = data.encode(encoding)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with lock(path):
+        offset = os.path.getsize(path) if os.path.exists(path) else 0
+        staged = _sidecar(path, ".append")
+        with open(staged, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        _commit({"op": "append", "path": os.path.abspath(path), "offset": offset, "data": staged})
+    return len(data)
+
+if __name__ == "__main__":
+    print(f"Rolled forward {recover()} pending write(s) from {JOURNAL_DIR}")
@@ -0,0 +1,25 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fx  # noqa: E402  (the repo root is on sys.path only from here on)
+import market_data  # noqa: E402
+import price_cache  # noqa: E402
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    """An empty data_hub under a temporary cwd, served by the offline fake provider.
+
+    Every module keeps its data_hub paths relative, so changing directory is enough
+    to isolate a test; the in-memory caches keyed on those paths are reset with it.
+    """
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("data_hub")
+    monkeypatch.setattr(price_cache, "ENABLED", False)
+    monkeypatch.setattr(fx, "_cache", {})
+    provider = market_data.FakeProvider()
+    market_data.set_provider(provider)
+    yield provider
+    market_data.set_provider(None)
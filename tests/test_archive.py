@@ -0,0 +1,76 @@
+import os
+from datetime import datetime
+import pandas as pd
+import pytest
+import archive
+
+NOW = datetime(2026, 3, 15, 12, 0)
+
+def _rows(*rows):
+    return pd.DataFrame([dict(zip(archive.COLUMNS, r)) for r in rows], columns=archive.COLUMNS)
+
+def _legacy():
+    """The old combined CSV: rows appended run by run, tickers interleaved, three months."""
+    rows = []
+    for day in ("2026-01-30", "2026-02-02", "2026-02-27", "2026-03-02", "2026-03-03"):
+        for i, ticker in enumerate(("AAA", "BBB")):
+            rows.append((f"{day} 16:00:00", ticker, 100.0 + i * 50 + int(day[-2:]) / 4, 0.0, 20.5 + i, 3.61))
+    return _rows(*rows)
+
+def test_upsert_appends_newer_rows_and_merges_repeated_keys(workspace):
+    archive.upsert(_rows(("2026-03-02 16:00:00", "AAA", 10.0, 0.0, 20.0, 3.6)), now=NOW)
+    path = os.path.join(archive.PARTITION_DIR, "AAA", "2026-03.csv")
+
+    archive.upsert(_rows(("2026-03-03 16:00:00", "AAA", 11.0, 0.0, 20.0, 3.6)), now=NOW)
+    with open(path, 'r') as f: appended = f.read()
+    assert appended.count("\n") == 3 and appended.endswith("11.0,0.0,20.0,3.6\n")
+
+    # An older row and a repeated (timestamp, ticker) key rewrite the partition in order, newest value winning
+    archive.upsert(_rows(("2026-03-03 16:00:00", "AAA", 11.5, 0.1, 21.0, 3.7),
+                         ("2026-03-01 16:00:00", "AAA", 9.0, 0.0, 19.0, 3.5)), now=NOW)
+
+    df = archive.read()
+    assert df['timestamp'].tolist() == ["2026-03-01 16:00:00", "2026-03-02 16:00:00", "2026-03-03 16:00:00"]
+    assert df['price'].tolist() == [9.0, 10.0, 11.5]
+    assert archive.signature() == archive.rescan() == [1, os.path.getsize(path)]
+
+def test_upsert_refuses_closed_months_unless_reopened(workspace):
+    rows = _rows(("2026-02-27 16:00:00", "AAA", 10.0, 0.0, 20.0, 3.6),
+                 ("2026-03-02 16:00:00", "AAA", 11.0, 0.0, 20.0, 3.6))
+
+    with pytest.raises(archive.ClosedPartitionError):
+        archive.upsert(rows, now=NOW)
+    assert archive.tickers() == []
+
+    assert archive.upsert(rows, reopen=True, now=NOW) == 2
+    assert archive.months("AAA") == ["2026-02", "2026-03"]
+
+def test_read_skips_months_outside_the_range(workspace, monkeypatch):
+    archive.upsert(_legacy(), reopen=True, now=NOW)
+    opened = []
+    read_partition = archive._read_partition
+    monkeypatch.setattr(archive, "_read_partition", lambda path: opened.append(path) or read_partition(path))
+
+    df = archive.read(["BBB"], start="2026-02-02 16:00:00", end="2026-03-01")
+
+    assert df['timestamp'].tolist() == ["2026-02-02 16:00:00", "2026-02-27 16:00:00"]
+    assert set(df['ticker']) == {"BBB"}
+    assert opened == [os.path.join(archive.PARTITION_DIR, "BBB", "2026-02.csv")]
+    assert [len(f) for f in archive.iter_frames(start="2026-03-01")] == [2, 2]
+
+def test_partitions_reproduce_the_old_combined_csv(workspace):
+    os.makedirs(archive.ARCHIVE_DIR)
+    legacy = _legacy()
+    legacy.to_csv(archive.LEGACY_CSV, index=False)
+
+    assert archive.ensure_archive()
+    assert sum(len(archive.months(t)) for t in archive.tickers()) == 6
+    exported = os.path.join(archive.ARCHIVE_DIR, "exported.csv")
+    assert archive.export(exported) == len(legacy)
+
+    key = ["ticker", "timestamp"]
+    expected = legacy.sort_values(key, ignore_index=True)
+    pd.testing.assert_frame_equal(archive.read(), expected)
+    pd.testing.assert_frame_equal(pd.read_csv(exported), expected)
+    assert pd.read_csv(os.path.join(archive.LEGACY_DIR, "AAA_history.csv")).equals(
+        expected[expected['ticker'] == "AAA"].reset_index(drop=True))
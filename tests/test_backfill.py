@@ -0,0 +1,48 @@
+from datetime import datetime, timedelta
+import pandas as pd
+import pytz
+import backfill
+import history_store
+
+# Wednesday and Friday, an hour after the New York close (21:00 UTC before US DST)
+WEDNESDAY = datetime(2026, 3, 4, 22, 0, tzinfo=pytz.utc)
+FRIDAY = WEDNESDAY + timedelta(days=2)
+
+def _stop_feed_at(provider, now):
+    provider.end = pd.Timestamp(now).tz_convert("America/New_York")
+
+def test_new_ticker_is_one_request_for_that_ticker_only(workspace):
+    _stop_feed_at(workspace, WEDNESDAY)
+    first = backfill.fill_archive(["AAA", "BBB"], now=WEDNESDAY)
+    assert [r['tickers'] for r in first] == [["AAA", "BBB"]]
+
+    planned = backfill.fill_archive(["AAA", "BBB", "NEW"], now=WEDNESDAY, dry_run=True)
+
+    assert len(planned) == 1
+    assert planned[0]['tickers'] == ["NEW"]
+    sessions = len(backfill.slots("1d", WEDNESDAY - timedelta(days=backfill.ARCHIVE_DAYS), WEDNESDAY)['labels'])
+    assert len(planned[0]['missing']["NEW"]) == sessions
+
+def test_missed_hours_are_coalesced_into_one_request(workspace):
+    _stop_feed_at(workspace, WEDNESDAY)
+    backfill.fill_history(["AAA", "BBB"], now=WEDNESDAY)
+    assert backfill.fill_history(["AAA", "BBB"], now=WEDNESDAY, dry_run=True) == []
+
+    # The tracker missed Thursday and Friday except for one run in the middle of Thursday
+    grid = backfill.slots("60m", WEDNESDAY, FRIDAY)
+    assert len(grid['labels']) == 14
+    sampled = grid['labels'][3]
+    history_store.append_frame(pd.DataFrame({"AAA": [100.0], "BBB": [50.0]}, index=[sampled]))
+
+    planned = backfill.fill_history(["AAA", "BBB"], now=FRIDAY, dry_run=True)
+
+    assert len(planned) == 1
+    request = planned[0]
+    assert request['kind'] == "60m"
+    assert request['tickers'] == ["AAA", "BBB"]
+    labels = backfill.slots("60m", FRIDAY - timedelta(days=backfill.INTRADAY_DAYS), FRIDAY)['labels']
+    for t in ("AAA", "BBB"):
+        missing = labels[request['missing'][t]]
+        assert len(missing) == 13
+        assert sampled not in missing
+        assert set(missing) == set(grid['labels']) - {sampled}
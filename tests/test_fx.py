@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+import fx
+import generate_report
+import history_store
+
+def _store(rates):
+    frame = pd.DataFrame({"date": list(rates), "rate": list(rates.values())})
+    with open(fx.FX_FILE, 'w') as f: frame.to_csv(f, index=False)
+
+def test_rates_at_is_nan_while_nothing_is_stored(workspace):
+    assert np.isnan(fx.rates_at(pd.to_datetime(["2026-03-02 17:00", "2026-03-03 10:00"]))).all()
+
+def test_rates_at_is_as_of_and_takes_the_first_day_for_older_stamps(workspace):
+    _store({"2026-03-02": 3.6, "2026-03-03": 3.7, "2026-03-05": 3.8})
+    ts = pd.to_datetime(["2025-12-31 12:00", "2026-03-02 00:00", "2026-03-03 23:59", "2026-03-04 10:00", "2026-03-09 10:00"])
+    assert fx.rates_at(ts).tolist() == [3.6, 3.6, 3.7, 3.7, 3.8]
+
+def test_rates_for_seeds_an_empty_series(workspace):
+    rates, approximate = fx.rates_for(pd.to_datetime(["2026-03-02 17:00"]))
+    assert not approximate
+    assert len(fx.series()) > 200
+    assert np.isfinite(rates).all()
+
+def test_rates_for_falls_back_to_a_live_rate_when_seeding_fails(workspace, monkeypatch):
+    monkeypatch.setattr(fx, "update", lambda now=None, path=fx.FX_FILE: 0)
+    rates, approximate = fx.rates_for(pd.to_datetime(["2026-03-02 17:00", "2026-03-03 10:00"]))
+    assert approximate
+    assert np.isfinite(rates).all() and rates[0] == rates[1]
+
+def test_readme_never_shows_nan_before_the_series_is_seeded(workspace, monkeypatch):
+    monkeypatch.setattr(fx, "update", lambda now=None, path=fx.FX_FILE: 0)
+    stamps = pd.date_range("2026-03-02 17:00", periods=48, freq="h")
+    history_store.append_frame(pd.DataFrame({"AAA": np.linspace(10, 12, 48), "SPY": np.linspace(500, 510, 48)}, index=stamps))
+    holdings = {"AAA": {"amount": 10, "avg_price": 9.0}}
+
+    generate_report.main(holdings, history_store.load_frame())
+
+    with open(generate_report.README_FILE, 'r', encoding='utf-8') as f: readme = f.read()
+    assert "nan" not in readme.lower()
+    assert "≈₪" in readme
@@ -0,0 +1,48 @@
+import json
+import numpy as np
+import pandas as pd
+import history_store
+
+def test_append_backfills_new_and_missing_tickers_with_nan(workspace):
+    history_store.append({"AAA": 10.0, "BBB": 20.0}, "2026-03-02 10:00")
+    history_store.append({"AAA": 10.5, "CCC": 30.0}, "2026-03-02 11:00")
+    history_store.append({"BBB": 21.123}, "2026-03-02 12:00")
+
+    df = history_store.load_frame()
+
+    assert history_store.row_count() == 3
+    assert history_store.tickers() == ["AAA", "BBB", "CCC"]
+    assert list(df.columns) == ["ts", "AAA", "BBB", "CCC"]
+    assert df['ts'].tolist() == list(pd.to_datetime(["2026-03-02 10:00", "2026-03-02 11:00", "2026-03-02 12:00"]))
+    assert np.array_equal(df['AAA'], [10.0, 10.5, np.nan], equal_nan=True)
+    assert np.array_equal(df['BBB'], [20.0, np.nan, 21.12], equal_nan=True)
+    assert np.array_equal(df['CCC'], [np.nan, 30.0, np.nan], equal_nan=True)
+
+def test_load_frame_narrows_by_start_end_columns_and_tail(workspace):
+    stamps = pd.date_range("2026-03-02 10:00", periods=6, freq="h")
+    history_store.append_frame(pd.DataFrame({"AAA": np.arange(6.0), "BBB": np.arange(6.0) * 10}, index=stamps))
+
+    window = history_store.load_frame(start=stamps[1], end=stamps[4], columns=["BBB", "ZZZ"])
+
+    assert list(window.columns) == ["ts", "BBB"]
+    assert window['ts'].tolist() == list(stamps[1:4])
+    assert window['BBB'].tolist() == [10.0, 20.0, 30.0]
+    assert history_store.load_frame(start=stamps[4])['AAA'].tolist() == [4.0, 5.0]
+    assert history_store.load_frame(end=stamps[0]).empty
+    assert history_store.load_frame(tail=2, end=stamps[5])['AAA'].tolist() == [3.0, 4.0]
+
+def test_legacy_json_round_trips_through_the_store(workspace):
+    legacy = [
+        {"timestamp": "2025-02-14 16:00:00", "prices": {"AAA": 101.5, "BBB": 20.25}},
+        {"timestamp": "2025-02-14 15:00:00", "prices": {"AAA": 100.0}},
+        {"timestamp": "2025-02-17 10:00:00", "prices": {"BBB": 21.0, "CCC": 3.5}},
+    ]
+    with open(history_store.LEGACY_JSON_FILE, 'w') as f: json.dump(legacy, f)
+
+    assert history_store.ensure_store() == 3
+    assert history_store.ensure_store() == 3  # imported once only
+    exported = "data_hub/exported.json"
+    assert history_store.export_json(exported) == 3
+
+    with open(exported, 'r') as f: round_trip = json.load(f)
+    assert round_trip == sorted(legacy, key=lambda e: e['timestamp'])
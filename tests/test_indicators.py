@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+import feature_store
+import history_store
+import indicators
+
+def _history(rows=80, seed=3):
+    """Random walks with scattered gaps; CCC starts late, short of MA_SHORT samples."""
+    rng = np.random.default_rng(seed)
+    prices = 100 + np.cumsum(rng.normal(0, 1, size=(rows, 3)), axis=0)
+    prices[rng.random((rows, 3)) < 0.15] = np.nan
+    prices[:rows - 10, 2] = np.nan
+    prices[-1, 1] = np.nan  # the latest sample missed one ticker
+    stamps = pd.date_range("2026-03-02 10:00", periods=rows, freq="h")
+    return pd.DataFrame(np.round(prices, 2), index=stamps, columns=["AAA", "BBB", "CCC"])
+
+def test_feature_store_matches_compute_indicators_in_batch_and_incrementally(workspace):
+    history = _history()
+    expected = indicators.compute_indicators(history.rename_axis('ts').reset_index())
+    assert expected['ma_short'].isna().tolist() == [False, False, True]
+
+    batch = feature_store.table(feature_store.ingest({"rows": 0, "tickers": {}}, history.rename_axis('ts').reset_index()))
+
+    # Catch-up runs of every size, single samples included
+    for lo, hi in [(0, 30), (30, 31), (31, 55), (55, 56), (56, 79), (79, 80)]:
+        history_store.append_frame(history.iloc[lo:hi])
+        incremental = feature_store.latest()
+
+    for features in (batch, incremental):
+        pd.testing.assert_frame_equal(features[expected.columns], expected, check_exact=False)
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import history_store
+import retention
+
+START = pd.Timestamp("2026-01-05 00:00")
+
+def _samples(start, periods, seed=0):
+    """Quarter-hourly random walk for two tickers, rounded as the store keeps it."""
+    rng = np.random.default_rng(seed)
+    stamps = pd.date_range(start, periods=periods, freq="15min")
+    walk = 100 + np.cumsum(rng.normal(0, 1, size=(periods, 2)), axis=0)
+    return pd.DataFrame(np.round(walk, 2), index=stamps, columns=["AAA", "BBB"])
+
+def _ohlc(raw, width):
+    grouped = raw.groupby(raw.index.floor(width))
+    return {"open": grouped.first(), "high": grouped.max(), "low": grouped.min(), "close": grouped.last()}
+
+def _assert_same(stored, expected):
+    """Frames equal up to the index resolution (the store keeps whole seconds)."""
+    pd.testing.assert_frame_equal(stored, expected, check_names=False, check_freq=False, check_index_type=False)
+
+def _tier(tier, field):
+    return history_store.load_frame(retention.tier_dir(tier, field)).set_index('ts')
+
+def test_update_rolls_closed_hours_and_days_into_ohlc_bars(workspace):
+    raw = _samples(START, 96 + 10)  # a day and 2.5 hours into the next
+    history_store.append_frame(raw.iloc[:90])  # ends at 22:15, inside the hour and the day
+
+    assert retention.update() == {"hourly": 22, "daily": 0}
+
+    history_store.append_frame(raw.iloc[90:])
+    assert retention.update() == {"hourly": 4, "daily": 1}
+    assert retention.update() == {"hourly": 0, "daily": 0}
+
+    # The hour and the day left open by the first run are complete now; 02:00 is still open
+    hourly, daily = _ohlc(raw.iloc[:-2], "1h"), _ohlc(raw.iloc[:96], "1D")
+    for field in retention.FIELDS:
+        _assert_same(_tier("hourly", field), hourly[field])
+        _assert_same(_tier("daily", field), daily[field])
+
+def test_drop_before_keeps_row_offsets_stable(workspace):
+    history_store.append_frame(_samples(START, 8))
+    before = history_store.load_frame()
+    cutoff = START + pd.Timedelta(minutes=45)
+
+    assert history_store.drop_before(cutoff, min_fraction=0.5) == 0  # 3 of 8 rows is below the threshold
+    assert history_store.drop_before(cutoff) == 3
+    assert history_store.drop_before(cutoff) == 0
+
+    assert history_store.head_rows() == 3
+    assert history_store.row_count() == 5
+    assert history_store.total_rows() == 8
+    pd.testing.assert_frame_equal(history_store.load_frame(), before.iloc[3:].reset_index(drop=True))
+
+    history_store.append_frame(_samples(START + pd.Timedelta(hours=2), 2, seed=1))
+    assert history_store.total_rows() == 10
+    assert history_store.head_rows() == 3
+
+def test_load_range_stitches_tiers_without_duplicates(workspace, monkeypatch):
+    monkeypatch.setattr(retention, "RAW_KEEP", pd.Timedelta(days=1))
+    monkeypatch.setattr(retention, "TIERS", [("hourly", pd.Timedelta(hours=1), pd.Timedelta(days=2)),
+                                             ("daily", pd.Timedelta(days=1), None)])
+    monkeypatch.setattr(retention, "COMPACT_FRACTION", 0.0)
+    raw = _samples(START, 5 * 96)
+    history_store.append_frame(raw)
+
+    retention.update()
+
+    # Raw keeps the last day plus the hour still open in the hourly tier, hourly the two days before
+    day = pd.Timedelta(days=1)
+    raw_from = START + 4 * day - pd.Timedelta(hours=1)
+    assert history_store.first_timestamp() == raw_from
+    assert history_store.first_timestamp(retention.tier_dir("hourly", "close")) == START + 2 * day
+
+    df = retention.load_range()
+
+    assert df['ts'].is_monotonic_increasing and df['ts'].is_unique
+    assert list(df.columns) == ["ts", "AAA", "BBB"]
+    daily, hourly = _ohlc(raw, "1D")['close'], _ohlc(raw, "1h")['close']
+    expected = pd.concat([daily.iloc[:2], hourly[(hourly.index >= START + 2 * day) & (hourly.index < raw_from)],
+                          raw[raw.index >= raw_from]])
+    _assert_same(df.set_index('ts'), expected)
+
+    window = retention.load_range(start=START + day, end=raw_from + pd.Timedelta(hours=1), tickers=["BBB"])
+    assert list(window.columns) == ["ts", "BBB"]
+    assert window['ts'].iloc[0] == START + day and window['ts'].iloc[-1] == raw_from + pd.Timedelta(minutes=45)
+    assert window['ts'].is_unique
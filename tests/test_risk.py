@@ -0,0 +1,47 @@
+import os
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import archive
+import risk
+
+def _returns(days=60, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(rng.normal(0.0005, 0.01, size=(days, 2)), columns=["AAA", "BBB"])
+
+def _archive(days):
+    """`days` sessions of closes for AAA and BBB, written straight into the partitions."""
+    stamps = pd.bdate_range("2026-02-02", periods=days)
+    rows = [{"timestamp": f"{d:%Y-%m-%d} 16:00:00", "ticker": t, "price": 100.0 + i + j * 50}
+            for i, d in enumerate(stamps) for j, t in enumerate(("AAA", "BBB"))]
+    archive.upsert(pd.DataFrame(rows), reopen=True, now=datetime(2026, 12, 1))
+
+def test_cvar_is_at_least_var_and_grows_with_the_level():
+    pnl = np.random.default_rng(1).normal(0, 100, 10_000)
+
+    var95, cvar95 = risk.var_cvar(pnl, 0.95)
+    var99, cvar99 = risk.var_cvar(pnl, 0.99)
+
+    assert 0 < var95 <= cvar95
+    assert var95 < var99 <= cvar99
+
+def test_simulate_does_not_depend_on_the_worker_count(monkeypatch):
+    monkeypatch.setattr(risk, "CHUNK_CELLS", risk.HORIZON * 2 * 64)  # 64 paths per chunk
+    values, returns = np.array([1000.0, 500.0]), _returns()
+
+    serial = risk.simulate(values, returns, paths=300, workers=1, seed=11)
+    parallel = risk.simulate(values, returns, paths=300, workers=3, seed=11)
+    other = risk.simulate(values, returns, paths=300, workers=1, seed=12)
+
+    for key in ("pnl_1d", "pnl_10d", "max_drawdown", "final"):
+        assert len(serial[key]) == 300
+        np.testing.assert_array_equal(serial[key], parallel[key])
+    assert not np.array_equal(serial["final"], other["final"])
+
+def test_main_skips_short_history(workspace, capsys):
+    _archive(15)
+
+    assert risk.main({"AAA": {"amount": 1}, "BBB": {"amount": 2}}, paths=100) is None
+
+    assert "Not enough archive history" in capsys.readouterr().out
+    assert not os.path.exists(risk.RISK_FILE)
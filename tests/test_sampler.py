@@ -0,0 +1,21 @@
+import asyncio
+import os
+import numpy as np
+import history_store
+import sampler
+
+def test_fake_feed_ticks_are_flushed_to_the_store(workspace):
+    store_dir = os.path.join("data_hub", "ticks")
+    tickers = ["AAA", "BBB", "SPY"]
+    daemon = sampler.Sampler(sampler.FakeFeed(latency=0.01, volatility=0.01), tickers, interval=1.0,
+                             flush_interval=1.0, batch_size=2, market_only=False, store_dir=store_dir)
+
+    # Built outside the loop asyncio.run starts, as sampler.main does
+    asyncio.run(daemon.run(duration=3.5))
+
+    stored = history_store.load_frame(store_dir)
+    assert daemon.buffer.written >= 2
+    assert daemon.buffer.flushed == daemon.buffer.written
+    assert len(stored) == daemon.buffer.written
+    assert list(stored.columns) == ["ts"] + tickers
+    assert not np.isnan(stored[tickers].to_numpy()).any()
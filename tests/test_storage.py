@@ -0,0 +1,77 @@
+import os
+import threading
+import pytest
+import storage
+
+PATH = os.path.join("data_hub", "events.csv")
+
+class Crash(Exception):
+    pass
+
+def _crash(op):
+    """Stand-in for storage._apply that dies mid-write, as a killed run would."""
+    if op['op'] == "append":
+        with open(op['data'], 'rb') as f: data = f.read()
+        with open(op['path'], 'ab') as f: f.write(data[:len(data) // 2])
+    raise Crash()
+
+def _leftovers():
+    journal = os.listdir(storage.JOURNAL_DIR) if os.path.isdir(storage.JOURNAL_DIR) else []
+    sidecars = [n for n in os.listdir("data_hub") if n.startswith(".") and n.endswith((".tmp", ".append"))]
+    return journal + sidecars
+
+def _read(path=PATH):
+    with open(path, 'r') as f: return f.read()
+
+def test_torn_append_is_rolled_forward_exactly_once(workspace, monkeypatch):
+    storage.append(PATH, "a,1\n")
+    with monkeypatch.context() as m:
+        m.setattr(storage, "_apply", _crash)
+        with pytest.raises(Crash):
+            storage.append(PATH, "b,2\n")
+    assert _read() == "a,1\nb,"
+
+    assert storage.recover() == 1
+    assert _read() == "a,1\nb,2\n"
+    assert storage.recover() == 0
+    with storage.lock(PATH):
+        pass
+    storage.append(PATH, "c,3\n")
+    assert _read() == "a,1\nb,2\nc,3\n"
+    assert _leftovers() == []
+
+def test_interrupted_replace_is_rolled_forward_on_next_lock(workspace, monkeypatch):
+    storage.write_text(PATH, "old\n")
+    with monkeypatch.context() as m:
+        m.setattr(storage, "_apply", _crash)
+        with pytest.raises(Crash):
+            storage.write_text(PATH, "new\n")
+    assert _read() == "old\n"
+
+    with storage.lock(PATH):
+        assert _read() == "new\n"
+    with storage.lock(PATH):
+        pass
+    assert _read() == "new\n"
+    assert _leftovers() == []
+
+def test_lock_is_reentrant_within_a_thread_only(workspace):
+    outcome = []
+    def other():
+        try:
+            with storage.lock(PATH, timeout=0.2):
+                outcome.append("acquired")
+        except TimeoutError:
+            outcome.append("timed out")
+
+    with storage.lock(PATH):
+        with storage.lock(PATH):
+            thread = threading.Thread(target=other)
+            thread.start()
+            thread.join()
+    assert outcome == ["timed out"]
+
+    thread = threading.Thread(target=other)
+    thread.start()
+    thread.join()
+    assert outcome == ["timed out", "acquired"]
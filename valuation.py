@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+
+def price_matrix(df, tickers):
+    """Forward-filled (rows x tickers) float matrix aligned on df's timestamps."""
+    return df.reindex(columns=tickers).ffill().to_numpy(dtype=float)
+
+def value_portfolio(df, holdings, usd_ils=None):
+    """Value the whole history in one pass: total_usd = prices @ amounts.
+
+    df is the wide history frame ('ts' + one column per ticker); holdings is the
+    portfolio.json mapping. Every per-ticker figure comes from the same matrix.
+    usd_ils, if given, is the as-of USD/ILS rate of every row (fx.rates_at(df['ts'])),
+    and the ILS figures convert each row at its own rate.
+    """
+    tickers = [t for t in holdings if t in df.columns]
+    prices = price_matrix(df, tickers)
+    total_usd = np.nan_to_num(prices) @ amounts_of(holdings, tickers)
+    return summarize(holdings, tickers, df['ts'], prices, total_usd, usd_ils)
+
+def amounts_of(holdings, tickers):
+    return np.array([holdings[t]['amount'] for t in tickers], dtype=float)
+
+def summarize(holdings, tickers, ts, prices, total_usd, usd_ils=None):
+    """The value_portfolio figures from an already valued history (ts: the 'ts' Series).
+
+    prices is the forward-filled (rows x tickers) matrix and total_usd its row totals;
+    callers that extend both as samples arrive (the dashboard) skip the full matrix pass.
+    """
+    amounts = amounts_of(holdings, tickers)
+    avg_prices = np.array([holdings[t]['avg_price'] for t in tickers], dtype=float)
+    stamps, ts = ts, ts.to_numpy()
+
+    current = prices[-1]
+    positions_usd = current * amounts
+    held = ~np.isnan(positions_usd)
+    weights = np.where(held, positions_usd, 0) / positions_usd[held].sum() if held.any() else np.zeros(len(tickers))
+
+    total_invested = sum(h['amount'] * h['avg_price'] for h in holdings.values())
+    current_val = total_usd[-1]
+
+    # Last sample at least one day older than the newest one
+    cutoff = ts[-1] - np.timedelta64(1, 'D')
+    prev_idx = max(np.searchsorted(ts, cutoff, side='right') - 1, 0)
+    prev_val = total_usd[prev_idx]
+
+    rates = np.full(len(ts), np.nan) if usd_ils is None else np.asarray(usd_ils, dtype=float)
+    total_ils = total_usd * rates
+    rate = rates[-1]
+
+    return {
+        "ts": stamps,
+        "tickers": tickers,
+        "amounts": amounts,
+        "avg_prices": avg_prices,
+        "prices": prices,
+        "total_usd": pd.Series(total_usd, index=stamps.index, name='total_usd'),
+        "current_prices": current,
+        "positions_usd": positions_usd,
+        "weights": weights,
+        "pnl_pct": (current / avg_prices - 1) * 100,
+        "pnl_usd": (current - avg_prices) * amounts,
+        "current_val_usd": current_val,
+        "total_invested_usd": total_invested,
+        "total_pnl_usd": current_val - total_invested,
+        "total_pnl_pct": (current_val - total_invested) / total_invested * 100,
+        "prev_val_usd": prev_val,
+        "daily_change_pct": (current_val / prev_val - 1) * 100,
+        "usd_ils": rates,
+        "usd_ils_now": rate,
+        "total_ils": pd.Series(total_ils, index=stamps.index, name='total_ils'),
+        "pnl_ils": (current - avg_prices) * amounts * rate,
+        "current_val_ils": total_ils[-1],
+        "total_invested_ils": total_invested * rate,
+        "total_pnl_ils": (current_val - total_invested) * rate,
+        "daily_change_ils_pct": (total_ils[-1] / total_ils[prev_idx] - 1) * 100,
+    }